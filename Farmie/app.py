@@ -1,75 +1,487 @@
-from flask import Flask, request, jsonify, make_response
-import mysql.connector
-import hashlib
+from flask import Flask, Request, has_request_context, request, jsonify, make_response
+import click
 import os
-import requests
-# import numpy as np
-# import tensorflow as tf
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
-import traceback
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request
+from datetime import date, datetime, timedelta
+from contextlib import contextmanager
+from functools import partial
+import logging
+import threading
+import time
+
+from db import ConnectionPool, PoolTimeout, QueryRouter, mysql_connector, mysql_replica_lag
+from weather import ARCHIVE_URL, WeatherCache, WeatherError, WeatherStore, fetch_archive, fetch_archive_many
+from http_client import CircuitBreaker, TokenBucket, Upstream, UpstreamUnavailable
+from predictions import (
+    HashingSpool, InvalidImage, MicroBatcher, PredictionCache, PredictionError, RemoteModel, upload_hash,
+)
+from inference import ImageShrinker, LocalModel
+from recommender import CATALOGUE_QUERY, Recommender
+import climate
+import climatology
+import cultivation
+from identity import IdentityResolver
+from passwords import HasherBusy, LoginThrottle, PasswordHasher
+import passwords
+import migrate
+import transfer
+import query_plans
+from encoding import FastJSONProvider, install_compression, list_response
+from observability import ContextThreadPoolExecutor, RequestMetrics, SamplingProfiler, configure_logging, instrument, phase
 
 # --- App and JWT Setup ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'farmie_secret_key'
 app.config['JWT_SECRET_KEY'] = 'your_jwt_secret_key'
+# Auth is JWT-only; Flask's signed-cookie session is left unused, so nothing is stored server-side
 app.config['SESSION_COOKIE_NAME'] = 'session'
+app.config['DB_POOL_SIZE'] = int(os.environ.get('FARMIE_DB_POOL_SIZE', 10))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('FARMIE_DB_POOL_TIMEOUT', 5))
+app.config['DB_HEALTH_CHECK_INTERVAL'] = float(os.environ.get('FARMIE_DB_HEALTH_CHECK_INTERVAL', 30))
+app.config['DB_HOST'] = os.environ.get('FARMIE_DB_HOST', 'localhost')
+app.config['DB_USER'] = os.environ.get('FARMIE_DB_USER', 'farmie_user')
+app.config['DB_PASSWORD'] = os.environ.get('FARMIE_DB_PASSWORD', 'farmie123')
+app.config['DB_NAME'] = os.environ.get('FARMIE_DB_NAME', 'Farmie')
+# Read replicas as comma-separated host[:port], same credentials; read-only queries are spread across them
+app.config['DB_REPLICAS'] = [h.strip() for h in os.environ.get('FARMIE_DB_REPLICAS', '').split(',') if h.strip()]
+app.config['DB_REPLICA_MAX_LAG'] = float(os.environ.get('FARMIE_DB_REPLICA_MAX_LAG', 2))
+app.config['DB_REPLICA_CHECK_INTERVAL'] = float(os.environ.get('FARMIE_DB_REPLICA_CHECK_INTERVAL', 1))
+app.config['DB_REPLICA_RETRY_INTERVAL'] = float(os.environ.get('FARMIE_DB_REPLICA_RETRY_INTERVAL', 10))
+# How long a busy replica pool is waited on before the read moves elsewhere
+app.config['DB_REPLICA_TIMEOUT'] = float(os.environ.get('FARMIE_DB_REPLICA_TIMEOUT', 0.5))
+# After a commit the client reads from the primary this long; keep it above max lag + check interval
+app.config['DB_READ_PIN_SECONDS'] = float(os.environ.get('FARMIE_DB_READ_PIN_SECONDS', 5))
+app.config['WEATHER_CACHE_PATH'] = os.environ.get(
+    'FARMIE_WEATHER_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_cache.sqlite'))
+app.config['WEATHER_CACHE_SIZE'] = int(os.environ.get('FARMIE_WEATHER_CACHE_SIZE', 512))
+app.config['WEATHER_CACHE_TTL'] = float(os.environ.get('FARMIE_WEATHER_CACHE_TTL', 3600))
+app.config['WEATHER_ARCHIVE_URL'] = os.environ.get('FARMIE_WEATHER_ARCHIVE_URL', ARCHIVE_URL)
+app.config['WEATHER_GRID_RESOLUTION'] = float(os.environ.get('FARMIE_WEATHER_GRID_RESOLUTION', 0.1))
+# Year whose weather feeds crop recommendations
+app.config['WEATHER_CLIMATE_YEAR'] = int(os.environ.get('FARMIE_WEATHER_CLIMATE_YEAR', 2024))
+# Precomputed recent-window summaries older than this fall back to a live fetch
+app.config['WEATHER_SUMMARY_MAX_AGE'] = float(os.environ.get('FARMIE_WEATHER_SUMMARY_MAX_AGE', 36 * 3600))
+app.config['WEATHER_SUMMARY_CACHE_TTL'] = float(os.environ.get('FARMIE_WEATHER_SUMMARY_CACHE_TTL', 600))
+app.config['WEATHER_SUMMARY_MISS_TTL'] = float(os.environ.get('FARMIE_WEATHER_SUMMARY_MISS_TTL', 60))
+app.config['WEATHER_PREFETCH_PAGE_SIZE'] = int(os.environ.get('FARMIE_WEATHER_PREFETCH_PAGE_SIZE', 500))
+app.config['WEATHER_PREFETCH_LOCATIONS'] = int(os.environ.get('FARMIE_WEATHER_PREFETCH_LOCATIONS', 50))
+# Locations fetched per second across the whole job (Open-Meteo bills per location)
+app.config['WEATHER_PREFETCH_RATE'] = float(os.environ.get('FARMIE_WEATHER_PREFETCH_RATE', 5))
+# Offline annual normals (see climatology.py); built with `flask build-climatology`
+app.config['CLIMATOLOGY_PATH'] = os.environ.get(
+    'FARMIE_CLIMATOLOGY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'climatology.bin'))
+# '1' answers from the grid before trying summaries or Open-Meteo; otherwise it is only a fallback
+app.config['CLIMATOLOGY_FIRST'] = os.environ.get('FARMIE_CLIMATOLOGY_FIRST', '0') == '1'
+app.config['CLIMATOLOGY_CHECK_INTERVAL'] = float(os.environ.get('FARMIE_CLIMATOLOGY_CHECK_INTERVAL', 60))
+app.config['MODEL_SERVER_URL'] = os.environ.get('FARMIE_MODEL_SERVER_URL', 'http://172.20.10.2:5002')
+app.config['UPSTREAM_CONNECT_TIMEOUT'] = float(os.environ.get('FARMIE_UPSTREAM_CONNECT_TIMEOUT', 3))
+app.config['UPSTREAM_READ_TIMEOUT'] = float(os.environ.get('FARMIE_UPSTREAM_READ_TIMEOUT', 15))
+app.config['UPSTREAM_MAX_CONCURRENCY'] = int(os.environ.get('FARMIE_UPSTREAM_MAX_CONCURRENCY', 8))
+app.config['UPSTREAM_RETRIES'] = int(os.environ.get('FARMIE_UPSTREAM_RETRIES', 2))
+app.config['UPSTREAM_BREAKER_THRESHOLD'] = int(os.environ.get('FARMIE_UPSTREAM_BREAKER_THRESHOLD', 5))
+app.config['UPSTREAM_BREAKER_RESET'] = float(os.environ.get('FARMIE_UPSTREAM_BREAKER_RESET', 30))
+# 'remote' uses the model server; 'keras', 'tflite', 'onnx' or 'numpy' run in-process
+app.config['INFERENCE_BACKEND'] = os.environ.get('FARMIE_INFERENCE_BACKEND', 'remote')
+app.config['MODEL_PATH'] = os.environ.get('FARMIE_MODEL_PATH', 'plant_identifier_model1')
+# Load the in-process model before serving (gunicorn workers do so whenever FARMIE_WARM_UP is on)
+app.config['MODEL_WARM_UP'] = os.environ.get('FARMIE_MODEL_WARM_UP', '0') == '1'
+# Bump when the deployed model changes so cached predictions are discarded
+app.config['MODEL_VERSION'] = os.environ.get('FARMIE_MODEL_VERSION', '1')
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('FARMIE_PREDICTION_CACHE_SIZE', 4096))
+app.config['PREDICTION_CACHE_PATH'] = os.environ.get('FARMIE_PREDICTION_CACHE_PATH') or None
+app.config['PREDICT_MICRO_BATCHING'] = os.environ.get('FARMIE_PREDICT_MICRO_BATCHING', '0') == '1'
+app.config['PREDICT_MAX_BATCH_SIZE'] = int(os.environ.get('FARMIE_PREDICT_MAX_BATCH_SIZE', 16))
+app.config['PREDICT_MAX_WAIT_MS'] = float(os.environ.get('FARMIE_PREDICT_MAX_WAIT_MS', 10))
+app.config['PREDICT_MAX_IMAGES'] = int(os.environ.get('FARMIE_PREDICT_MAX_IMAGES', 64))
+# Whole request body; larger uploads are rejected with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('FARMIE_MAX_UPLOAD_MB', 64)) * 1024 * 1024)
+app.config['UPLOAD_MAX_IMAGE_MB'] = float(os.environ.get('FARMIE_UPLOAD_MAX_IMAGE_MB', 20))
+app.config['UPLOAD_MAX_PIXELS'] = int(os.environ.get('FARMIE_UPLOAD_MAX_PIXELS', 40_000_000))
+# Images sent to the model server are downsized to fit this many pixels per side; 0 disables
+app.config['UPLOAD_MAX_SIDE'] = int(os.environ.get('FARMIE_UPLOAD_MAX_SIDE', 448))
+app.config['UPLOAD_JPEG_QUALITY'] = int(os.environ.get('FARMIE_UPLOAD_JPEG_QUALITY', 90))
+app.config['IO_WORKERS'] = int(os.environ.get('FARMIE_IO_WORKERS', 16))
+app.config['DASHBOARD_PAGE_SIZE'] = int(os.environ.get('FARMIE_DASHBOARD_PAGE_SIZE', 50))
+app.config['DASHBOARD_MAX_PAGE_SIZE'] = int(os.environ.get('FARMIE_DASHBOARD_MAX_PAGE_SIZE', 500))
+# Dashboard weather lookups run on their own pool, at most this many at once per request
+app.config['DASHBOARD_WEATHER_WORKERS'] = int(os.environ.get('FARMIE_DASHBOARD_WEATHER_WORKERS', 16))
+app.config['DASHBOARD_WEATHER_CONCURRENCY'] = int(os.environ.get('FARMIE_DASHBOARD_WEATHER_CONCURRENCY', 4))
+app.config['BULK_MAX_ITEMS'] = int(os.environ.get('FARMIE_BULK_MAX_ITEMS', 1000))
+# NDJSON export/import (see transfer.py): rows per fetch, crop rows per transaction, body limit
+app.config['EXPORT_CHUNK_SIZE'] = int(os.environ.get('FARMIE_EXPORT_CHUNK_SIZE', 5000))
+app.config['IMPORT_BATCH_ROWS'] = int(os.environ.get('FARMIE_IMPORT_BATCH_ROWS', 5000))
+app.config['IMPORT_MAX_MB'] = float(os.environ.get('FARMIE_IMPORT_MAX_MB', 512))
+app.config['IDENTITY_CACHE_TTL'] = float(os.environ.get('FARMIE_IDENTITY_CACHE_TTL', 300))
+# 'scrypt' (cost = log2 N) or 'pbkdf2_sha256' (cost = iterations); stored hashes are upgraded on login
+app.config['PASSWORD_ALGORITHM'] = os.environ.get('FARMIE_PASSWORD_ALGORITHM', 'scrypt')
+app.config['PASSWORD_COST'] = os.environ.get('FARMIE_PASSWORD_COST') or None
+app.config['PASSWORD_WORKERS'] = int(os.environ.get('FARMIE_PASSWORD_WORKERS', os.cpu_count() or 1))
+# Failed logins allowed per window, per user and per client IP, in each worker process
+app.config['LOGIN_USER_LIMIT'] = int(os.environ.get('FARMIE_LOGIN_USER_LIMIT', 5))
+app.config['LOGIN_IP_LIMIT'] = int(os.environ.get('FARMIE_LOGIN_IP_LIMIT', 30))
+app.config['LOGIN_WINDOW'] = float(os.environ.get('FARMIE_LOGIN_WINDOW', 300))
+app.config['CATALOGUE_CHECK_INTERVAL'] = float(os.environ.get('FARMIE_CATALOGUE_CHECK_INTERVAL', 60))
+# How long clients may reuse catalogue responses before revalidating with the ETag
+app.config['CATALOGUE_MAX_AGE'] = int(os.environ.get('FARMIE_CATALOGUE_MAX_AGE', 300))
+app.config['LOG_LEVEL'] = os.environ.get('FARMIE_LOG_LEVEL', 'INFO')
+# 'json' (one object per line) or 'text'
+app.config['LOG_FORMAT'] = os.environ.get('FARMIE_LOG_FORMAT', 'json')
+# Sample stacks of requests and dump those slower than this; 0 disables the profiler
+app.config['PROFILE_SLOW_MS'] = float(os.environ.get('FARMIE_PROFILE_SLOW_MS', 0))
+app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('FARMIE_PROFILE_INTERVAL_MS', 5))
+app.config['PROFILE_DIR'] = os.environ.get(
+    'FARMIE_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('FARMIE_COMPRESS_MIN_SIZE', 1024))
+# Proxies (load balancer, ingress) in front of the app; their X-Forwarded-For gives the client address
+app.config['TRUSTED_PROXIES'] = int(os.environ.get('FARMIE_TRUSTED_PROXIES', 0))
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'], x_proto=app.config['TRUSTED_PROXIES'])
+app.json = FastJSONProvider(app)
+app.json.compact = True
+install_compression(app, min_size=app.config['COMPRESS_MIN_SIZE'])
 CORS(app, origins="*", supports_credentials=True)
 jwt = JWTManager(app)
 
-# --- Model and Upload Setup ---
-# UPLOAD_FOLDER = 'uploads'
-# os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# model = None  # Global model reference
-# class_names = [
-#     'aloevera', 'banana', 'bilimbi', 'cantaloupe', 'cassava', 'coconut', 'corn',
-#     'cucumber', 'curcuma', 'eggplant', 'galangal', 'ginger', 'guava', 'kale',
-#     'longbeans', 'mango', 'melon', 'orange', 'paddy', 'papaya', 'peper chili',
-#     'pineapple', 'pomelo', 'shallot', 'soybeans', 'spinach', 'sweet potatoes',
-#     'tobacco', 'waterapple', 'watermelon'
-# ]
-# img_height, img_width = 224, 224
-
-# # --- Lazy Load Model ---
-# def get_model():
-#     global model
-#     if model is None:
-#         try:
-#             model = tf.keras.models.load_model("plant_identifier_model1")
-#         except Exception as e:
-#             raise RuntimeError(f"Failed to load model: {e}")
-#     return model
-
-# # --- Image Prediction Logic ---
-# def predict_image(image_path):
-#     model = get_model()
-#     img = tf.keras.utils.load_img(image_path, target_size=(img_height, img_width))
-#     img_array = tf.keras.utils.img_to_array(img)
-#     img_array = tf.expand_dims(img_array, 0)
-#     predictions = model.predict(img_array)
-#     predicted_index = np.argmax(predictions[0])
-#     predicted_class = class_names[predicted_index]
-#     confidence = float(predictions[0][predicted_index])
-#     return predicted_class, confidence
-
-
-
- 
-
-# --- DB Connection & Password Hashing ---
-def get_db_connection():
-    return mysql.connector.connect(
-        host='localhost',
-        user='farmie_user',
-        password='farmie123',
-        database='Farmie'
+# --- Logging & Request Metrics ---
+logger = configure_logging('farmie', app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
+request_metrics = RequestMetrics()
+profiler = None
+if app.config['PROFILE_SLOW_MS'] > 0:
+    profiler = SamplingProfiler(
+        app.config['PROFILE_DIR'],
+        threshold=app.config['PROFILE_SLOW_MS'] / 1000,
+        interval=app.config['PROFILE_INTERVAL_MS'] / 1000,
+    )
+instrument(app, request_metrics, profiler, logger)
+
+# --- DB Connection Pools & Query Routing ---
+def make_db_pool(address):
+    host, _, port = address.partition(':')
+    return ConnectionPool(
+        mysql_connector(
+            host=host,
+            port=int(port or 3306),
+            user=app.config['DB_USER'],
+            password=app.config['DB_PASSWORD'],
+            database=app.config['DB_NAME'],
+        ),
+        size=app.config['DB_POOL_SIZE'],
+        timeout=app.config['DB_POOL_TIMEOUT'],
+        health_check_interval=app.config['DB_HEALTH_CHECK_INTERVAL'],
+        timer=phase,
     )
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+db_pool = make_db_pool(app.config['DB_HOST'])
+# Created before gunicorn forks, so read pins are shared by every worker
+db_router = QueryRouter(
+    db_pool,
+    {address: make_db_pool(address) for address in app.config['DB_REPLICAS']},
+    pin_seconds=app.config['DB_READ_PIN_SECONDS'],
+    max_lag=app.config['DB_REPLICA_MAX_LAG'],
+    check_interval=app.config['DB_REPLICA_CHECK_INTERVAL'],
+    retry_interval=app.config['DB_REPLICA_RETRY_INTERVAL'],
+    replica_timeout=app.config['DB_REPLICA_TIMEOUT'],
+    lag=mysql_replica_lag,
+)
+
+def read_consistency_keys():
+    # Whose writes a read must see: the client address (set
+    # FARMIE_TRUSTED_PROXIES behind a proxy) and, if a token came with the
+    # request, its user. Some routes take no token, so a write there and a
+    # read on a token route are only tied together by the address
+    if not has_request_context():
+        return ()
+    try:
+        user = get_jwt_identity()
+    except RuntimeError:
+        try:
+            verify_jwt_in_request(optional=True)
+            user = get_jwt_identity()
+        except Exception:
+            user = None
+    addr = f'addr:{request.remote_addr}'
+    return (f'user:{user}', addr) if user is not None else (addr,)
+
+@contextmanager
+def db_cursor(dictionary=False, read_only=False):
+    # Borrow a pooled connection; it is always returned, even on early return.
+    # read_only work may be answered by a replica unless this client wrote recently
+    with db_router.connection(read_only=read_only, keys=read_consistency_keys()) as conn:
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield conn, cursor
+        finally:
+            cursor.close()
+
+# --- Upstream HTTP Clients ---
+def make_upstream(name, base_url=''):
+    return Upstream(
+        name,
+        base_url,
+        connect_timeout=app.config['UPSTREAM_CONNECT_TIMEOUT'],
+        read_timeout=app.config['UPSTREAM_READ_TIMEOUT'],
+        max_concurrency=app.config['UPSTREAM_MAX_CONCURRENCY'],
+        retries=app.config['UPSTREAM_RETRIES'],
+        breaker=CircuitBreaker(app.config['UPSTREAM_BREAKER_THRESHOLD'], app.config['UPSTREAM_BREAKER_RESET']),
+        timer=phase,
+    )
+
+open_meteo = make_upstream('open_meteo')
+model_server = make_upstream('model_server', app.config['MODEL_SERVER_URL'])
+upstreams = {u.name: u for u in (open_meteo, model_server)}
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(e):
+    limit = (request.max_content_length or app.config['MAX_CONTENT_LENGTH']) / (1024 * 1024)
+    return jsonify({'error': f'Request body is larger than {limit:g} MB'}), 413
+
+@app.errorhandler(UpstreamUnavailable)
+def handle_upstream_unavailable(e):
+    return jsonify({'error': str(e)}), 503
+
+# --- Crop Prediction Backend ---
+if app.config['INFERENCE_BACKEND'] == 'remote':
+    crop_model = RemoteModel(model_server)
+else:
+    # Loaded once per process and shared by all request threads; never before
+    # a fork (see warm_up_worker)
+    crop_model = LocalModel(app.config['INFERENCE_BACKEND'], app.config['MODEL_PATH'])
+# The model server only needs model-sized input, so uploads are shrunk before forwarding
+upload_shrinker = None
+if app.config['INFERENCE_BACKEND'] == 'remote' and app.config['UPLOAD_MAX_SIDE']:
+    upload_shrinker = ImageShrinker(
+        max_side=app.config['UPLOAD_MAX_SIDE'],
+        quality=app.config['UPLOAD_JPEG_QUALITY'],
+        max_bytes=int(app.config['UPLOAD_MAX_IMAGE_MB'] * 1024 * 1024),
+        max_pixels=app.config['UPLOAD_MAX_PIXELS'],
+    )
+# Merges concurrent /predict_crop calls into one /predict_batch call when enabled
+predict_batcher = MicroBatcher(
+    crop_model.predict_batch,
+    max_batch_size=app.config['PREDICT_MAX_BATCH_SIZE'],
+    max_wait=app.config['PREDICT_MAX_WAIT_MS'] / 1000,
+)
+
+class UploadRequest(Request):
+    # Uploads are hashed for the prediction cache as Werkzeug spools them
+    def _get_file_stream(self, *args, **kwargs):
+        return HashingSpool(super()._get_file_stream(*args, **kwargs))
+
+app.request_class = UploadRequest
+
+prediction_cache = PredictionCache(
+    app.config['MODEL_VERSION'],
+    max_entries=app.config['PREDICTION_CACHE_SIZE'],
+    path=app.config['PREDICTION_CACHE_PATH'],
+)
+
+def predict_one(image):
+    if app.config['PREDICT_MICRO_BATCHING']:
+        return predict_batcher(image)
+    return crop_model.predict(image)
+
+def predict_cached(files):
+    # Returns one (prediction, was_cached) pair per upload; only misses reach the model
+    hashes = [upload_hash(f.stream) for f in files]
+    results = [prediction_cache.get(h) for h in hashes]
+    misses = [i for i, r in enumerate(results) if r is None]
+
+    if len(misses) == 1:
+        fresh = [predict_one(_as_image(files[misses[0]]))]
+    else:
+        fresh = []
+        size = app.config['PREDICT_MAX_BATCH_SIZE']
+        for i in range(0, len(misses), size):
+            chunk = misses[i:i + size]
+            fresh.extend(crop_model.predict_batch([_as_image(files[j]) for j in chunk]))
+
+    cached = [r is not None for r in results]
+    for i, prediction in zip(misses, fresh):
+        prediction_cache.put(hashes[i], prediction)
+        results[i] = prediction
+    return list(zip(results, cached))
+
+def _as_image(file):
+    # Cache keys are hashed from the original upload, so shrinking does not affect hits
+    image = (file.filename, file.stream, file.mimetype)
+    if upload_shrinker is None:
+        return image
+    with phase('shrink'):
+        return upload_shrinker(image)
+
+# Fans out independent upstream calls made on behalf of a single request;
+# tasks run in the request's context so their time lands in its metrics
+io_executor = ContextThreadPoolExecutor(max_workers=app.config['IO_WORKERS'], thread_name_prefix='farmie-io')
+# Separate so a large dashboard page cannot queue ahead of predictions on io_executor
+weather_executor = ContextThreadPoolExecutor(
+    max_workers=app.config['DASHBOARD_WEATHER_WORKERS'], thread_name_prefix='farmie-weather'
+)
+
+def bounded_submit(executor, fn, items, limit):
+    # One future per item, in order, with at most ``limit`` of them running at
+    # once; blocks the caller while the window is full
+    window = threading.BoundedSemaphore(limit)
+
+    def run(item):
+        try:
+            return fn(item)
+        finally:
+            window.release()
+
+    futures = []
+    for item in items:
+        window.acquire()
+        try:
+            futures.append(executor.submit(run, item))
+        except BaseException:
+            window.release()
+            raise
+    return futures
+
+# --- Weather Archive Cache ---
+weather_cache = WeatherCache(
+    partial(fetch_archive, client=open_meteo, url=app.config['WEATHER_ARCHIVE_URL']),
+    store=WeatherStore(app.config['WEATHER_CACHE_PATH']),
+    max_entries=app.config['WEATHER_CACHE_SIZE'],
+    ttl=app.config['WEATHER_CACHE_TTL'],
+    resolution=app.config['WEATHER_GRID_RESOLUTION'],
+)
+
+# Per-cell summaries precomputed by `flask prefetch-weather`
+weather_summaries = climate.SummaryStore(
+    db_cursor,
+    resolution=app.config['WEATHER_GRID_RESOLUTION'],
+    ttl=app.config['WEATHER_SUMMARY_CACHE_TTL'],
+    miss_ttl=app.config['WEATHER_SUMMARY_MISS_TTL'],
+)
+# Memory-mapped, so forked workers share its pages
+climate_normals = climatology.Climatology(
+    app.config['CLIMATOLOGY_PATH'],
+    app.config['WEATHER_CLIMATE_YEAR'],
+    check_interval=app.config['CLIMATOLOGY_CHECK_INTERVAL'],
+)
+
+# --- Crop Recommendation Engine ---
+def load_crop_catalogue():
+    with db_cursor(dictionary=True, read_only=True) as (conn, cursor):
+        cursor.execute(CATALOGUE_QUERY)
+        return cursor.fetchall()
+
+def crop_table_checksum():
+    with db_cursor(read_only=True) as (conn, cursor):
+        cursor.execute("CHECKSUM TABLE Crop")
+        return cursor.fetchone()[1]
+
+recommender = Recommender(
+    load_crop_catalogue,
+    fingerprint=crop_table_checksum,
+    check_interval=app.config['CATALOGUE_CHECK_INTERVAL'],
+)
+
+def recent_weather(latitude, longitude, days=30):
+    # Averages over the last ``days`` days, as shown on the farm screens
+    summary = weather_summaries.get(
+        latitude, longitude, climate.recent_period(days), max_age=app.config['WEATHER_SUMMARY_MAX_AGE']
+    )
+    if summary is None:
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days)
+        summary = climate.summarize(weather_cache.get_daily(latitude, longitude, start_date, end_date))
+    avg_temp, total_rain, avg_humidity, count = summary
+
+    return {
+        "average_temperature": avg_temp,
+        "average_rainfall": round(total_rain / count, 2) if count else 0.0,
+        "average_humidity": avg_humidity,
+    }
+
+def climate_year_weather(latitude, longitude):
+    # (avg_temp, total_rain, avg_humidity) over the climate year, for recommendations
+    if app.config['CLIMATOLOGY_FIRST']:
+        normals = climate_normals.lookup(latitude, longitude)
+        if normals is not None:
+            return normals
+    year = app.config['WEATHER_CLIMATE_YEAR']
+    summary = weather_summaries.get(latitude, longitude, climate.year_period(year))
+    if summary is not None:
+        return summary[:3]
+    try:
+        daily = weather_cache.get_daily(latitude, longitude, f'{year}-01-01', f'{year}-12-31')
+    except (WeatherError, UpstreamUnavailable):
+        # Open-Meteo is down or failing: answer from the offline grid if it covers this farm
+        normals = climate_normals.lookup(latitude, longitude)
+        if normals is None:
+            raise
+        logger.warning('Weather archive unavailable, using climatology grid',
+                       extra={'latitude': latitude, 'longitude': longitude})
+        return normals
+    return climate.summarize(daily)[:3]
+
+# --- Token Identity ---
+identity = IdentityResolver(db_cursor, ttl=app.config['IDENTITY_CACHE_TTL'])
+
+def current_user_id():
+    # From the token's user_id claim, or a cached lookup for older tokens
+    return identity.user_id(get_jwt(), get_jwt_identity())
+
+# --- Password Hashing ---
+# The KDF runs on its own bounded pool so request threads are not all stuck hashing
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_ALGORITHM'],
+    app.config['PASSWORD_COST'],
+    workers=app.config['PASSWORD_WORKERS'],
+)
+login_throttle = LoginThrottle(
+    user_limit=app.config['LOGIN_USER_LIMIT'],
+    ip_limit=app.config['LOGIN_IP_LIMIT'],
+    window=app.config['LOGIN_WINDOW'],
+)
+
+@app.errorhandler(HasherBusy)
+def handle_hasher_busy(e):
+    return jsonify({'error': 'Server is busy, please retry'}), 503
+
+# --- Process Lifecycle (see wsgi.py and gunicorn.conf.py) ---
+# Set once shutdown starts so /ready fails and the load balancer stops routing here
+draining = threading.Event()
+
+def warm_up():
+    # Pay for the catalogue and climatology loads before traffic arrives.
+    # Safe before fork: workers inherit plain Python and NumPy state
+    recommender.catalogue()
+    climate_normals.grid()
+
+def warm_up_worker():
+    # TensorFlow and ONNX Runtime start thread pools that do not survive
+    # fork(), so an in-process model is loaded in each worker, after forking
+    if isinstance(crop_model, LocalModel):
+        crop_model.warm_up()
+
+def release_connections():
+    # DB connections, keep-alive sockets and SQLite handles must not be shared
+    # across fork(); each worker reopens its own on first use
+    db_router.close_all()
+    for upstream in upstreams.values():
+        upstream.close()
+    weather_cache.store.close()
+    prediction_cache.close()
+
+def shutdown():
+    # Called once in-flight requests have drained
+    draining.set()
+    io_executor.shutdown(wait=True)
+    weather_executor.shutdown(wait=True)
+    password_hasher.shutdown()
+    release_connections()
+
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({'error': 'Database is busy, please retry'}), 503
 
 
 # --- Routes ---
@@ -80,18 +492,16 @@ def register():
     if not user_name or not password or not email:
         return make_response(jsonify({'message': 'All fields are required'}), 400)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM User WHERE user_name = %s', (user_name,))
-    if cursor.fetchone():
-        return make_response(jsonify({'message': 'User already exists'}), 409)
-
-    hashed_password = hash_password(password)
-    cursor.execute('INSERT INTO User (user_name, email, password) VALUES (%s, %s, %s)', 
-                   (user_name, email, hashed_password))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Hash before borrowing a connection so the KDF does not hold one
+    hashed_password = password_hasher.hash(password)
+    with db_cursor() as (conn, cursor):
+        cursor.execute('SELECT * FROM User WHERE user_name = %s', (user_name,))
+        if cursor.fetchone():
+            return make_response(jsonify({'message': 'User already exists'}), 409)
+
+        cursor.execute('INSERT INTO User (user_name, email, password) VALUES (%s, %s, %s)', 
+                       (user_name, email, hashed_password))
+        conn.commit()
     return jsonify({'message': 'User registered successfully'}), 201
 
 @app.route('/login', methods=['POST'])
@@ -101,18 +511,119 @@ def login():
     if not user_name or not password:
         return make_response(jsonify({'message': 'Username and password required'}), 400)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT password FROM User WHERE user_name = %s', (user_name,))
-    result = cursor.fetchone()
-    if not result or hash_password(password) != result[0]:
+    # Throttled clients are turned away before any hashing work. Behind a
+    # proxy, set FARMIE_TRUSTED_PROXIES so this is the client's address
+    ip = request.remote_addr
+    retry_after = login_throttle.retry_after(user_name, ip)
+    if retry_after:
+        response = make_response(jsonify({'message': 'Too many login attempts, try again later'}), 429)
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    with db_cursor() as (conn, cursor):
+        cursor.execute('SELECT user_id, password FROM User WHERE user_name = %s', (user_name,))
+        result = cursor.fetchone()
+    ok, needs_rehash = password_hasher.verify(password, result[1] if result else None)
+    if not ok:
+        login_throttle.failed(user_name, ip)
         return make_response(jsonify({'message': 'Invalid username or password'}), 401)
+    login_throttle.succeeded(user_name)
+
+    if needs_rehash:
+        # Legacy SHA-256 or an older work factor: upgrade while we have the plaintext
+        new_hash = password_hasher.hash(password)
+        with db_cursor() as (conn, cursor):
+            cursor.execute('UPDATE User SET password = %s WHERE user_id = %s', (new_hash, result[0]))
+            conn.commit()
 
-    access_token = create_access_token(identity=user_name)
-    cursor.close()
-    conn.close()
+    # user_id never changes, so routes can read it from the token instead of the User table
+    access_token = create_access_token(identity=user_name, additional_claims={'user_id': result[0]})
     return jsonify({'access_token': access_token}), 200
 
+@app.route('/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    # Primary pool at the top level; read routing and replica pools under 'routing'
+    return jsonify({**db_pool.stats(), 'routing': db_router.stats()}), 200
+
+@app.route('/weather_cache_stats', methods=['GET'])
+def weather_cache_stats():
+    return jsonify({
+        **weather_cache.stats(),
+        'summaries': weather_summaries.stats(),
+        'climatology': climate_normals.stats(),
+    }), 200
+
+def metric_gauges():
+    pool = db_pool.stats()
+    yield 'db_pool_connections', {'state': 'in_use'}, pool['in_use']
+    yield 'db_pool_connections', {'state': 'idle'}, pool['idle']
+    yield 'db_pool_timeouts', {}, pool['timeouts']
+    routing = db_router.stats()
+    yield 'db_reads', {'target': 'primary'}, routing['primary_reads']
+    yield 'db_reads', {'target': 'replica'}, routing['replica_reads']
+    yield 'db_read_pins', {}, routing['pins']
+    for name, replica in routing['replicas'].items():
+        yield 'db_replica_up', {'replica': name}, replica['state'] == 'ok'
+        yield 'db_replica_lag_seconds', {'replica': name}, replica['lag']
+        yield 'db_replica_pool_connections', {'replica': name, 'state': 'in_use'}, replica['pool']['in_use']
+    for name, upstream in upstreams.items():
+        stats = upstream.stats()
+        yield 'upstream_calls', {'upstream': name}, stats['calls']
+        yield 'upstream_failures', {'upstream': name}, stats['failures']
+        yield 'upstream_in_flight', {'upstream': name}, stats['in_flight']
+        yield 'upstream_circuit_open', {'upstream': name}, stats['circuit'] != 'closed'
+    for name, cache in (('weather', weather_cache), ('weather_summary', weather_summaries),
+                        ('climatology', climate_normals), ('prediction', prediction_cache)):
+        stats = cache.stats()
+        yield 'cache_hits', {'cache': name}, stats.get('hits')
+        yield 'cache_misses', {'cache': name}, stats.get('misses')
+    if upload_shrinker is not None:
+        stats = upload_shrinker.stats()
+        yield 'upload_images', {}, stats['images']
+        yield 'upload_images_resized', {}, stats['resized']
+        yield 'upload_bytes', {'stage': 'received'}, stats['bytes_in']
+        yield 'upload_bytes', {'stage': 'forwarded'}, stats['bytes_out']
+        yield 'upload_shrink_seconds', {}, stats['seconds_total']
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    checks = {}
+    try:
+        with db_pool.connection(timeout=1) as conn:
+            conn.ping(reconnect=False)
+        checks['database'] = True
+    except Exception:
+        checks['database'] = False
+    checks['catalogue'] = recommender.loaded
+    checks['model'] = crop_model.loaded if isinstance(crop_model, LocalModel) else model_server.breaker.state != 'open'
+    checks['weather_upstream'] = open_meteo.breaker.state != 'open'
+    # Weather can fall back to cached data, so its circuit does not gate readiness
+    is_ready = not draining.is_set() and checks['database'] and checks['catalogue'] and checks['model']
+    return jsonify({'ready': is_ready, 'draining': draining.is_set(), 'checks': checks}), 200 if is_ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition format
+    body = request_metrics.render(metric_gauges())
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/auth_stats', methods=['GET'])
+def auth_stats():
+    return jsonify({'hasher': password_hasher.stats(), 'throttle': login_throttle.stats()}), 200
+
+@app.route('/identity_cache_stats', methods=['GET'])
+def identity_cache_stats():
+    return jsonify(identity.stats()), 200
+
+@app.route('/upstream_stats', methods=['GET'])
+def upstream_stats():
+    stats = {name: u.stats() for name, u in upstreams.items()}
+    stats['predict_batcher'] = predict_batcher.stats()
+    stats['prediction_cache'] = prediction_cache.stats()
+    if upload_shrinker is not None:
+        stats['upload_shrinker'] = upload_shrinker.stats()
+    return jsonify(stats), 200
+
 @app.route('/logout', methods=['POST'])
 def logout():
     return jsonify({'message': 'Logout successful'}), 200
@@ -120,28 +631,23 @@ def logout():
 @app.route('/add_farm', methods=['POST'])
 @jwt_required()
 def add_farm():
-    user_name = get_jwt_identity()
     data = request.get_json()
     farm_name, longitude, latitude = data.get('name'), data.get('longitude'), data.get('latitude')
     if not farm_name or longitude is None or latitude is None:
         return jsonify({'error': 'Missing required fields'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT user_id FROM user WHERE user_name = %s", (user_name,))
-        user = cur.fetchone()
-        if not user:
+        user_id = current_user_id()
+        if user_id is None:
             return jsonify({'error': 'User not found'}), 404
 
-        user_id = user[0]
-        cur.execute("""
-            INSERT INTO farm (user_id, farm_name, longitude, latitude)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, farm_name, longitude, latitude))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_cursor() as (conn, cur):
+            cur.execute("""
+                INSERT INTO farm (user_id, farm_name, longitude, latitude)
+                VALUES (%s, %s, %s, %s)
+            """, (user_id, farm_name, longitude, latitude))
+            conn.commit()
+            identity.forget_farm(cur.lastrowid)
         return jsonify({'message': 'Farm added successfully'}), 201
 
     except Exception as e:
@@ -150,30 +656,89 @@ def add_farm():
 @app.route('/get_farms_by_user', methods=['GET'])
 @jwt_required()
 def get_farms_by_user():
-    user_name = get_jwt_identity()
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT user_id FROM User WHERE user_name = %s", (user_name,))
-        user = cur.fetchone()
-        if not user:
-            return jsonify([]), 200
-
-        user_id = user[0]
-        cur.execute("""
-            SELECT farm_id, farm_name, longitude, latitude
-            FROM farm
-            WHERE user_id = %s
-        """, (user_id,))
-        farms = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify([{
-            'id': row[0],
-            'name': row[1],
-            'longitude': row[2],
-            'latitude': row[3],
-        } for row in farms]), 200
+        user_id = current_user_id()
+        farms = []
+        if user_id is not None:
+            with db_cursor(read_only=True) as (conn, cur):
+                cur.execute("""
+                    SELECT farm_id, farm_name, longitude, latitude
+                    FROM farm
+                    WHERE user_id = %s
+                """, (user_id,))
+                farms = cur.fetchall()
+        # ?format=columns or msgpack sends each key once instead of per row
+        return list_response(('id', 'name', 'longitude', 'latitude'), farms), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+DASHBOARD_QUERY = """
+    SELECT f.farm_id, f.farm_name, f.longitude, f.latitude, cv.crop_name, c.crop_family, cv.quantity
+    FROM (
+        SELECT farm.farm_id, farm.farm_name, farm.longitude, farm.latitude
+        FROM farm
+        WHERE farm.user_id = %s
+        ORDER BY farm.farm_id
+        LIMIT %s OFFSET %s
+    ) AS f
+    LEFT JOIN Cultivate cv ON cv.farm_id = f.farm_id
+    LEFT JOIN Crop c ON c.crop_name = cv.crop_name
+    ORDER BY f.farm_id
+"""
+
+@app.route('/dashboard', methods=['GET'])
+@jwt_required()
+def dashboard():
+    fields = set((request.args.get('fields') or 'crops,weather').split(','))
+    try:
+        limit = min(int(request.args.get('limit', app.config['DASHBOARD_PAGE_SIZE'])), app.config['DASHBOARD_MAX_PAGE_SIZE'])
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'Invalid limit or offset'}), 400
+
+    try:
+        user_id = current_user_id()
+        if user_id is None:
+            return jsonify({'farms': [], 'next_offset': None}), 200
+
+        # One query returns the page of farms with their crops; one extra
+        # farm is fetched to tell whether another page exists
+        with db_cursor(read_only=True) as (conn, cur):
+            cur.execute(DASHBOARD_QUERY, (user_id, limit + 1, offset))
+            rows = cur.fetchall()
+
+        farms = {}
+        for farm_id, farm_name, longitude, latitude, crop_name, crop_family, quantity in rows:
+            farm = farms.get(farm_id)
+            if farm is None:
+                farm = farms[farm_id] = {'id': farm_id, 'name': farm_name, 'longitude': longitude, 'latitude': latitude}
+                if 'crops' in fields:
+                    farm['crops'] = []
+            if crop_name is not None and 'crops' in fields:
+                farm['crops'].append({'crop_name': crop_name, 'family': crop_family, 'quantity': quantity})
+
+        page = list(farms.values())
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        if 'weather' in fields:
+            # One query for the page's summaries; farms sharing a grid cell
+            # hit the same cache entry
+            weather_summaries.preload(((f['latitude'], f['longitude']) for f in page), climate.recent_period(30))
+            summaries = bounded_submit(
+                weather_executor, lambda f: recent_weather(f['latitude'], f['longitude']), page,
+                app.config['DASHBOARD_WEATHER_CONCURRENCY'],
+            )
+            for farm, summary in zip(page, summaries):
+                try:
+                    farm['weather'] = summary.result()
+                except Exception as e:
+                    logger.warning('Weather summary failed', extra={'farm_id': farm['id'], 'error': str(e)})
+                    farm['weather'] = None
+
+        return jsonify({'farms': page, 'next_offset': offset + limit if has_more else None}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -184,22 +749,15 @@ def get_crops_by_farm():
         return jsonify({'error': 'Missing farm_id'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT Crop.crop_name, Crop.crop_family, Cultivate.quantity
-            FROM Crop
-            JOIN Cultivate ON Crop.crop_name = Cultivate.crop_name
-            WHERE Cultivate.farm_id = %s
-        """, (farm_id,))
-        crops = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify([{
-            'crop_name': row[0],
-            'family': row[1],
-            'quantity': row[2],
-        } for row in crops]), 200
+        with db_cursor(read_only=True) as (conn, cur):
+            cur.execute("""
+                SELECT Crop.crop_name, Crop.crop_family, Cultivate.quantity
+                FROM Crop
+                JOIN Cultivate ON Crop.crop_name = Cultivate.crop_name
+                WHERE Cultivate.farm_id = %s
+            """, (farm_id,))
+            crops = cur.fetchall()
+        return list_response(('crop_name', 'family', 'quantity'), crops), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -244,46 +802,135 @@ def predict_crop():
         return jsonify({'error': 'No selected file'}), 400
 
     try:
-        response = requests.post(
-            'http://172.20.10.2:5002/predict',  # model server endpoint
-            files={'image': (image_file.filename, image_file.stream, image_file.mimetype)}
-        )
+        [(prediction, cached)] = predict_cached([image_file])
+        return jsonify({**prediction, 'cached': cached}), 200
+
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
+    except PredictionError as e:
+        return jsonify({'error': str(e), 'details': e.details}), 500
+    except UpstreamUnavailable:
+        return jsonify({'error': 'Model server is unavailable'}), 503
+    except Exception as e:
+        return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
-        if response.status_code != 200:
-            return jsonify({'error': 'Prediction failed from model server', 'details': response.json()}), 500
 
-        prediction = response.json()
-        return jsonify(prediction), 200
+@app.route('/predict_crop_batch', methods=['POST'])
+@jwt_required()
+def predict_crop_batch():
+    images = [f for f in request.files.getlist('images') if f.filename]
+    if not images:
+        return jsonify({'error': 'No images provided'}), 400
+    if len(images) > app.config['PREDICT_MAX_IMAGES']:
+        return jsonify({'error': f"At most {app.config['PREDICT_MAX_IMAGES']} images per request"}), 413
 
-    except requests.exceptions.ConnectionError:
+    try:
+        # Uncached images are forwarded in model-sized batches; order is preserved
+        results = predict_cached(images)
+        return jsonify({'predictions': [{**p, 'cached': cached} for p, cached in results]}), 200
+
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
+    except PredictionError as e:
+        return jsonify({'error': str(e), 'details': e.details}), 500
+    except UpstreamUnavailable:
         return jsonify({'error': 'Model server is unavailable'}), 503
     except Exception as e:
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
 
-@app.route('/get_all_crops', methods=['GET'])
-def get_all_crops():
+def farm_climate(farm_id):
+    with db_cursor(read_only=True) as (conn, cursor):
+        cursor.execute("SELECT latitude, longitude FROM farm WHERE farm_id = %s", (farm_id,))
+        farm = cursor.fetchone()
+        if not farm:
+            return None, None
+        most_cultivated_crop = cultivation.most_cultivated(cursor)
+    return climate_year_weather(farm[0], farm[1]), most_cultivated_crop
+
+def _timed(timings, stage, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+
+@app.route('/identify_and_recommend', methods=['POST'])
+@jwt_required()
+def identify_and_recommend():
+    farm_id = request.form.get('farm_id')
+    if not farm_id:
+        return jsonify({'error': 'Missing farm_id'}), 400
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image provided'}), 400
+    image_file = request.files['image']
+    if image_file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+
+    started = time.perf_counter()
+    timings = {}
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        predicted = io_executor.submit(_timed, timings, 'predict', predict_cached, [image_file])
+        located = io_executor.submit(_timed, timings, 'farm_weather', farm_climate, farm_id)
+        [(prediction, cached)] = predicted.result()
+        farm_weather, most_cultivated_crop = located.result()
+        if farm_weather is None:
+            return jsonify({'error': 'Farm not found'}), 404
 
-        query = "SELECT crop_name, crop_family FROM Crop"
-        cursor.execute(query)
-        crops = cursor.fetchall()
+        crop_name = prediction.get('predicted_crop')
+        crop_family = _timed(timings, 'catalogue', lambda: recommender.catalogue().family_of(crop_name))
+        recommendations = []
+        if crop_family is not None:
+            recommendations = _timed(
+                timings, 'recommend', recommender.recommend, crop_name, farm_weather, most_cultivated_crop
+            )
+        timings['total'] = round((time.perf_counter() - started) * 1000, 2)
 
-        return jsonify(crops), 200
+        return jsonify({
+            **prediction,
+            'cached': cached,
+            'crop_family': crop_family,
+            'recommendations': recommendations,
+            'timings_ms': timings,
+        }), 200
+
+    except InvalidImage as e:
+        return jsonify({'error': str(e)}), 400
+    except PredictionError as e:
+        return jsonify({'error': str(e), 'details': e.details}), 500
+    except WeatherError as e:
+        return jsonify({'error': str(e)}), 500
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        print("Error fetching crops:", e)
+        logger.exception('Request failed', extra={'handler': 'identify_and_recommend'})
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+
+def catalogue_response(catalogue, build):
+    # Answers depend only on the URL and the catalogue version, which is the ETag
+    if request.if_none_match.contains_weak(catalogue.version):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(catalogue.version)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['CATALOGUE_MAX_AGE']
+    return response
+
+@app.route('/get_all_crops', methods=['GET'])
+def get_all_crops():
+    try:
+        catalogue = recommender.catalogue()
+        return catalogue_response(catalogue, lambda: catalogue.listing)
+    except Exception as e:
+        logger.exception('Fetching crops failed')
         return jsonify({'error': 'Internal server error'}), 500
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 @app.route('/add_crop_to_farm', methods=['POST'])
 @jwt_required()
 def add_crop_to_farm():
-    # Extract user identity and request data
-    user_name = get_jwt_identity()
+    # Extract request data
     data = request.get_json()
 
     crop_name = data.get('crop_name')
@@ -295,39 +942,36 @@ def add_crop_to_farm():
         return jsonify({'error': 'Missing required fields'}), 400
 
     try:
-        # Establish database connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Check if the user owns the farm
-        cursor.execute("SELECT user_id FROM farm WHERE farm_id = %s", (farm_id,))
-        farm = cursor.fetchone()
-        if not farm:
+        # Check if the user owns the farm (owner and user_id are usually cached)
+        user_id = current_user_id()
+        owner = identity.farm_owner(farm_id)
+        if owner is None:
             return jsonify({'error': 'Farm not found'}), 404
-
-        cursor.execute("SELECT user_id FROM User WHERE user_name = %s", (user_name,))
-        user = cursor.fetchone()
-        if not user or user[0] != farm[0]:
+        if owner != user_id:
             return jsonify({'error': 'You do not have permission to add crops to this farm'}), 403
 
-        # Check if the crop exists in the Crop table
-        cursor.execute("SELECT * FROM Crop WHERE crop_name = %s", (crop_name,))
-        crop = cursor.fetchone()
-        if not crop:
-            return jsonify({'error': 'Crop not found in the database'}), 404
-
-        # Add the crop to the Cultivate table (linking crop and farm)
-        cursor.execute("""
-            INSERT INTO Cultivate (farm_id, crop_name, quantity)
-            VALUES (%s, %s, %s)
-        """, (farm_id, crop_name, quantity))
-        
-        # Commit the transaction
-        conn.commit()
-        
-        # Clean up and close connections
-        cursor.close()
-        conn.close()
+        # Borrow a pooled database connection
+        with db_cursor() as (conn, cursor):
+            # Check if the crop exists in the Crop table
+            cursor.execute("SELECT * FROM Crop WHERE crop_name = %s", (crop_name,))
+            crop = cursor.fetchone()
+            if not crop:
+                return jsonify({'error': 'Crop not found in the database'}), 404
+
+            # Add the crop to the Cultivate table (linking crop and farm). The
+            # cached owner may be stale if another worker deleted the farm, so
+            # ownership is checked again as part of the insert
+            cursor.execute("""
+                INSERT INTO Cultivate (farm_id, crop_name, quantity)
+                SELECT farm_id, %s, %s FROM farm WHERE farm_id = %s AND user_id = %s
+            """, (crop_name, quantity, farm_id, user_id))
+            if cursor.rowcount == 0:
+                identity.forget_farm(farm_id)
+                return jsonify({'error': 'Farm not found'}), 404
+            cultivation.apply_deltas(cursor, {crop_name: quantity})
+            
+            # Commit the transaction
+            conn.commit()
         
         return jsonify({'message': 'Crop added to farm successfully'}), 201
 
@@ -341,18 +985,28 @@ def get_crop_family():
         return jsonify({'error': 'Missing crop_name'}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT crop_family FROM Crop WHERE crop_name = %s", (crop_name,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if not result:
+        catalogue = recommender.catalogue()
+        crop_family = catalogue.family_of(crop_name)
+        if crop_family is None:
             return jsonify({'error': 'Crop not found'}), 404
 
-        return jsonify({'crop_family': result[0]}), 200
+        return catalogue_response(catalogue, lambda: {'crop_family': crop_family})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/crop_family/batch', methods=['GET'])
+def get_crop_families():
+    # Repeat the parameter: ?crop_name=corn&crop_name=kale; unknown crops map to null
+    crop_names = request.args.getlist('crop_name')
+    if not crop_names:
+        return jsonify({'error': 'Missing crop_name'}), 400
+    if len(crop_names) > app.config['BULK_MAX_ITEMS']:
+        return jsonify({'error': f"At most {app.config['BULK_MAX_ITEMS']} crop names per request"}), 413
 
+    try:
+        catalogue = recommender.catalogue()
+        return catalogue_response(catalogue, lambda: {'crop_families': catalogue.families_of(crop_names)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -363,56 +1017,37 @@ def get_weather():
     farm_id = request.args.get('farm_id')
     if not farm_id:
         return jsonify({'error': 'Missing farm_id'}), 400
+    # 'recent' (last 30 days) or 'year' (the climate year used for recommendations)
+    period = request.args.get('period', 'recent')
+    if period not in ('recent', 'year'):
+        return jsonify({'error': "period must be 'recent' or 'year'"}), 400
 
     try:
-        # Connect to DB to get latitude and longitude of the farm
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT latitude, longitude FROM farm WHERE farm_id = %s", (farm_id,))
-        farm = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        # Look up latitude and longitude of the farm
+        with db_cursor(read_only=True) as (conn, cursor):
+            cursor.execute("SELECT latitude, longitude FROM farm WHERE farm_id = %s", (farm_id,))
+            farm = cursor.fetchone()
 
         if not farm:
             return jsonify({'error': 'Farm not found'}), 404
 
         latitude, longitude = farm
 
-        # Calculate date range (last 30 days)
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=30)
-
-        # Construct API URL
-        weather_url = (
-            f"https://archive-api.open-meteo.com/v1/archive"
-            f"?latitude={latitude}&longitude={longitude}"
-            f"&start_date={start_date}&end_date={end_date}"
-            f"&daily=temperature_2m_mean,precipitation_sum,relative_humidity_2m_mean"
-            f"&timezone=auto"
-        )
-
-        # Request weather data
-        response = requests.get(weather_url)
-        if response.status_code != 200:
-            return jsonify({'error': 'Failed to fetch weather data'}), 500
-
-        data = response.json()
-        if "daily" not in data:
-            return jsonify({'error': 'Unexpected weather API response'}), 500
-
-        daily = data["daily"]
-        count = len(daily["temperature_2m_mean"])
-
-        # Compute averages
-        avg_temp = sum(daily["temperature_2m_mean"]) / count
-        avg_rainfall = sum(daily["precipitation_sum"]) / count
-        avg_humidity = sum(daily["relative_humidity_2m_mean"]) / count
-
-        return jsonify({
-            "average_temperature": round(avg_temp, 2),
-            "average_rainfall": round(avg_rainfall, 2),
-            "average_humidity": round(avg_humidity, 2),
-        }), 200
+        # Precomputed per grid cell by the prefetch job, else fetched and cached
+        try:
+            if period == 'year':
+                avg_temp, total_rain, avg_humidity = climate_year_weather(latitude, longitude)
+                return jsonify({
+                    'year': app.config['WEATHER_CLIMATE_YEAR'],
+                    'average_temperature': avg_temp,
+                    'total_rainfall': total_rain,
+                    'average_humidity': avg_humidity,
+                }), 200
+            return jsonify(recent_weather(latitude, longitude)), 200
+        except WeatherError as e:
+            return jsonify({'error': str(e)}), 500
+        except UpstreamUnavailable as e:
+            return jsonify({'error': str(e)}), 503
 
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
@@ -424,128 +1059,102 @@ def get_weather():
 def recommend_crop():
     analyzed_crop_name = request.args.get('crop_name')
     farm_id = request.args.get('farm_id')
-    print(f"Analyzed crop: {analyzed_crop_name}, Farm ID: {farm_id}")
 
     if not analyzed_crop_name or not farm_id:
         return jsonify({'error': 'Missing crop_name or farm_id'}), 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # 1. Get crop_family of analyzed crop
-        cursor.execute("SELECT crop_family FROM Crop WHERE crop_name = %s", (analyzed_crop_name,))
-        result = cursor.fetchone()
-        if not result:
+        # 1. Get crop_family of analyzed crop from the in-memory catalogue
+        analyzed_family = recommender.catalogue().family_of(analyzed_crop_name)
+        if analyzed_family is None:
             return jsonify({'error': 'Analyzed crop not found'}), 404
-        analyzed_family = result['crop_family']
-        print(f"Analyzed crop family: {analyzed_family}")
 
         # 2. Get latitude and longitude for the given farm
-        cursor.execute("SELECT latitude, longitude FROM Farm WHERE farm_id = %s", (farm_id,))
-        farm = cursor.fetchone()
-        if not farm:
-            return jsonify({'error': 'Farm not found'}), 404
+        with db_cursor(dictionary=True, read_only=True) as (conn, cursor):
+            cursor.execute("SELECT latitude, longitude FROM Farm WHERE farm_id = %s", (farm_id,))
+            farm = cursor.fetchone()
+            if not farm:
+                return jsonify({'error': 'Farm not found'}), 404
         latitude, longitude = farm['latitude'], farm['longitude']
-        print(f"Farm coordinates: Latitude {latitude}, Longitude {longitude}")
-
-        # 3. Get full-year 2024 weather data
-        start_date = '2024-01-01'
-        end_date = '2024-12-31'
-        weather_url = (
-            f"https://archive-api.open-meteo.com/v1/archive"
-            f"?latitude={latitude}&longitude={longitude}"
-            f"&start_date={start_date}&end_date={end_date}"
-            f"&daily=temperature_2m_mean,precipitation_sum,relative_humidity_2m_mean"
-            f"&timezone=auto"
-        )
 
-        response = requests.get(weather_url)
-        if response.status_code != 200:
-            print(f"Weather API failed with status: {response.status_code}")
-            return jsonify({'error': 'Failed to fetch weather data'}), 500
-
-        data = response.json().get('daily', {})
-        print("Weather data keys received:", data.keys())
-
-        def safe_average(lst):
-            filtered = [v for v in lst if v is not None]
-            return round(sum(filtered) / len(filtered), 2) if filtered else 0.0
-
-        def safe_total(lst):
-            filtered = [v for v in lst if v is not None]
-            return round(sum(filtered), 2)
-
-        avg_temp = safe_average(data.get('temperature_2m_mean', []))
-        avg_humidity = safe_average(data.get('relative_humidity_2m_mean', []))
-        total_rain = safe_total(data.get('precipitation_sum', []))
-
-        print(f"Avg Temp: {avg_temp}, Avg Humidity: {avg_humidity}, Total Rain: {total_rain}")
-
-        # 4. Get all crops
-        cursor.execute("SELECT crop_name, crop_family, optimal_temp, optimal_rainfall, optimal_humidity FROM Crop")
-        crops = cursor.fetchall()
-
-        # 5. Get total quantity of each crop across all farms
-        cursor.execute("""
-            SELECT 
-                c.crop_name,
-                COALESCE(SUM(cv.quantity), 0) AS total_quantity
-            FROM Crop c
-            LEFT JOIN Cultivate cv ON c.crop_name = cv.crop_name
-            GROUP BY c.crop_name
-        """)
-        quantities = cursor.fetchall()
-        quantity_dict = {row['crop_name']: row['total_quantity'] for row in quantities}
-
-        # 6. Identify most cultivated crop
-        most_cultivated_crop = max(quantity_dict.items(), key=lambda x: x[1])[0] if quantity_dict else None
-        print(f"Most cultivated crop: {most_cultivated_crop}")
-
-        # 7. Scoring logic
-        results = []
-        for crop in crops:
-            name = crop['crop_name']
-            family = crop['crop_family']
-            optimal_temp = float(crop['optimal_temp']) if crop['optimal_temp'] is not None else None
-            optimal_rain = float(crop['optimal_rainfall']) if crop['optimal_rainfall'] is not None else None
-            optimal_humidity = float(crop['optimal_humidity']) if crop['optimal_humidity'] is not None else None
-
-            family_score = 20 if family == analyzed_family else 0
-            temp_score = max(0, 30 - abs(optimal_temp - avg_temp)) if optimal_temp is not None else 0
-            rain_score = max(0, 30 - abs(optimal_rain - total_rain)) if optimal_rain is not None else 0
-            humidity_score = max(0, 20 - abs(optimal_humidity - avg_humidity)) if optimal_humidity is not None else 0
-
-            total_score = family_score + temp_score + rain_score + humidity_score
-
-            if name == most_cultivated_crop:
-                total_score = 0
-
-            results.append({
-                'crop_name': name,
-                'score': round(total_score, 2),
-                'total_quantity': quantity_dict.get(name, 0)
+        # 3. Get full-year weather for the climate year, precomputed when possible
+        try:
+            avg_temp, total_rain, avg_humidity = climate_year_weather(latitude, longitude)
+        except WeatherError as e:
+            return jsonify({'error': str(e)}), 500
+        except UpstreamUnavailable as e:
+            return jsonify({'error': str(e)}), 503
+
+        # 4. Identify most cultivated crop from the maintained totals
+        with db_cursor(read_only=True) as (conn, cursor):
+            most_cultivated_crop = cultivation.most_cultivated(cursor)
+
+        # 5. Score the whole catalogue and take the top 3, excluding the analyzed crop
+        top_crops = recommender.recommend(
+            analyzed_crop_name, (avg_temp, total_rain, avg_humidity), most_cultivated_crop, k=3
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Crop recommendation', extra={
+                'crop_name': analyzed_crop_name, 'crop_family': analyzed_family, 'farm_id': farm_id,
+                'latitude': latitude, 'longitude': longitude, 'avg_temp': avg_temp,
+                'total_rain': total_rain, 'avg_humidity': avg_humidity,
+                'most_cultivated': most_cultivated_crop,
             })
 
-        
-        # 8. Remove the analyzed crop from the results
-        filtered_results = [crop for crop in results if crop['crop_name'] != analyzed_crop_name]
+        return jsonify({'recommendations': top_crops}), 200
 
-        # 9. Return top 3 recommendations excluding the analyzed crop
-        top_crops = sorted(filtered_results, key=lambda x: x['score'], reverse=True)[:3]
+    except Exception as e:
+        logger.exception('Request failed', extra={'handler': 'recommend_crop'})
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-        #top_crops = sorted(results, key=lambda x: x['score'], reverse=True)[:3]
+@app.route('/crop_recommendation/batch', methods=['POST'])
+@jwt_required()
+def recommend_crop_batch():
+    items = (request.get_json() or {}).get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if any(not isinstance(i, dict) or not i.get('crop_name') or not i.get('farm_id') for i in items):
+        return jsonify({'error': 'Each item needs crop_name and farm_id'}), 400
 
-        return jsonify({'recommendations': [c['crop_name'] for c in top_crops]}), 200
+    try:
+        farm_ids = sorted({str(i['farm_id']) for i in items})
+        with db_cursor(read_only=True) as (conn, cursor):
+            placeholders = ', '.join(['%s'] * len(farm_ids))
+            cursor.execute(
+                f"SELECT farm_id, latitude, longitude FROM farm WHERE farm_id IN ({placeholders})", farm_ids
+            )
+            farms = {str(row[0]): (row[1], row[2]) for row in cursor.fetchall()}
+            most_cultivated_crop = cultivation.most_cultivated(cursor)
+
+        climates = {}
+        weather_summaries.preload(farms.values(), climate.year_period(app.config['WEATHER_CLIMATE_YEAR']))
+        for farm_id, (latitude, longitude) in farms.items():
+            climates[farm_id] = climate_year_weather(latitude, longitude)
+
+        catalogue = recommender.catalogue()
+        scorable = [i for i in items if str(i['farm_id']) in climates and i['crop_name'] in catalogue.index]
+        ranked = iter(recommender.recommend_batch(
+            [(i['crop_name'], climates[str(i['farm_id'])]) for i in scorable], most_cultivated_crop, k=3
+        ))
 
+        results = []
+        for item in items:
+            if str(item['farm_id']) not in climates:
+                results.append({'error': 'Farm not found'})
+            elif item['crop_name'] not in catalogue.index:
+                results.append({'error': 'Analyzed crop not found'})
+            else:
+                results.append({'recommendations': next(ranked)})
+        return jsonify({'results': results}), 200
+
+    except WeatherError as e:
+        return jsonify({'error': str(e)}), 500
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        traceback.print_exc()
+        logger.exception('Request failed', extra={'handler': 'recommend_crop_batch'})
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
-
 @app.route('/update_crop_quantity', methods=['PUT'])
 def update_crop_quantity():
     data = request.get_json()
@@ -557,27 +1166,28 @@ def update_crop_quantity():
         return jsonify({'error': 'Invalid input'}), 400
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        update_query = """
-            UPDATE cultivate
-            SET quantity = %s
-            WHERE farm_id = %s AND crop_name = %s
-        """
-        cursor.execute(update_query, (new_quantity, farm_id, crop_name))
-        connection.commit()
-
-        if cursor.rowcount == 0:
-            return jsonify({'error': 'No matching crop found'}), 404
+        with db_cursor() as (connection, cursor):
+            cursor.execute(
+                "SELECT quantity FROM cultivate WHERE farm_id = %s AND crop_name = %s FOR UPDATE",
+                (farm_id, crop_name)
+            )
+            current = cursor.fetchone()
+            if not current:
+                return jsonify({'error': 'No matching crop found'}), 404
+
+            update_query = """
+                UPDATE cultivate
+                SET quantity = %s
+                WHERE farm_id = %s AND crop_name = %s
+            """
+            cursor.execute(update_query, (new_quantity, farm_id, crop_name))
+            cultivation.apply_deltas(cursor, {crop_name: new_quantity - current[0]})
+            connection.commit()
 
         return jsonify({'message': 'Quantity updated successfully'}), 200
     except Exception as e:
-        print('Error:', e)
+        logger.exception('Cultivate update failed')
         return jsonify({'error': 'Server error'}), 500
-    finally:
-        cursor.close()
-        connection.close()
 
 @app.route('/delete_crop_from_farm', methods=['DELETE'])
 def delete_crop_from_farm():
@@ -588,61 +1198,333 @@ def delete_crop_from_farm():
         return jsonify({'error': 'Missing farm_id or crop_name'}), 400
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        delete_query = """
-            DELETE FROM cultivate
-            WHERE farm_id = %s AND crop_name = %s
-        """
-        cursor.execute(delete_query, (farm_id, crop_name))
-        connection.commit()
-
-        if cursor.rowcount == 0:
-            return jsonify({'error': 'Crop not found for this farm'}), 404
+        with db_cursor() as (connection, cursor):
+            cursor.execute(
+                "SELECT quantity FROM cultivate WHERE farm_id = %s AND crop_name = %s FOR UPDATE",
+                (farm_id, crop_name)
+            )
+            current = cursor.fetchone()
+            if not current:
+                return jsonify({'error': 'Crop not found for this farm'}), 404
+
+            delete_query = """
+                DELETE FROM cultivate
+                WHERE farm_id = %s AND crop_name = %s
+            """
+            cursor.execute(delete_query, (farm_id, crop_name))
+            cultivation.apply_deltas(cursor, {crop_name: -current[0]})
+            connection.commit()
 
         return jsonify({'message': 'Crop deleted successfully'}), 200
     except Exception as e:
-        print('Error:', e)
+        logger.exception('Cultivate update failed')
         return jsonify({'error': 'Server error'}), 500
-    finally:
-        cursor.close()
-        connection.close()
+
+def _validate_bulk_item(item):
+    if not isinstance(item, dict):
+        return 'Each operation must be an object'
+    op = item.get('op', 'set')
+    if op not in ('set', 'delete'):
+        return f'Unknown op: {op}'
+    farm_id, crop_name = item.get('farm_id'), item.get('crop_name')
+    if farm_id is None or not crop_name:
+        return 'Missing farm_id or crop_name'
+    if not isinstance(farm_id, int) or isinstance(farm_id, bool):
+        return 'farm_id must be an integer'
+    if not isinstance(crop_name, str):
+        return 'crop_name must be a string'
+    quantity = item.get('quantity')
+    if op == 'set' and (not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 0):
+        return 'quantity must be a non-negative integer'
+    return None
+
+@app.route('/bulk_crops', methods=['POST'])
+@jwt_required()
+def bulk_crops():
+    """Apply many {op, farm_id, crop_name, quantity} operations in one transaction.
+
+    op is 'set' (insert or overwrite the quantity, the default) or 'delete'.
+    Invalid items are reported per index; the valid ones are still applied.
+    """
+    operations = (request.get_json() or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > app.config['BULK_MAX_ITEMS']:
+        return jsonify({'error': f"At most {app.config['BULK_MAX_ITEMS']} operations per request"}), 413
+
+    results = [{'status': 'error', 'error': _validate_bulk_item(item)} for item in operations]
+    valid = [i for i, r in enumerate(results) if r['error'] is None]
+
+    try:
+        user_id = current_user_id()
+        with db_cursor() as (conn, cursor):
+            farm_ids = sorted({operations[i]['farm_id'] for i in valid})
+            crop_names = sorted({operations[i]['crop_name'] for i in valid})
+            owned, known = set(), set()
+            if valid:
+                # Set-based ownership and crop existence checks
+                cursor.execute(f"""
+                    SELECT farm_id FROM farm
+                    WHERE user_id = %s AND farm_id IN ({', '.join(['%s'] * len(farm_ids))})
+                """, [user_id, *farm_ids])
+                owned = {row[0] for row in cursor.fetchall()}
+                cursor.execute(
+                    f"SELECT crop_name FROM Crop WHERE crop_name IN ({', '.join(['%s'] * len(crop_names))})",
+                    crop_names
+                )
+                known = {row[0] for row in cursor.fetchall()}
+
+            applied = []
+            for i in valid:
+                item = operations[i]
+                if item['farm_id'] not in owned:
+                    results[i]['error'] = 'Farm not found or not owned by you'
+                elif item['crop_name'] not in known:
+                    results[i]['error'] = 'Crop not found in the database'
+                else:
+                    applied.append(i)
+
+            if applied:
+                keys = sorted({(operations[i]['farm_id'], operations[i]['crop_name']) for i in applied})
+                cursor.execute(f"""
+                    SELECT farm_id, crop_name, quantity FROM Cultivate
+                    WHERE (farm_id, crop_name) IN ({', '.join(['(%s, %s)'] * len(keys))})
+                    FOR UPDATE
+                """, [v for key in keys for v in key])
+                current = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+                before = dict(current)
+
+                # Later operations on the same row win, as if sent one by one
+                for i in applied:
+                    item = operations[i]
+                    key = (item['farm_id'], item['crop_name'])
+                    if item.get('op', 'set') == 'delete':
+                        if key not in current:
+                            results[i]['error'] = 'Crop not found for this farm'
+                            continue
+                        del current[key]
+                    else:
+                        current[key] = item['quantity']
+                    results[i] = {'status': 'ok'}
+
+                upserts = [(f, c, q) for (f, c), q in current.items() if before.get((f, c)) != q]
+                deletes = [key for key in before if key not in current]
+                if upserts:
+                    cursor.executemany("""
+                        INSERT INTO Cultivate (farm_id, crop_name, quantity)
+                        VALUES (%s, %s, %s)
+                        ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+                    """, upserts)
+                if deletes:
+                    cursor.executemany("DELETE FROM Cultivate WHERE farm_id = %s AND crop_name = %s", deletes)
+
+                deltas = {}
+                for key in set(before) | set(current):
+                    deltas[key[1]] = deltas.get(key[1], 0) + current.get(key, 0) - before.get(key, 0)
+                cultivation.apply_deltas(cursor, deltas)
+                conn.commit()
+
+        return jsonify({
+            'applied': sum(r['status'] == 'ok' for r in results),
+            'results': results,
+        }), 200
+    except Exception as e:
+        logger.exception('Request failed', extra={'handler': 'bulk_crops'})
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/export_farms', methods=['GET'])
+@jwt_required()
+def export_farms():
+    """Stream the caller's farms and their crops as NDJSON, one farm per line."""
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'error': 'User not found'}), 404
+
+    # A long read: served by a replica when one is available
+    chunks = transfer.export_farms(
+        db_router.connection(read_only=True, keys=read_consistency_keys()), user_id, app.json.dumps, chunk_size=app.config['EXPORT_CHUNK_SIZE']
+    )
+    try:
+        # Runs the query, so a busy pool or a failing query still gets a proper status
+        next(chunks)
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.exception('Request failed', extra={'handler': 'export_farms'})
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+    response = app.response_class(chunks, mimetype=transfer.NDJSON_MIMETYPE)
+    response.headers['Content-Disposition'] = 'attachment; filename=farmie-farms.ndjson'
+    return response
+
+@app.route('/import_farms', methods=['POST'])
+@jwt_required()
+def import_farms():
+    """Create farms and crops from an /export_farms body, committed in batches."""
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'error': 'User not found'}), 404
+    # Exports are much larger than any other request body
+    request.max_content_length = int(app.config['IMPORT_MAX_MB'] * 1024 * 1024)
+
+    try:
+        summary, created = transfer.import_farms(
+            db_cursor, user_id, transfer.read_lines(request.stream), recommender.catalogue().index,
+            batch_rows=app.config['IMPORT_BATCH_ROWS'],
+        )
+    except transfer.ImportAborted as e:
+        logger.exception('Request failed', extra={'handler': 'import_farms'})
+        return jsonify({'error': f'Internal server error: {str(e.__cause__)}', **e.summary}), 500
+    for farm_id in created:
+        identity.forget_farm(farm_id)
+    return jsonify(summary), 200
 
 @app.route('/delete_farm/<int:farm_id>', methods=['DELETE'])
 @jwt_required()
 def delete_farm(farm_id):
-    user_name = get_jwt_identity()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # Verify user owns the farm
-        cursor.execute("SELECT user_id FROM farm WHERE farm_id = %s", (farm_id,))
-        farm = cursor.fetchone()
-        if not farm:
+        user_id = current_user_id()
+        owner = identity.farm_owner(farm_id)
+        if owner is None:
             return jsonify({'error': 'Farm not found'}), 404
-
-        cursor.execute("SELECT user_id FROM User WHERE user_name = %s", (user_name,))
-        user = cursor.fetchone()
-        if not user or user[0] != farm[0]:
+        if owner != user_id:
             return jsonify({'error': 'Unauthorized to delete this farm'}), 403
 
-        # Delete related entries from Cultivate first due to FK constraints
-        cursor.execute("DELETE FROM Cultivate WHERE farm_id = %s", (farm_id,))
-        # Delete the farm
-        cursor.execute("DELETE FROM farm WHERE farm_id = %s", (farm_id,))
-
-        conn.commit()
+        with db_cursor() as (conn, cursor):
+            # The cached owner may be stale (another worker may have deleted it); lock and re-check
+            cursor.execute("SELECT farm_id FROM farm WHERE farm_id = %s AND user_id = %s FOR UPDATE", (farm_id, user_id))
+            if cursor.fetchone() is None:
+                identity.forget_farm(farm_id)
+                return jsonify({'error': 'Farm not found'}), 404
+            # Delete related entries from Cultivate first due to FK constraints
+            cursor.execute("SELECT crop_name, quantity FROM Cultivate WHERE farm_id = %s FOR UPDATE", (farm_id,))
+            removed = {name: -quantity for name, quantity in cursor.fetchall()}
+            cursor.execute("DELETE FROM Cultivate WHERE farm_id = %s", (farm_id,))
+            cultivation.apply_deltas(cursor, removed)
+            # Delete the farm
+            cursor.execute("DELETE FROM farm WHERE farm_id = %s", (farm_id,))
+
+            conn.commit()
+        identity.forget_farm(farm_id)
         return jsonify({'message': 'Farm deleted successfully'}), 200
 
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
+@app.cli.command('reconcile-crop-totals')
+@click.option('--dry-run', is_flag=True, help='Report drift without rewriting CropTotals.')
+def reconcile_crop_totals(dry_run):
+    """Rebuild CropTotals from Cultivate and report any drift."""
+    with db_pool.connection() as conn:
+        drift = cultivation.reconcile(conn, fix=not dry_run)
+    for crop_name, (maintained, actual) in sorted(drift.items()):
+        click.echo(f"{crop_name}: maintained={maintained} actual={actual}")
+    click.echo(f"{len(drift)} crop(s) drifted" + (" (not fixed)" if dry_run and drift else ""))
+
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='List pending migrations without applying them.')
+@click.option('--target', type=int, default=None, help='Stop after this migration version.')
+def migrate_command(status, target):
+    """Apply pending schema migrations from migrations/."""
+    with db_pool.connection() as conn:
+        if status:
+            todo = migrate.pending(conn)
+            for version, name, _ in todo:
+                click.echo(f"pending {version:04d} {name}")
+            click.echo(f"{len(todo)} pending migration(s)")
+            return
+        applied = migrate.migrate(
+            conn, target=target, on_apply=lambda v, n: click.echo(f"applying {v:04d} {n}")
+        )
+    click.echo(f"{len(applied)} migration(s) applied")
+
+
+@app.cli.command('prefetch-weather')
+@click.option('--restart', is_flag=True, help='Start a new run instead of resuming an unfinished one.')
+@click.option('--status', is_flag=True, help='Show the latest run without fetching anything.')
+def prefetch_weather(restart, status):
+    """Precompute weather summaries for every farm's grid cell."""
+    locations = app.config['WEATHER_PREFETCH_LOCATIONS']
+    prefetcher = climate.WeatherPrefetcher(
+        db_cursor,
+        partial(fetch_archive_many, client=open_meteo, url=app.config['WEATHER_ARCHIVE_URL']),
+        weather_summaries,
+        TokenBucket(app.config['WEATHER_PREFETCH_RATE'], burst=max(locations, app.config['WEATHER_PREFETCH_RATE'])),
+        climate.periods(date.today(), climate_year=app.config['WEATHER_CLIMATE_YEAR']),
+        page_size=app.config['WEATHER_PREFETCH_PAGE_SIZE'],
+        locations_per_request=locations,
+    )
+
+    def report(run):
+        click.echo(
+            f"run {run['run_id']} {run['status']}: {run['farms']} farms, {run['cells']} cells, "
+            f"{run['fetched']} fetched in {run['requests']} requests, {run['failed']} failed, "
+            f"{run['elapsed_seconds']:.1f}s (after farm {run['last_farm_id']})"
+        )
+
+    if status:
+        run = prefetcher.latest_run()
+        if run is None:
+            click.echo("no runs yet")
+        else:
+            report(run)
+        return
+    report(prefetcher.run(resume=not restart, on_page=report))
+
+@app.cli.command('build-climatology')
+@click.option('--output', default=None, help='Grid file to write (default: CLIMATOLOGY_PATH).')
+@click.option('--resolution', type=float, default=None,
+              help='Cell size in degrees (default: WEATHER_GRID_RESOLUTION); coarser grids are smaller.')
+@click.option('--no-db', is_flag=True, help='Use only the local weather cache, not WeatherSummary.')
+def build_climatology(output, resolution, no_db):
+    """Build the offline climatology grid from cached archive data."""
+    year = app.config['WEATHER_CLIMATE_YEAR']
+    cells = climatology.cached_cells(weather_cache.store, year, db_cursor=None if no_db else db_cursor)
+    try:
+        grid = climatology.build(
+            output or app.config['CLIMATOLOGY_PATH'],
+            cells,
+            resolution or app.config['WEATHER_GRID_RESOLUTION'],
+            year,
+        )
+    except climatology.ClimatologyError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"{year} grid {grid['version']}: {grid['cells']} cells in {grid['rows']}x{grid['cols']} "
+        f"at {grid['resolution']:g} degrees"
+    )
+
+@app.cli.command('check-query-plans')
+def check_query_plans():
+    """EXPLAIN every query in the app and fail on full table scans."""
+    with db_pool.connection() as conn:
+        checked, problems = query_plans.check(conn)
+    for location, sql, detail in problems:
+        click.echo(f"{location}: {detail}" + (f"\n    {sql}" if sql else ''))
+    click.echo(f"{checked} queries checked, {len(problems)} problem(s)")
+    if problems:
+        raise SystemExit(1)
+
+@app.cli.command('bench-passwords')
+@click.option('--algorithm', type=click.Choice(passwords.ALGORITHMS), default=None,
+              help='KDF to benchmark (default: the configured one).')
+@click.option('--cost', 'costs', type=int, multiple=True,
+              help='Cost to measure; repeat for several. scrypt: log2 N, pbkdf2_sha256: iterations.')
+@click.option('--duration', type=float, default=2.0, help='Seconds to run each cost for.')
+def bench_passwords(algorithm, costs, duration):
+    """Report login verifications per second at each password cost."""
+    algorithm = algorithm or app.config['PASSWORD_ALGORITHM']
+    if not costs:
+        costs = (12, 13, 14, 15) if algorithm == 'scrypt' else (100000, 300000, 600000)
+    workers = app.config['PASSWORD_WORKERS']
+    click.echo(f"{algorithm}, {workers} worker(s), {duration:g}s per cost")
+    for cost, rate, latency in passwords.benchmark(algorithm, costs, workers=workers, duration=duration):
+        click.echo(f"cost={cost:<8} {rate:8.1f} logins/s  avg latency {latency * 1000:7.1f} ms")
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Development server only; production runs gunicorn -c gunicorn.conf.py wsgi:app
+    if app.config['MODEL_WARM_UP']:
+        warm_up_worker()
+    app.run(host='0.0.0.0', port=5001, debug=os.environ.get('FARMIE_DEBUG', '1') == '1')
@@ -19,6 +19,9 @@ type Crop = {
   crop_family: string;
 };
 
+// The catalogue rarely changes; keep it for the session and revalidate with its ETag
+let cropCatalogue: { etag: string; crops: Crop[] } | null = null;
+
 const AddCrop = () => {
   const { farm_id, farm_name } = useLocalSearchParams<{ farm_id: string; farm_name?: string }>();
   const [availableCrops, setAvailableCrops] = useState<Crop[]>([]);
@@ -31,8 +34,14 @@ const AddCrop = () => {
   useEffect(() => {
     const fetchCrops = async () => {
       try {
-        const res = await axios.get(`${config.API_BASE_URL}/get_all_crops`);
-        setAvailableCrops(res.data);
+        const res = await axios.get(`${config.API_BASE_URL}/get_all_crops`, {
+          headers: cropCatalogue ? { 'If-None-Match': cropCatalogue.etag } : {},
+          validateStatus: status => status === 200 || status === 304,
+        });
+        if (res.status === 200) {
+          cropCatalogue = { etag: res.headers['etag'], crops: res.data };
+        }
+        setAvailableCrops(cropCatalogue ? cropCatalogue.crops : res.data);
       } catch (err) {
         console.error(err);
         Alert.alert('Error', 'Failed to fetch crop list.');
@@ -11,6 +11,7 @@ const CropIdentifier = () => {
   const [loading, setLoading] = useState<boolean>(false);
   const [predictionResult, setPredictionResult] = useState<string>('');
   const [recommendations, setRecommendations] = useState<string[]>([]);
+  const [prefetchedRecommendations, setPrefetchedRecommendations] = useState<string[] | null>(null);
   const router = useRouter();
   const { farmId, farmName } = useLocalSearchParams();
 
@@ -50,6 +51,7 @@ const CropIdentifier = () => {
     setLoading(true);
     setPredictionResult('');
     setRecommendations([]);
+    setPrefetchedRecommendations(null);
 
     try {
       const token = await AsyncStorage.getItem('jwt_token');
@@ -58,22 +60,33 @@ const CropIdentifier = () => {
         return;
       }
 
-      const response = await axios.post(`${config.API_BASE_URL}/predict_crop`, formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-          Authorization: `Bearer ${token}`,
-        },
-      });
+      // With a farm selected, one round trip returns the prediction, family and recommendations
+      if (farmId) {
+        formData.append('farm_id', String(farmId));
+      }
+      const response = await axios.post(
+        `${config.API_BASE_URL}/${farmId ? 'identify_and_recommend' : 'predict_crop'}`,
+        formData,
+        {
+          headers: {
+            'Content-Type': 'multipart/form-data',
+            Authorization: `Bearer ${token}`,
+          },
+        }
+      );
 
       const { predicted_crop, confidence } = response.data;
-
-   
-      const familyResponse = await axios.get(`${config.API_BASE_URL}/crop_family`, {
-        params: { crop_name: predicted_crop },
-        headers: { Authorization: `Bearer ${token}` },
-      });
-
-      const { crop_family } = familyResponse.data;
+      let { crop_family } = response.data;
+
+      if (farmId) {
+        setPrefetchedRecommendations(response.data.recommendations);
+      } else {
+        const familyResponse = await axios.get(`${config.API_BASE_URL}/crop_family`, {
+          params: { crop_name: predicted_crop },
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        crop_family = familyResponse.data.crop_family;
+      }
 
 
       setPredictionResult(`Pioneer Plant: ${predicted_crop}\nPioneer Plant Family: ${crop_family}\nConfidence: ${confidence}`);
@@ -86,6 +99,11 @@ const CropIdentifier = () => {
   };
 
   const handleRecommendation = async () => {
+    if (prefetchedRecommendations) {
+      setRecommendations(prefetchedRecommendations);
+      return;
+    }
+
     const token = await AsyncStorage.getItem('jwt_token');
     if (!token) {
       Alert.alert('Authentication error', 'Please log in again.');
@@ -26,33 +26,20 @@ type WeatherStats = {
   totalRainfall: number;
 };
 
-const getYearlyWeatherStats = async (
-  latitude: number,
-  longitude: number
-): Promise<WeatherStats | null> => {
+const getYearlyWeatherStats = async (farmId: string): Promise<WeatherStats | null> => {
   try {
-    const start_date = '2024-01-01';
-    const end_date = '2024-12-31';
-
-    const url = `https://archive-api.open-meteo.com/v1/archive?latitude=${latitude}&longitude=${longitude}&start_date=${start_date}&end_date=${end_date}&daily=temperature_2m_mean,precipitation_sum,relative_humidity_2m_mean&timezone=auto`;
-
-    const response = await axios.get(url);
-    const data = response.data.daily;
-
-    const avgTemperature =
-      data.temperature_2m_mean.reduce((sum: number, val: number) => sum + val, 0) /
-      data.temperature_2m_mean.length;
-
-    const avgHumidity =
-      data.relative_humidity_2m_mean.reduce((sum: number, val: number) => sum + val, 0) /
-      data.relative_humidity_2m_mean.length;
-
-    const totalRainfall = data.precipitation_sum.reduce((sum: number, val: number) => sum + val, 0);
+    // Served from the per-cell summaries the backend precomputes
+    const token = await AsyncStorage.getItem('jwt_token');
+    const response = await axios.get(`${config.API_BASE_URL}/get_weather`, {
+      params: { farm_id: farmId, period: 'year' },
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    const data = response.data;
 
     return {
-      avgTemperature: parseFloat(avgTemperature.toFixed(2)),
-      avgHumidity: parseFloat(avgHumidity.toFixed(2)),
-      totalRainfall: parseFloat(totalRainfall.toFixed(2)),
+      avgTemperature: data.average_temperature,
+      avgHumidity: data.average_humidity,
+      totalRainfall: data.total_rainfall,
     };
   } catch (error) {
     console.error('Weather fetch error:', error);
@@ -131,9 +118,9 @@ const ViewFarm = () => {
   );
 
   useEffect(() => {
-    if (latitude && longitude) {
+    if (id) {
       setWeatherLoading(true);
-      getYearlyWeatherStats(parseFloat(latitude), parseFloat(longitude))
+      getYearlyWeatherStats(id)
         .then((stats) => {
           if (stats) {
             setWeatherStats(stats);
@@ -145,7 +132,7 @@ const ViewFarm = () => {
         .catch(() => setWeatherError('Could not fetch weather data.'))
         .finally(() => setWeatherLoading(false));
     }
-  }, [latitude, longitude]);
+  }, [id]);
 
   return (
     <View style={styles.container}>
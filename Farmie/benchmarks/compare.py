@@ -0,0 +1,47 @@
+"""Compare two benchmark result files: ``python -m benchmarks.compare old.json new.json``."""
+import json
+import sys
+
+
+def pct(old, new):
+    if not old or new is None:
+        return ''
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def compare(old, new):
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    print(f"{'route':<26}{'rps':>18}{'p50 ms':>20}{'p99 ms':>20}{'db q/req':>14}")
+    for route in sorted(set(old.get('routes', {})) | set(new.get('routes', {}))):
+        a, b = old['routes'].get(route), new['routes'].get(route)
+        if not a or not b:
+            print(f"{route:<26} only in {'new' if b else 'old'}")
+            continue
+        cells = [
+            (a['throughput_rps'], b['throughput_rps']),
+            (a['latency_ms']['p50'], b['latency_ms']['p50']),
+            (a['latency_ms']['p99'], b['latency_ms']['p99']),
+        ]
+        line = f'{route:<26}' + ''.join(f'{y:>10.1f}{pct(x, y):>8}' + '  ' for x, y in cells)
+        print(line + f"{a['db_queries_per_request']} -> {b['db_queries_per_request']}".rjust(12))
+    micro = sorted(set(old.get('micro', {})) & set(new.get('micro', {})))
+    if micro:
+        print(f"\n{'micro-benchmark':<26}{'best us':>18}")
+        for name in micro:
+            x, y = old['micro'][name]['best_us'], new['micro'][name]['best_us']
+            print(f'{name:<26}{y:>10.2f}{pct(x, y):>8}')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        raise SystemExit(__doc__)
+    with open(argv[0], encoding='utf-8') as f:
+        old = json.load(f)
+    with open(argv[1], encoding='utf-8') as f:
+        new = json.load(f)
+    compare(old, new)
+
+
+if __name__ == '__main__':
+    main()
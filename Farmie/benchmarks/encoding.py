@@ -0,0 +1,97 @@
+"""Bytes on the wire and serialization CPU for each list format.
+
+    python -m benchmarks.encoding [--rows 200] [--output results.json]
+
+Covers the shapes returned by ``get_farms_by_user`` and
+``get_crops_for_farm`` in each format ``encoding.list_response`` offers,
+with and without compression. Formats whose optional package is not
+installed are skipped.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import encoding  # noqa: E402
+
+from .micro import measure  # noqa: E402
+from .sqlite_shim import crop_rows  # noqa: E402
+
+
+def datasets(rows, seed):
+    rng = random.Random(seed)
+    crops = [row[:2] for row in crop_rows()]
+    return {
+        'farms': (('id', 'name', 'longitude', 'latitude'), [
+            (i, f'Farm {i}', round(rng.uniform(-120, 150), 6), round(rng.uniform(-35, 35), 6))
+            for i in range(1, rows + 1)
+        ]),
+        'crops_for_farm': (('crop_name', 'family', 'quantity'), [
+            (*rng.choice(crops), rng.randint(1, 500)) for _ in range(rows)
+        ]),
+    }
+
+
+def serializers():
+    def objects(columns, rows):
+        return [dict(zip(columns, row)) for row in rows]
+
+    def columnar(columns, rows):
+        return {'columns': list(columns), 'rows': [list(row) for row in rows]}
+
+    found = {
+        'objects/json': lambda c, r: json.dumps(objects(c, r), separators=(',', ':'), sort_keys=True).encode(),
+        'columns/json': lambda c, r: json.dumps(columnar(c, r), separators=(',', ':'), sort_keys=True).encode(),
+    }
+    if encoding.orjson is not None:
+        option = encoding.orjson.OPT_SORT_KEYS
+        found['objects/orjson'] = lambda c, r: encoding.orjson.dumps(objects(c, r), option=option)
+        found['columns/orjson'] = lambda c, r: encoding.orjson.dumps(columnar(c, r), option=option)
+    if encoding.msgpack is not None:
+        found['msgpack'] = lambda c, r: encoding.msgpack.packb(columnar(c, r))
+    return found
+
+
+def run(rows=200, seed=0):
+    encodings = ['identity', 'gzip'] + (['br'] if encoding.brotli is not None else [])
+    results = {}
+    for name, (columns, data) in datasets(rows, seed).items():
+        for fmt, serialize in serializers().items():
+            body = serialize(columns, data)
+            entry = {'serialize': measure(lambda: serialize(columns, data))}
+            for enc in encodings:
+                if enc == 'identity':
+                    entry['bytes_identity'] = len(body)
+                    continue
+                entry[f'bytes_{enc}'] = len(encoding.compress(body, enc))
+                entry[f'compress_{enc}'] = measure(lambda: encoding.compress(body, enc))
+            results[f'{name} {fmt}'] = entry
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bytes and CPU per response format.')
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.seed)
+    print(f"{'dataset / format':<34}{'bytes':>9}{'gzip':>8}{'br':>8}{'ser us':>10}{'gzip us':>10}{'br us':>9}")
+    for name, r in results.items():
+        br_bytes = r.get('bytes_br', '-')
+        br_us = f"{r['compress_br']['best_us']:.1f}" if 'compress_br' in r else '-'
+        print(f"{name:<34}{r['bytes_identity']:>9}{r['bytes_gzip']:>8}{br_bytes:>8}"
+              f"{r['serialize']['best_us']:>10.1f}{r['compress_gzip']['best_us']:>10.1f}{br_us:>9}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'rows': args.rows, 'results': results}, f, indent=2, sort_keys=True)
+        print(f'\nSaved {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Isolated micro-benchmarks for the recommendation and weather code paths."""
+import os
+import random
+import statistics
+import tempfile
+import timeit
+
+import numpy as np
+
+import climatology
+from recommender import CropCatalogue, Recommender
+from weather import grid_key, summarize_daily
+
+from .mocks import daily_series
+from .sqlite_shim import crop_rows
+
+CATALOGUE_COLUMNS = ('crop_name', 'crop_family', 'optimal_temp', 'optimal_humidity', 'optimal_rainfall')
+
+
+def measure(fn, repeat=5):
+    """Per-call timings of ``fn`` in microseconds, over ``repeat`` timed runs."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'calls_per_run': number,
+        'best_us': round(min(runs), 3),
+        'median_us': round(statistics.median(runs), 3),
+        'ops_per_sec': round(1e6 / min(runs), 1),
+    }
+
+
+def run(repeat=5, seed=0):
+    rng = random.Random(seed)
+    rows = [dict(zip(CATALOGUE_COLUMNS, row)) for row in crop_rows()]
+    catalogue = CropCatalogue(rows)
+    recommender = Recommender(lambda: rows)
+    names = catalogue.names
+
+    def climate():
+        return (rng.uniform(15, 35), rng.uniform(200, 3000), rng.uniform(30, 95))
+
+    single = (rng.choice(names), climate())
+    batch = [(rng.choice(names), climate()) for _ in range(256)]
+    weather = np.array([c for _, c in batch])
+    family_ids = np.array([catalogue.family_ids[catalogue.index[n]] for n, _ in batch])
+    year = daily_series(-1.9, '2024-01-01', '2024-12-31')
+    month = daily_series(-1.9, '2024-06-01', '2024-06-30')
+    # A 2 x 3 degree grid at 0.1 degrees, about the size of a small country
+    normals = [(-3 + r / 10, 29 + c / 10, *climate()) for r in range(20) for c in range(30)]
+    with tempfile.TemporaryDirectory() as grid_dir:
+        path = os.path.join(grid_dir, 'climatology.bin')
+        climatology.build(path, normals, 0.1, 2024)
+        # The mapping stays valid after the file is removed
+        grid = climatology.ClimatologyGrid(path)
+
+    cases = {
+        'recommend_single': lambda: recommender.recommend(single[0], single[1], 'banana', k=3),
+        'recommend_batch_256': lambda: recommender.recommend_batch(batch, 'banana', k=3),
+        'catalogue_score_256': lambda: catalogue.score(weather, family_ids),
+        'summarize_daily_year': lambda: summarize_daily(year),
+        'summarize_daily_month': lambda: summarize_daily(month),
+        'weather_grid_key': lambda: grid_key(-1.9441, 30.0619, '2024-01-01', '2024-12-31'),
+        'climatology_lookup': lambda: grid.lookup(-1.9441, 30.0619),
+    }
+    return {name: measure(fn, repeat) for name, fn in cases.items()}
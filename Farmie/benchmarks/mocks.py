@@ -0,0 +1,97 @@
+"""Local stand-ins for Open-Meteo and the model server with tunable latency."""
+import math
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from inference import CLASS_NAMES
+
+
+def daily_series(latitude, start_date, end_date):
+    """Deterministic, plausible daily weather for a latitude and date range."""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    days = (end - start).days + 1
+    base = 28 - abs(float(latitude)) * 0.4
+    temps, rain, humidity, times = [], [], [], []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        season = math.sin(2 * math.pi * day.timetuple().tm_yday / 365)
+        temps.append(round(base + 4 * season, 1))
+        rain.append(round(max(0.0, 3 + 5 * season), 1))
+        humidity.append(round(65 + 15 * season, 1))
+        times.append(day.isoformat())
+    return {
+        'time': times,
+        'temperature_2m_mean': temps,
+        'precipitation_sum': rain,
+        'relative_humidity_2m_mean': humidity,
+    }
+
+
+def create_mock_app(latency=0.0, jitter=0.0, batch_endpoint=True):
+    """One Flask app serving both upstreams; each call sleeps ``latency`` +/- ``jitter`` seconds.
+
+    ``batch_endpoint=False`` leaves out ``/predict_batch``, like a model
+    server that predates it.
+    """
+    app = Flask('farmie-benchmark-mocks')
+    app.config['CALLS'] = {'archive': 0, 'predict': 0, 'predict_batch': 0}
+    lock = threading.Lock()
+
+    def delay(endpoint):
+        with lock:
+            app.config['CALLS'][endpoint] += 1
+        pause = latency + random.uniform(-jitter, jitter)
+        if pause > 0:
+            time.sleep(pause)
+
+    def prediction(filename, payload):
+        # Same bytes, same answer, like a real model
+        index = sum(payload[:64]) % len(CLASS_NAMES)
+        return {'predicted_crop': CLASS_NAMES[index], 'confidence': 0.9}
+
+    @app.route('/v1/archive')
+    def archive():
+        delay('archive')
+        # Comma-separated coordinates get one result per location, as upstream does
+        latitudes = request.args['latitude'].split(',')
+        results = [
+            {'daily': daily_series(latitude, request.args['start_date'], request.args['end_date'])}
+            for latitude in latitudes
+        ]
+        return jsonify(results if len(latitudes) > 1 else results[0])
+
+    @app.route('/predict', methods=['POST'])
+    def predict():
+        delay('predict')
+        image = request.files['image']
+        return jsonify(prediction(image.filename, image.read()))
+
+    def predict_batch():
+        delay('predict_batch')
+        return jsonify({'predictions': [prediction(f.filename, f.read()) for f in request.files.getlist('images')]})
+
+    if batch_endpoint:
+        app.add_url_rule('/predict_batch', view_func=predict_batch, methods=['POST'])
+
+    return app
+
+
+class BackgroundServer:
+    """Serves a WSGI app from a daemon thread on an ephemeral local port."""
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        self._server = make_server(host, port, app, threaded=True)
+        self.url = f'http://{host}:{self._server.server_port}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
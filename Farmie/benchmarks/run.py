@@ -0,0 +1,373 @@
+"""Load test for the Flask routes plus the micro-benchmarks.
+
+Boots ``app.py`` on a local port against the SQLite stand-in and mocked
+upstreams, seeds users and farms, then drives a weighted mix of
+scenarios from concurrent clients. Run from the ``Farmie`` directory::
+
+    python -m benchmarks.run --duration 20 --concurrency 8 --upstream-latency-ms 40
+
+Results (throughput, p50/p95/p99 latency and DB queries per request for
+each route, plus the micro-benchmarks) are printed and saved as JSON
+under ``benchmarks/results/``; compare two runs with
+``python -m benchmarks.compare old.json new.json``.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from .sqlite_shim import crop_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FARMIE_DIR = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+DEFAULT_MIX = 'login=1,dashboard=5,add_crop=2,identify_and_recommend=2'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'Unknown scenario: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=FARMIE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_images(count, size, seed):
+    """``count`` distinct JPEGs of ``size``, roughly the weight of phone photos."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, 'JPEG', quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+# --- Scenarios: each returns (route label, response) ---
+class Client:
+    """One simulated user: a keep-alive session, a token and its farms."""
+
+    def __init__(self, base_url, user, rng, crop_names, images):
+        import requests
+
+        self.session = requests.Session()
+        self.base_url = base_url
+        self.user = user
+        self.rng = rng
+        self.images = images
+        self._crop_names = crop_names
+        self._farm_queue = list(user['farms'])
+        self._pairs = self._next_pairs()
+
+    def _next_pairs(self):
+        while self._farm_queue:
+            farm_id = self._farm_queue.pop(0)
+            for crop in self._crop_names:
+                yield farm_id, crop
+
+    def call(self, method, path, **kwargs):
+        headers = kwargs.pop('headers', {})
+        if self.user.get('token'):
+            headers['Authorization'] = f"Bearer {self.user['token']}"
+        return self.session.request(method, self.base_url + path, headers=headers, timeout=60, **kwargs)
+
+    def add_farm(self):
+        response = self.call('POST', '/add_farm', json={
+            'name': f"bench-{self.rng.randrange(10 ** 9)}",
+            'latitude': round(self.rng.uniform(-35, 35), 4),
+            'longitude': round(self.rng.uniform(-120, 150), 4),
+        })
+        return response
+
+
+def scenario_login(client):
+    return '/login', client.call('POST', '/login', json={
+        'user_name': client.user['user_name'], 'password': client.user['password'],
+    })
+
+
+def scenario_dashboard(client):
+    return '/dashboard', client.call('GET', '/dashboard')
+
+
+def scenario_add_crop(client):
+    pair = next(client._pairs, None)
+    if pair is None:
+        # Every crop is on every known farm; start a new farm
+        client.add_farm()
+        farms = client.call('GET', '/get_farms_by_user').json()
+        known = set(client.user['farms'])
+        client._farm_queue = [f['id'] for f in farms if f['id'] not in known]
+        client.user['farms'].extend(client._farm_queue)
+        client._pairs = client._next_pairs()
+        pair = next(client._pairs)
+    farm_id, crop_name = pair
+    return '/add_crop_to_farm', client.call('POST', '/add_crop_to_farm', json={
+        'farm_id': farm_id, 'crop_name': crop_name, 'quantity': client.rng.randint(1, 50),
+    })
+
+
+def scenario_identify_and_recommend(client):
+    image = client.rng.choice(client.images)
+    return '/identify_and_recommend', client.call(
+        'POST', '/identify_and_recommend',
+        data={'farm_id': client.rng.choice(client.user['farms'])},
+        files={'image': ('leaf.jpg', image, 'image/jpeg')},
+    )
+
+
+SCENARIOS = {
+    'login': scenario_login,
+    'dashboard': scenario_dashboard,
+    'add_crop': scenario_add_crop,
+    'identify_and_recommend': scenario_identify_and_recommend,
+}
+
+
+# --- Harness ---
+def boot(args, workdir):
+    """Import app.py wired to the shim and mocks; returns (module, server, mock_app)."""
+    sys.path.insert(0, FARMIE_DIR)
+    # Per-request access lines would cost more than some of the routes
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    from .mocks import BackgroundServer, create_mock_app
+    from .sqlite_shim import create_database
+
+    mock_app = create_mock_app(args.upstream_latency_ms / 1000, args.upstream_jitter_ms / 1000)
+    mocks = BackgroundServer(mock_app).start()
+
+    os.environ.update({
+        'FARMIE_MODEL_SERVER_URL': mocks.url,
+        'FARMIE_WEATHER_ARCHIVE_URL': mocks.url + '/v1/archive',
+        'FARMIE_WEATHER_CACHE_PATH': os.path.join(workdir, 'weather_cache.sqlite'),
+        'FARMIE_LOG_LEVEL': os.environ.get('FARMIE_LOG_LEVEL', 'WARNING'),
+    })
+    if args.password_cost is not None:
+        os.environ['FARMIE_PASSWORD_COST'] = str(args.password_cost)
+
+    import app as farmie
+    from db import ConnectionPool
+
+    farmie.db_pool = farmie.db_router.primary = ConnectionPool(
+        create_database(os.path.join(workdir, 'farmie.sqlite')),
+        size=farmie.app.config['DB_POOL_SIZE'],
+        timeout=farmie.app.config['DB_POOL_TIMEOUT'],
+        health_check_interval=farmie.app.config['DB_HEALTH_CHECK_INTERVAL'],
+        timer=farmie.phase,
+    )
+    server = BackgroundServer(farmie.app).start()
+    return farmie, server, mock_app
+
+
+def seed(base_url, args, rng):
+    import requests
+
+    session = requests.Session()
+    users = []
+    for i in range(args.users):
+        user = {'user_name': f'bench_user_{i}', 'password': f'pw-{i}', 'farms': []}
+        session.post(base_url + '/register', json={
+            'user_name': user['user_name'], 'email': f'bench{i}@example.com', 'password': user['password'],
+        })
+        token = session.post(base_url + '/login', json={
+            'user_name': user['user_name'], 'password': user['password'],
+        }).json()['access_token']
+        user['token'] = token
+        headers = {'Authorization': f'Bearer {token}'}
+        for _ in range(args.farms_per_user):
+            session.post(base_url + '/add_farm', headers=headers, json={
+                'name': f'farm-{rng.randrange(10 ** 9)}',
+                'latitude': round(rng.uniform(-35, 35), 4),
+                'longitude': round(rng.uniform(-120, 150), 4),
+            })
+        user['farms'] = [f['id'] for f in session.get(base_url + '/get_farms_by_user', headers=headers).json()]
+        users.append(user)
+    return users
+
+
+def drive(clients, mix, duration):
+    """Run every client in its own thread for ``duration`` seconds."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(client):
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+        while time.perf_counter() < deadline:
+            scenario = SCENARIOS[client.rng.choices(names, weights)[0]]
+            started = time.perf_counter()
+            try:
+                route, response = scenario(client)
+                failed = response.status_code >= 400
+            except Exception:
+                route, failed = scenario.__name__.replace('scenario_', '/'), True
+            local_latencies[route].append(time.perf_counter() - started)
+            if failed:
+                local_errors[route] += 1
+        with lock:
+            for route, samples in local_latencies.items():
+                latencies[route].extend(samples)
+            for route, count in local_errors.items():
+                errors[route] += count
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def server_delta(before, after, route):
+    """Requests served and DB/HTTP calls made for ``route`` between two snapshots."""
+    served = queries = http_calls = 0
+    for key, stats in after.items():
+        if key.partition(' ')[2] != route:
+            continue
+        prior = before.get(key, {'count': 0, 'phase_calls': {}})
+        served += stats['count'] - prior['count']
+        queries += stats['phase_calls'].get('db', 0) - prior['phase_calls'].get('db', 0)
+        http_calls += stats['phase_calls'].get('http', 0) - prior['phase_calls'].get('http', 0)
+    return served, queries, http_calls
+
+
+def summarize(latencies, errors, elapsed, before, after):
+    routes = {}
+    for route, samples in sorted(latencies.items()):
+        samples.sort()
+        served, queries, http_calls = server_delta(before, after, route)
+        routes[route] = {
+            'requests': len(samples),
+            'errors': errors.get(route, 0),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'latency_ms': {
+                'p50': round(percentile(samples, 0.50) * 1000, 2),
+                'p95': round(percentile(samples, 0.95) * 1000, 2),
+                'p99': round(percentile(samples, 0.99) * 1000, 2),
+                'max': round(samples[-1] * 1000, 2),
+            },
+            'db_queries_per_request': round(queries / served, 2) if served else None,
+            'upstream_calls_per_request': round(http_calls / served, 2) if served else None,
+        }
+    return routes
+
+
+def print_report(result):
+    print(f"commit {result['commit']}  duration {result['elapsed_s']}s  concurrency {result['config']['concurrency']}")
+    print(f"{'route':<26}{'req':>7}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'db q/req':>10}")
+    for route, r in result['routes'].items():
+        lat = r['latency_ms']
+        queries = r['db_queries_per_request']
+        print(f"{route:<26}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>9.1f}"
+              f"{lat['p50']:>9.1f}{lat['p95']:>9.1f}{lat['p99']:>9.1f}{queries if queries is not None else '-':>10}")
+    if result.get('micro'):
+        print(f"\n{'micro-benchmark':<26}{'best us':>12}{'median us':>12}{'ops/s':>14}")
+        for name, m in result['micro'].items():
+            print(f"{name:<26}{m['best_us']:>12.2f}{m['median_us']:>12.2f}{m['ops_per_sec']:>14.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--duration', type=float, default=15.0, help='Measured seconds of load.')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Unmeasured seconds before the run.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent simulated users.')
+    parser.add_argument('--users', type=int, default=None, help='Seeded users (default: concurrency).')
+    parser.add_argument('--farms-per-user', type=int, default=5)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help=f'Scenario weights, e.g. {DEFAULT_MIX}')
+    parser.add_argument('--upstream-latency-ms', type=float, default=50.0)
+    parser.add_argument('--upstream-jitter-ms', type=float, default=10.0)
+    parser.add_argument('--images', type=int, default=16, help='Distinct images to upload.')
+    parser.add_argument('--password-cost', type=int, default=None, help='Override FARMIE_PASSWORD_COST.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skip-load', action='store_true', help='Only run the micro-benchmarks.')
+    parser.add_argument('--skip-micro', action='store_true', help='Only run the load test.')
+    parser.add_argument('--output', default=None, help='JSON output path (default: benchmarks/results/).')
+    args = parser.parse_args(argv)
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+    args.users = args.users or args.concurrency
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': {'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'routes': {},
+        'micro': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='farmie-bench-') as workdir:
+        if not args.skip_load:
+            farmie, server, mock_app = boot(args, workdir)
+            rng = random.Random(args.seed)
+            users = seed(server.url, args, rng)
+            crop_names = [row[0] for row in crop_rows()]
+            images = make_images(args.images, (640, 480), args.seed)
+            clients = [
+                Client(server.url, users[i % len(users)], random.Random(args.seed * 1000 + i), crop_names, images)
+                for i in range(args.concurrency)
+            ]
+            if args.warmup > 0:
+                drive(clients, args.mix, args.warmup)
+            before = farmie.request_metrics.snapshot()
+            latencies, errors, elapsed = drive(clients, args.mix, args.duration)
+            after = farmie.request_metrics.snapshot()
+            result['elapsed_s'] = round(elapsed, 2)
+            result['routes'] = summarize(latencies, errors, elapsed, before, after)
+            result['upstream_calls'] = dict(mock_app.config['CALLS'])
+            server.stop()
+        else:
+            sys.path.insert(0, FARMIE_DIR)
+            result['elapsed_s'] = 0
+
+        if not args.skip_micro:
+            from . import micro
+            result['micro'] = micro.run()
+
+    print_report(result)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{result['commit'] or 'nocommit'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    print(f'\nSaved {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""SQLite stand-in for the MySQL connection the app expects.
+
+Only covers the SQL the app actually sends: ``%s`` placeholders,
+``FOR UPDATE``, ``ON DUPLICATE KEY UPDATE`` upserts, dictionary cursors
+and ``CHECKSUM TABLE``. Good enough to drive routes and count queries;
+not a substitute for profiling against MySQL itself.
+"""
+import os
+import re
+import sqlite3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CROPS_SQL = os.path.join(HERE, os.pardir, 'crops.sql')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS User (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_name TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS farm (
+    farm_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    farm_name TEXT,
+    longitude REAL,
+    latitude REAL
+);
+CREATE INDEX IF NOT EXISTS idx_farm_user_id ON farm (user_id);
+CREATE TABLE IF NOT EXISTS Crop (
+    crop_name TEXT PRIMARY KEY,
+    crop_family TEXT,
+    optimal_temp NUMERIC,
+    optimal_humidity NUMERIC,
+    optimal_rainfall NUMERIC
+);
+CREATE TABLE IF NOT EXISTS Cultivate (
+    farm_id INTEGER NOT NULL,
+    crop_name TEXT NOT NULL,
+    quantity INTEGER,
+    PRIMARY KEY (farm_id, crop_name)
+);
+CREATE TABLE IF NOT EXISTS CropTotals (
+    crop_name TEXT PRIMARY KEY,
+    total_quantity INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS WeatherSummary (
+    cell TEXT NOT NULL,
+    period TEXT NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    avg_temp REAL NOT NULL,
+    total_rain REAL NOT NULL,
+    avg_humidity REAL NOT NULL,
+    days INTEGER NOT NULL,
+    computed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (cell, period)
+);
+CREATE TABLE IF NOT EXISTS WeatherPrefetchRun (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP,
+    last_farm_id INTEGER NOT NULL DEFAULT 0,
+    farms INTEGER NOT NULL DEFAULT 0,
+    cells INTEGER NOT NULL DEFAULT 0,
+    fetched INTEGER NOT NULL DEFAULT 0,
+    requests INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    elapsed_seconds REAL NOT NULL DEFAULT 0
+);
+"""
+
+_UPSERT = re.compile(r'\bON DUPLICATE KEY UPDATE\b', re.IGNORECASE)
+_VALUES = re.compile(r'\bVALUES\((\w+)\)', re.IGNORECASE)
+_CHECKSUM = re.compile(r'^\s*CHECKSUM TABLE\s+(\w+)\s*$', re.IGNORECASE)
+
+
+def translate(sql):
+    checksum = _CHECKSUM.match(sql)
+    if checksum:
+        table = checksum.group(1)
+        return f"SELECT '{table}', COUNT(*) || ':' || COALESCE(MAX(rowid), 0) FROM {table}"
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\bFOR UPDATE\b', '', sql, flags=re.IGNORECASE)
+    parts = _UPSERT.split(sql, maxsplit=1)
+    if len(parts) == 2:
+        # Any number of `col = VALUES(col)` or `col = col + VALUES(col)` assignments
+        sql = parts[0] + 'ON CONFLICT DO UPDATE SET' + _VALUES.sub(r'excluded.\1', parts[1])
+    return sql
+
+
+class Cursor:
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate(sql), tuple(params or ()))
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate(sql), [tuple(p) for p in seq_of_params])
+        self.rowcount = self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path):
+        # DATE and TIMESTAMP columns come back as date/datetime, as from MySQL
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+    def cursor(self, dictionary=False, **kwargs):
+        return Cursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def start_transaction(self, **kwargs):
+        pass
+
+    def ping(self, reconnect=False):
+        self._conn.execute('SELECT 1')
+
+    def close(self):
+        self._conn.close()
+
+
+def crop_rows(path=CROPS_SQL):
+    """The ``Crop`` rows from crops.sql as tuples."""
+    with open(path, encoding='utf-8') as f:
+        values = f.read().split('VALUES', 1)[1].strip().rstrip(';')
+    conn = sqlite3.connect(':memory:')
+    try:
+        return conn.execute('SELECT * FROM (VALUES ' + values + ')').fetchall()
+    finally:
+        conn.close()
+
+
+def create_database(path):
+    """Create the schema and crop catalogue at ``path``; returns a connection factory."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany('INSERT OR IGNORE INTO Crop VALUES (?, ?, ?, ?, ?)', crop_rows())
+        conn.commit()
+    finally:
+        conn.close()
+    return lambda: Connection(path)
@@ -0,0 +1,173 @@
+"""NDJSON import and export of a large farm dataset.
+
+    python -m benchmarks.transfer [--rows 1000000] [--crops-per-farm 20] [--database sqlite|mysql]
+
+Boots ``app.py`` on a local port, registers one user and streams a
+generated NDJSON body of ``--rows`` crop rows into ``/import_farms``
+(chunked upload), then streams it back out of ``/export_farms``. Both
+are timed end to end over HTTP. Finally the export is run in-process
+twice under ``tracemalloc``: the streaming generator, and the same query
+with ``fetchall()`` and a single ``dumps`` the way the list routes work,
+to compare peak Python memory.
+
+``--database sqlite`` (the default) uses the SQLite stand-in in a temp
+directory; ``mysql`` uses the pool configured in ``app.py`` and leaves
+the imported rows behind.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FARMIE_DIR = os.path.dirname(HERE)
+
+from .sqlite_shim import crop_rows  # noqa: E402
+
+
+def boot(database, workdir):
+    sys.path.insert(0, FARMIE_DIR)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    os.environ.setdefault('FARMIE_LOG_LEVEL', 'WARNING')
+    os.environ['FARMIE_WEATHER_CACHE_PATH'] = os.path.join(workdir, 'weather_cache.sqlite')
+
+    import app as farmie
+    from db import ConnectionPool
+
+    from .mocks import BackgroundServer
+    from .sqlite_shim import create_database
+
+    if database == 'sqlite':
+        farmie.db_pool = farmie.db_router.primary = ConnectionPool(create_database(os.path.join(workdir, 'farmie.sqlite')), timer=farmie.phase)
+    return farmie, BackgroundServer(farmie.app).start()
+
+
+def generate(rows, crops_per_farm, seed):
+    """NDJSON lines totalling ``rows`` crop rows, in 1 MB-ish pieces."""
+    rng = random.Random(seed)
+    names = [row[0] for row in crop_rows()]
+    crops_per_farm = min(crops_per_farm, len(names))
+    pending, size, farm = [], 0, 0
+    while rows > 0:
+        count = min(crops_per_farm, rows)
+        rows -= count
+        farm += 1
+        line = json.dumps({
+            'name': f'farm-{farm}',
+            'latitude': round(rng.uniform(-35, 35), 4),
+            'longitude': round(rng.uniform(-120, 150), 4),
+            'crops': [{'crop_name': name, 'quantity': rng.randint(1, 500)} for name in rng.sample(names, count)],
+        }).encode() + b'\n'
+        pending.append(line)
+        size += len(line)
+        if size >= 1 << 20:
+            yield b''.join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b''.join(pending)
+
+
+def traced(fn):
+    """``(seconds, peak traced bytes)`` for one call of ``fn``."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        fn()
+        return time.perf_counter() - started, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='NDJSON import/export benchmark.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Crop rows to import and export.')
+    parser.add_argument('--crops-per-farm', type=int, default=20)
+    parser.add_argument('--database', choices=('sqlite', 'mysql'), default='sqlite')
+    parser.add_argument('--skip-buffered', action='store_true', help='Skip the fetchall() comparison.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args(argv)
+
+    import requests
+
+    with tempfile.TemporaryDirectory(prefix='farmie-transfer-') as workdir:
+        farmie, server = boot(args.database, workdir)
+        import transfer
+
+        session = requests.Session()
+        user = f'bench_transfer_{int(time.time())}'
+        session.post(server.url + '/register', json={'user_name': user, 'email': 'b@example.com', 'password': 'pw'})
+        token = session.post(server.url + '/login', json={'user_name': user, 'password': 'pw'}).json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        started = time.perf_counter()
+        response = session.post(
+            server.url + '/import_farms', data=generate(args.rows, args.crops_per_farm, args.seed),
+            headers={**headers, 'Content-Type': transfer.NDJSON_MIMETYPE},
+        )
+        import_s = time.perf_counter() - started
+        imported = response.json()
+        if response.status_code != 200:
+            raise SystemExit(f'Import failed: {imported}')
+
+        started = time.perf_counter()
+        exported_bytes = exported_lines = 0
+        with session.get(server.url + '/export_farms', headers=headers, stream=True) as response:
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                exported_bytes += len(chunk)
+                exported_lines += chunk.count(b'\n')
+        export_s = time.perf_counter() - started
+        server.stop()
+
+        with farmie.app.app_context():
+            user_id = farmie.identity._load_user_id(user)
+            dumps = farmie.app.json.dumps
+            chunk_size = farmie.app.config['EXPORT_CHUNK_SIZE']
+
+            def streaming():
+                for _ in transfer.export_farms(farmie.db_pool.connection(), user_id, dumps, chunk_size):
+                    pass
+
+            def buffered():
+                with farmie.db_cursor() as (conn, cursor):
+                    cursor.execute(transfer.EXPORT_QUERY, (user_id,))
+                    rows = cursor.fetchall()
+                dumps([dict(zip(('id', 'name', 'longitude', 'latitude', 'crop_name', 'quantity'), r)) for r in rows])
+
+            memory = {'streaming': traced(streaming)}
+            if not args.skip_buffered:
+                memory['buffered'] = traced(buffered)
+
+    result = {
+        'rows': args.rows,
+        'database': args.database,
+        'import': {
+            'seconds': round(import_s, 2), 'farms': imported['farms'], 'crops': imported['crops'],
+            'rows_per_sec': round(imported['crops'] / import_s, 1),
+        },
+        'export': {
+            'seconds': round(export_s, 2), 'bytes': exported_bytes, 'farms': exported_lines,
+            'rows_per_sec': round(imported['crops'] / export_s, 1),
+        },
+        'memory': {name: {'seconds': round(s, 2), 'peak_mb': round(peak / 2 ** 20, 1)}
+                   for name, (s, peak) in memory.items()},
+    }
+    print(f"import  {result['import']['seconds']:>8.2f}s  {result['import']['rows_per_sec']:>12.1f} rows/s  "
+          f"{imported['farms']} farms")
+    print(f"export  {result['export']['seconds']:>8.2f}s  {result['export']['rows_per_sec']:>12.1f} rows/s  "
+          f"{exported_bytes / 2 ** 20:.1f} MB")
+    for name, m in result['memory'].items():
+        print(f"{name:<10}{m['seconds']:>6.2f}s  peak {m['peak_mb']:>8.1f} MB traced")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f'\nSaved {args.output}')
+
+
+if __name__ == '__main__':
+    main()
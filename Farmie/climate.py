@@ -0,0 +1,277 @@
+"""Precomputed weather summaries per grid cell, and the batch job that fills them.
+
+``flask prefetch-weather`` (meant to run from cron, one run at a time)
+walks the farm table in farm_id order, collapses farms into weather grid
+cells and fetches many cells per Open-Meteo request under a token-bucket
+rate limit. Each cell gets one WeatherSummary row per period: the recent
+window shown on the farm screens and the climate year used for
+recommendations. Request handlers read those rows and only fetch live
+for cells the job has not reached yet.
+
+Progress is checkpointed in WeatherPrefetchRun after every page of farms,
+so an interrupted run resumes after the last finished page.
+"""
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+from identity import TTLCache
+from weather import WeatherError, grid_cell, is_immutable, summarize_daily
+
+logger = logging.getLogger('farmie.climate')
+
+# Cached in place of a WeatherSummary row that does not exist yet
+_MISSING = object()
+
+
+def recent_period(days):
+    return f'recent_{days}d'
+
+
+def year_period(year):
+    return f'year_{year}'
+
+
+def periods(today, recent_days=30, climate_year=2024):
+    """``{period: (start_date, end_date)}`` for every summary kept per cell."""
+    return {
+        year_period(climate_year): (date(climate_year, 1, 1), date(climate_year, 12, 31)),
+        recent_period(recent_days): (today - timedelta(days=recent_days), today),
+    }
+
+
+def summarize(daily):
+    """``(avg_temp, total_rain, avg_humidity, days)`` for daily archive data."""
+    return (*summarize_daily(daily), len(daily.get('temperature_2m_mean', [])))
+
+
+class SummaryStore:
+    """WeatherSummary rows by grid cell, with reads cached for ``ttl`` seconds.
+
+    Cells with no row yet are remembered for ``miss_ttl`` seconds, so pages
+    of farms the prefetch job has not reached do not query again on every
+    request. ``db_cursor`` is ``app.db_cursor``; cached reads may be served
+    by a replica.
+    """
+
+    def __init__(self, db_cursor, resolution=0.1, ttl=600.0, miss_ttl=60.0, max_entries=10000):
+        self._db_cursor = db_cursor
+        self.resolution = resolution
+        self.miss_ttl = miss_ttl
+        self.rows = TTLCache(ttl, max_entries)
+
+    def get(self, latitude, longitude, period, max_age=None):
+        """The cell's summary for ``period``, or None if missing or older than ``max_age`` seconds.
+
+        Best-effort: if the lookup fails (table missing, pool exhausted,
+        database down) the error is logged and None is returned, so callers
+        fall back to a live fetch.
+        """
+        cell = grid_cell(latitude, longitude, self.resolution)
+        row = self.rows.get((cell, period))
+        if row is None:
+            try:
+                row = self._load([cell], period)[cell]
+            except Exception as e:
+                logger.warning('Weather summary lookup failed', extra={'cell': cell, 'period': period, 'error': str(e)})
+                return None
+        if row is _MISSING:
+            return None
+        summary, computed_at = row
+        if max_age is not None and (datetime.now() - computed_at).total_seconds() > max_age:
+            return None
+        return summary
+
+    def preload(self, locations, period):
+        """Cache ``period`` for the cells of every ``(latitude, longitude)`` with one query.
+
+        For list pages: the ``get`` calls that follow are then all cache hits.
+        Best-effort like ``get``.
+        """
+        cells = {grid_cell(latitude, longitude, self.resolution) for latitude, longitude in locations}
+        cells = sorted(cell for cell in cells if (cell, period) not in self.rows)
+        if not cells:
+            return
+        try:
+            self._load(cells, period)
+        except Exception as e:
+            logger.warning('Weather summary lookup failed', extra={'cells': len(cells), 'period': period, 'error': str(e)})
+
+    def _load(self, cells, period):
+        with self._db_cursor(read_only=True) as (conn, cursor):
+            placeholders = ', '.join(['%s'] * len(cells))
+            cursor.execute(f"""
+                SELECT cell, avg_temp, total_rain, avg_humidity, days, computed_at
+                FROM WeatherSummary WHERE period = %s AND cell IN ({placeholders})
+            """, [period, *cells])
+            found = {row[0]: (tuple(row[1:5]), row[5]) for row in cursor.fetchall()}
+        for cell in cells:
+            if cell in found:
+                self.rows.set((cell, period), found[cell])
+            else:
+                self.rows.set((cell, period), _MISSING, ttl=self.miss_ttl)
+        return {cell: found.get(cell, _MISSING) for cell in cells}
+
+    def missing(self, cells, periods, since):
+        """``{period: [cell, ...]}`` still to fetch for ``cells``.
+
+        Summaries of finished years never change, so any stored row will do;
+        other periods count only if computed at or after ``since``.
+        """
+        with self._db_cursor() as (conn, cursor):
+            placeholders = ', '.join(['%s'] * len(cells))
+            cursor.execute(
+                f"SELECT cell, period, computed_at FROM WeatherSummary WHERE cell IN ({placeholders})",
+                list(cells),
+            )
+            stored = {(cell, period): computed_at for cell, period, computed_at in cursor.fetchall()}
+
+        todo = {}
+        for period, (start_date, end_date) in periods.items():
+            todo[period] = [
+                cell for cell in sorted(cells)
+                if (cell, period) not in stored
+                or not (is_immutable(end_date) or stored[cell, period] >= since)
+            ]
+        return todo
+
+    def put_many(self, rows):
+        """Upsert ``(cell, period, start_date, end_date, avg_temp, total_rain, avg_humidity, days, computed_at)`` rows."""
+        with self._db_cursor() as (conn, cursor):
+            cursor.executemany("""
+                INSERT INTO WeatherSummary
+                    (cell, period, start_date, end_date, avg_temp, total_rain, avg_humidity, days, computed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    start_date = VALUES(start_date), end_date = VALUES(end_date), avg_temp = VALUES(avg_temp),
+                    total_rain = VALUES(total_rain), avg_humidity = VALUES(avg_humidity), days = VALUES(days),
+                    computed_at = VALUES(computed_at)
+            """, rows)
+            conn.commit()
+        for row in rows:
+            self.rows.pop((row[0], row[1]))
+
+    def stats(self):
+        return self.rows.stats()
+
+
+class WeatherPrefetcher:
+    """Fills WeatherSummary for every farm's grid cell; see the module docstring.
+
+    ``fetch_many(locations, start_date, end_date)`` returns daily data for
+    each ``(latitude, longitude)``; ``rate_limit`` is an
+    ``http_client.TokenBucket`` charged one token per location fetched.
+    """
+
+    RUN_COLUMNS = ('run_id', 'status', 'started_at', 'finished_at', 'last_farm_id', 'farms', 'cells',
+                   'fetched', 'requests', 'failed', 'elapsed_seconds')
+
+    def __init__(self, db_cursor, fetch_many, store, rate_limit, periods, page_size=500, locations_per_request=50):
+        self._db_cursor = db_cursor
+        self._fetch_many = fetch_many
+        self.store = store
+        self.rate_limit = rate_limit
+        self.periods = periods
+        self.page_size = page_size
+        self.locations_per_request = locations_per_request
+
+    def run(self, resume=True, on_page=None):
+        """Prefetch every cell, resuming the latest unfinished run if ``resume``; returns the run row."""
+        run = self.latest_run() if resume else None
+        if run is None or run['status'] == 'done':
+            run = self._start_run()
+        else:
+            logger.info('Resuming weather prefetch', extra={'run_id': run['run_id'], 'after': run['last_farm_id']})
+            run['status'] = 'running'
+
+        started = time.monotonic()
+        elapsed = run['elapsed_seconds']
+        seen = set()
+        try:
+            while True:
+                farms = self._farm_page(run['last_farm_id'])
+                if not farms:
+                    break
+                cells = {grid_cell(lat, lon, self.store.resolution) for _, lat, lon in farms}
+                self._prefetch_cells(cells, run)
+                run['farms'] += len(farms)
+                run['cells'] += len(cells - seen)
+                seen |= cells
+                run['last_farm_id'] = farms[-1][0]
+                run['elapsed_seconds'] = round(elapsed + time.monotonic() - started, 3)
+                self._save_run(run)
+                if on_page:
+                    on_page(run)
+        except BaseException:
+            # UpstreamUnavailable, a DB error or Ctrl-C: keep the checkpoint for the next run
+            run['status'] = 'failed'
+            run['elapsed_seconds'] = round(elapsed + time.monotonic() - started, 3)
+            self._save_run(run)
+            raise
+
+        run['status'] = 'done'
+        run['finished_at'] = datetime.now().replace(microsecond=0)
+        run['elapsed_seconds'] = round(elapsed + time.monotonic() - started, 3)
+        self._save_run(run)
+        logger.info('Weather prefetch finished', extra={
+            k: run[k] for k in ('run_id', 'farms', 'cells', 'fetched', 'requests', 'failed', 'elapsed_seconds')
+        })
+        return run
+
+    def _prefetch_cells(self, cells, run):
+        for period, todo in self.store.missing(cells, self.periods, since=run['started_at']).items():
+            start_date, end_date = self.periods[period]
+            for i in range(0, len(todo), self.locations_per_request):
+                chunk = todo[i:i + self.locations_per_request]
+                self.rate_limit.acquire(len(chunk))
+                run['requests'] += 1
+                locations = [tuple(float(v) for v in cell.split(',')) for cell in chunk]
+                try:
+                    dailies = self._fetch_many(locations, start_date, end_date)
+                except WeatherError:
+                    logger.warning('Weather prefetch batch failed', extra={'period': period, 'cells': len(chunk)})
+                    run['failed'] += len(chunk)
+                    continue
+                computed_at = datetime.now().replace(microsecond=0)
+                self.store.put_many([
+                    (cell, period, start_date, end_date, *summarize(daily), computed_at)
+                    for cell, daily in zip(chunk, dailies)
+                ])
+                run['fetched'] += len(chunk)
+
+    def _farm_page(self, after_farm_id):
+        with self._db_cursor() as (conn, cursor):
+            cursor.execute("""
+                SELECT farm_id, latitude, longitude FROM farm
+                WHERE farm_id > %s ORDER BY farm_id LIMIT %s
+            """, (after_farm_id, self.page_size))
+            return cursor.fetchall()
+
+    def latest_run(self):
+        with self._db_cursor(dictionary=True) as (conn, cursor):
+            cursor.execute(f"SELECT {', '.join(self.RUN_COLUMNS)} FROM WeatherPrefetchRun ORDER BY run_id DESC LIMIT 1")
+            return cursor.fetchone()
+
+    def _start_run(self):
+        run = dict.fromkeys(self.RUN_COLUMNS, 0)
+        run.update(status='running', started_at=datetime.now().replace(microsecond=0), finished_at=None,
+                   elapsed_seconds=0.0)
+        with self._db_cursor() as (conn, cursor):
+            cursor.execute(
+                "INSERT INTO WeatherPrefetchRun (status, started_at) VALUES (%s, %s)", ('running', run['started_at'])
+            )
+            run['run_id'] = cursor.lastrowid
+            conn.commit()
+        logger.info('Weather prefetch started', extra={'run_id': run['run_id']})
+        return run
+
+    def _save_run(self, run):
+        with self._db_cursor() as (conn, cursor):
+            cursor.execute("""
+                UPDATE WeatherPrefetchRun
+                SET status = %s, finished_at = %s, last_farm_id = %s, farms = %s, cells = %s,
+                    fetched = %s, requests = %s, failed = %s, elapsed_seconds = %s
+                WHERE run_id = %s
+            """, (run['status'], run['finished_at'], run['last_farm_id'], run['farms'], run['cells'],
+                  run['fetched'], run['requests'], run['failed'], run['elapsed_seconds'], run['run_id']))
+            conn.commit()
@@ -0,0 +1,216 @@
+"""Offline climatology grid: annual weather normals per lat/lon cell.
+
+A dense float32 grid of (avg_temp, total_rain, avg_humidity) covering the
+bounding box of the cells it was built from, with missing cells as NaN::
+
+    header (128 bytes, little endian)
+        magic b'FARMCLIM', format version (u16), climate year (u16),
+        resolution in degrees (f64), first row and column as multiples of
+        the resolution (i32, i32), rows and columns (u32, u32),
+        data version (32 ASCII hex chars of the data's SHA-256)
+    data    rows * columns * 3 float32 values, row-major
+
+The file is opened with ``mmap``, so every worker shares the same page
+cache pages and a lookup is index arithmetic on the farm's coordinates.
+``flask build-climatology`` writes it from cached archive responses and
+the prefetched WeatherSummary rows; the file is replaced atomically and
+running workers pick up the new one on their next check.
+"""
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from climate import year_period
+from weather import summarize_daily
+
+MAGIC = b'FARMCLIM'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHdiiII32s')
+DATA_OFFSET = 128
+FIELDS = ('avg_temp', 'total_rain', 'avg_humidity')
+
+logger = logging.getLogger('farmie.climatology')
+
+# The farm's own cell first, then its neighbours
+_NEIGHBOURHOOD = [(0, 0)] + [(di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if di or dj]
+
+
+class ClimatologyError(Exception):
+    """Raised for a missing, truncated or incompatible grid file."""
+
+
+class ClimatologyGrid:
+    """One memory-mapped grid file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < DATA_OFFSET:
+            raise ClimatologyError(f'{path} is too short to be a climatology grid')
+        magic, fmt, self.year, self.resolution, self.row0, self.col0, self.rows, self.cols, version = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ClimatologyError(f'{path} is not a version {FORMAT_VERSION} climatology grid')
+        if len(self._mmap) != DATA_OFFSET + self.rows * self.cols * len(FIELDS) * 4:
+            raise ClimatologyError(f'{path} is truncated')
+        self.version = version.decode('ascii')
+        self.values = np.frombuffer(
+            self._mmap, dtype='<f4', count=self.rows * self.cols * len(FIELDS), offset=DATA_OFFSET
+        ).reshape(self.rows, self.cols, len(FIELDS))
+
+    def lookup(self, latitude, longitude):
+        """``(avg_temp, total_rain, avg_humidity)`` for the cell, or its nearest filled neighbour."""
+        row = round(float(latitude) / self.resolution) - self.row0
+        col = round(float(longitude) / self.resolution) - self.col0
+        for dr, dc in _NEIGHBOURHOOD:
+            r, c = row + dr, col + dc
+            if 0 <= r < self.rows and 0 <= c < self.cols:
+                temp, rain, humidity = self.values[r, c].tolist()
+                if not math.isnan(temp):
+                    return round(temp, 2), round(rain, 2), round(humidity, 2)
+        return None
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'year': self.year,
+            'resolution': self.resolution,
+            'rows': self.rows,
+            'cols': self.cols,
+            'cells': int(np.count_nonzero(~np.isnan(self.values[:, :, 0]))),
+        }
+
+
+class Climatology:
+    """Looks up normals in the grid at ``path``, reopening it when the file is replaced.
+
+    A missing file, or one built for another year, simply yields no answers.
+    """
+
+    def __init__(self, path, year, check_interval=60.0):
+        self.path = path
+        self.year = year
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._grid = None
+        self._identity = None
+        self._checked_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def grid(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._grid
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                self._refresh()
+            return self._grid
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._grid = self._identity = None
+            return
+        identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if identity == self._identity:
+            return
+        self._identity = identity
+        try:
+            grid = ClimatologyGrid(self.path)
+        except (OSError, ValueError, ClimatologyError):
+            logger.exception('Could not open climatology grid', extra={'path': self.path})
+            self._grid = None
+            return
+        if grid.year != self.year:
+            logger.warning('Climatology grid is for another year', extra={'path': self.path, 'year': grid.year})
+            grid = None
+        # The previous mapping is left to the garbage collector; a lookup may still be reading it
+        self._grid = grid
+
+    def lookup(self, latitude, longitude):
+        grid = self.grid()
+        normals = grid.lookup(latitude, longitude) if grid is not None else None
+        with self._lock:
+            if normals is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return normals
+
+    def stats(self):
+        grid = self.grid()
+        with self._lock:
+            stats = {'loaded': grid is not None, 'hits': self.hits, 'misses': self.misses}
+        if grid is not None:
+            stats.update(grid.describe())
+        return stats
+
+
+def build(path, cells, resolution, year):
+    """Write a grid from ``(latitude, longitude, avg_temp, total_rain, avg_humidity)`` tuples.
+
+    Cells that land in the same grid cell are averaged. Returns the new
+    grid's ``describe()``.
+    """
+    sums = defaultdict(lambda: [0.0, 0.0, 0.0, 0])
+    for latitude, longitude, *values in cells:
+        entry = sums[round(float(latitude) / resolution), round(float(longitude) / resolution)]
+        for i, value in enumerate(values):
+            entry[i] += float(value)
+        entry[3] += 1
+    if not sums:
+        raise ClimatologyError(f'No {year} climate data to build a grid from')
+
+    row0 = min(r for r, _ in sums)
+    col0 = min(c for _, c in sums)
+    rows = max(r for r, _ in sums) - row0 + 1
+    cols = max(c for _, c in sums) - col0 + 1
+    values = np.full((rows, cols, len(FIELDS)), np.nan, dtype='<f4')
+    for (r, c), (temp, rain, humidity, n) in sums.items():
+        values[r - row0, c - col0] = (temp / n, rain / n, humidity / n)
+
+    data = values.tobytes()
+    version = hashlib.sha256(data).hexdigest()[:32].encode('ascii')
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, year, resolution, row0, col0, rows, cols, version)
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header.ljust(DATA_OFFSET, b'\0'))
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers either see the old file or the complete new one
+    os.replace(tmp, path)
+    return ClimatologyGrid(path).describe()
+
+
+def cached_cells(weather_store, year, db_cursor=None):
+    """Annual normals for ``year`` from the weather store and, if given, WeatherSummary.
+
+    Yields ``(latitude, longitude, avg_temp, total_rain, avg_humidity)``.
+    """
+    start_date, end_date = f'{year}-01-01', f'{year}-12-31'
+    for key, daily in weather_store.entries():
+        latitude, longitude, key_start, key_end = key.split(',')
+        if (key_start, key_end) == (start_date, end_date):
+            yield (float(latitude), float(longitude), *summarize_daily(daily))
+
+    if db_cursor is not None:
+        with db_cursor() as (conn, cursor):
+            # Offline build: reading the whole (small) table is intended
+            cursor.execute("SELECT cell, period, avg_temp, total_rain, avg_humidity FROM WeatherSummary")
+            rows = cursor.fetchall()
+        for cell, period, *values in rows:
+            if period == year_period(year):
+                yield (*(float(v) for v in cell.split(',')), *values)
@@ -1,4 +1,4 @@
-CREATE TABLE Crop (
+CREATE TABLE IF NOT EXISTS Crop (
     crop_name VARCHAR(100) PRIMARY KEY,
     crop_family VARCHAR(100) NOT NULL,
     optimal_temp NUMERIC,      -- Average temperature in °C
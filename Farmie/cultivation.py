@@ -0,0 +1,69 @@
+"""Maintained per-crop cultivation totals.
+
+``CropTotals`` mirrors ``SELECT crop_name, SUM(quantity) FROM Cultivate
+GROUP BY crop_name``. Every route that writes Cultivate adjusts it inside
+the same transaction, so the recommender can read the most cultivated crop
+with one indexed lookup instead of aggregating all farms.
+"""
+
+MOST_CULTIVATED_QUERY = """
+    SELECT crop_name
+    FROM CropTotals
+    WHERE total_quantity > 0
+    ORDER BY total_quantity DESC, crop_name
+    LIMIT 1
+"""
+
+DELTA_QUERY = """
+    INSERT INTO CropTotals (crop_name, total_quantity)
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE total_quantity = total_quantity + VALUES(total_quantity)
+"""
+
+
+def apply_deltas(cursor, deltas):
+    """Add ``{crop_name: delta}`` to the running totals (caller commits)."""
+    rows = [(name, int(delta)) for name, delta in deltas.items() if delta]
+    if rows:
+        cursor.executemany(DELTA_QUERY, rows)
+
+
+def most_cultivated(cursor):
+    cursor.execute(MOST_CULTIVATED_QUERY)
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row['crop_name'] if isinstance(row, dict) else row[0]
+
+
+def reconcile(conn, fix=True):
+    """Rebuild CropTotals from Cultivate and return the drift that was found.
+
+    The result maps crop_name to ``(maintained, actual)`` for every crop whose
+    maintained total disagreed with Cultivate.
+    """
+    cursor = conn.cursor()
+    try:
+        # Lock Cultivate rows so writers cannot slip in between read and rewrite
+        cursor.execute("SELECT crop_name, SUM(quantity) FROM Cultivate GROUP BY crop_name FOR UPDATE")
+        actual = {name: int(total or 0) for name, total in cursor.fetchall()}
+        cursor.execute("SELECT crop_name, total_quantity FROM CropTotals FOR UPDATE")
+        maintained = {name: int(total) for name, total in cursor.fetchall()}
+
+        drift = {}
+        for name in set(actual) | set(maintained):
+            have, want = maintained.get(name, 0), actual.get(name, 0)
+            if have != want:
+                drift[name] = (have, want)
+
+        if fix and drift:
+            cursor.executemany(
+                "REPLACE INTO CropTotals (crop_name, total_quantity) VALUES (%s, %s)",
+                [(name, want) for name, (_, want) in drift.items()],
+            )
+            conn.commit()
+        else:
+            conn.rollback()
+        return drift
+    finally:
+        cursor.close()
@@ -0,0 +1,459 @@
+import mmap
+import queue
+import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager, nullcontext
+
+import mysql.connector
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of reusable DB connections.
+
+    ``connect`` is any zero-argument callable returning a DB-API style
+    connection, so the pool can run against MySQL or a local stand-in.
+    ``timer(phase, count=True)``, if given, returns a context manager that
+    is wrapped around pool waits and every cursor call.
+    """
+
+    def __init__(self, connect, size=10, timeout=5.0, health_check_interval=30.0, timer=None):
+        self._connect = connect
+        self.timer = timer
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # --- Checkout / Release ---
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        with self.timer('db', count=False) if self.timer else nullcontext():
+            conn = self._take(started + timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def _take(self, deadline):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open_if_room()
+                if conn is not None:
+                    return conn
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timed_out()
+                try:
+                    conn, last_used = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    self._timed_out()
+
+            if self._is_healthy(conn, last_used):
+                return conn
+            self._discard(conn)
+
+    def _open_if_room(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _timed_out(self):
+        with self._lock:
+            self._timeouts += 1
+        raise PoolTimeout(f'No database connection available within {self.timeout}s')
+
+    def _is_healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+            self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn, broken=False):
+        with self._lock:
+            self._in_use -= 1
+        if not broken:
+            # End any open transaction so the next borrower does not inherit
+            # uncommitted writes or a stale REPEATABLE READ snapshot.
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield TimedConnection(conn, self.timer) if self.timer else conn
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            # The server dropped us; don't hand this connection out again
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    # --- Metrics ---
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.size,
+                'size': self._created,
+                'idle': self._created - self._in_use,
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'wait_time_total': round(self._wait_total, 6),
+                'wait_time_max': round(self._wait_max, 6),
+                'wait_time_avg': round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+            }
+
+
+class TimedConnection:
+    """Connection proxy whose cursors report their time to ``timer``."""
+
+    def __init__(self, conn, timer):
+        self._conn = conn
+        self._timer = timer
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._timer)
+
+    def commit(self):
+        with self._timer('db', count=False):
+            return self._conn.commit()
+
+    def rollback(self):
+        with self._timer('db', count=False):
+            return self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class TimedCursor:
+    """Cursor proxy: executes count as queries, fetches only add time."""
+
+    def __init__(self, cursor, timer):
+        self._cursor = cursor
+        self._timer = timer
+
+    def execute(self, *args, **kwargs):
+        with self._timer('db'):
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        with self._timer('db'):
+            return self._cursor.executemany(*args, **kwargs)
+
+    def fetchone(self):
+        with self._timer('db', count=False):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with self._timer('db', count=False):
+            return self._cursor.fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        with self._timer('db', count=False):
+            return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ReadPins:
+    """Per-client "read from the primary until" deadlines, shared across forked workers.
+
+    Deadlines live in an anonymous shared mapping, so when it is created
+    before gunicorn forks (``preload_app``) a write handled by one worker
+    pins the client's reads in all of them. Keys hash to one of ``slots``
+    slots; a collision only sends a few extra reads to the primary.
+    """
+
+    def __init__(self, slots=65536):
+        self.slots = slots
+        self._map = mmap.mmap(-1, slots * 8)
+        self._until = memoryview(self._map).cast('d')
+
+    def pin(self, keys, seconds):
+        until = time.monotonic() + seconds
+        for key in keys:
+            slot = self._slot(key)
+            if self._until[slot] < until:
+                self._until[slot] = until
+
+    def pinned(self, keys):
+        now = time.monotonic()
+        return any(self._until[self._slot(key)] > now for key in keys)
+
+    def _slot(self, key):
+        return zlib.crc32(str(key).encode()) % self.slots
+
+
+class Replica:
+    """Routing state of one replica pool."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None
+        self.checked_at = None
+        self.down_until = 0.0
+        self.reads = 0
+        self.failures = 0
+
+    def usable(self, now, max_lag, check_interval):
+        if now < self.down_until:
+            return False
+        # A lagging replica is skipped until its lag is due to be checked again
+        lagging = self.checked_at is not None and (self.lag is None or self.lag > max_lag)
+        return not (lagging and now - self.checked_at < check_interval)
+
+    def state(self, now, max_lag):
+        if now < self.down_until:
+            return 'down'
+        if self.checked_at is not None and (self.lag is None or self.lag > max_lag):
+            return 'lagging'
+        return 'ok'
+
+
+class QueryRouter:
+    """Sends writes to the primary pool and read-only work to replica pools.
+
+    ``connection(read_only=True, keys=...)`` hands out a connection from a
+    usable replica, round robin. The primary answers instead when no
+    replica is configured or usable, and while any of ``keys`` (the
+    client making the request) is pinned: a commit on a primary connection
+    pins its keys for ``pin_seconds``, so clients read their own writes.
+
+    ``lag(conn)`` returns how many seconds a replica is behind, or None if
+    replication is broken; it is checked at most every ``check_interval``
+    seconds per replica and replicas over ``max_lag`` are skipped. Keep
+    ``pin_seconds`` above ``max_lag + check_interval``. A replica that
+    cannot be reached is skipped for ``retry_interval`` seconds; one whose
+    pool is merely busy for ``replica_timeout`` seconds is passed over for
+    that read only.
+    """
+
+    def __init__(self, primary, replicas=None, pin_seconds=5.0, max_lag=2.0, check_interval=1.0,
+                 retry_interval=10.0, replica_timeout=0.5, lag=None, pins=None):
+        self.primary = primary
+        self.replicas = [Replica(name, pool) for name, pool in (replicas or {}).items()]
+        self.pin_seconds = pin_seconds
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_interval = retry_interval
+        self.replica_timeout = replica_timeout
+        self.lag = lag
+        self.pins = pins if pins is not None else ReadPins()
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._primary_reads = 0
+        self._pinned_reads = 0
+        self._fallback_reads = 0
+        self._pins_set = 0
+
+    @contextmanager
+    def connection(self, read_only=False, keys=(), timeout=None):
+        if not self.replicas:
+            with self.primary.connection(timeout) as conn:
+                yield conn
+            return
+        if not read_only:
+            with self.primary.connection(timeout) as conn:
+                yield PinningConnection(conn, self, keys) if keys else conn
+            return
+
+        if keys and self.pins.pinned(keys):
+            self._count('_pinned_reads')
+        else:
+            for replica in self._candidates():
+                stack = ExitStack()
+                conn = self._checkout(replica, stack)
+                if conn is None:
+                    continue
+                with self._lock:
+                    replica.reads += 1
+                try:
+                    with stack:
+                        yield conn
+                except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+                    self._mark_down(replica)
+                    raise
+                return
+            self._count('_fallback_reads')
+        self._count('_primary_reads')
+        with self.primary.connection(timeout) as conn:
+            yield conn
+
+    def _candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [r for r in ordered if r.usable(now, self.max_lag, self.check_interval)]
+
+    def _checkout(self, replica, stack):
+        """A connection from ``replica`` entered on ``stack``, or None if it should be passed over."""
+        try:
+            conn = stack.enter_context(replica.pool.connection(self.replica_timeout))
+        except PoolTimeout:
+            return None
+        except Exception:
+            self._mark_down(replica)
+            return None
+        if self.lag is None:
+            return conn
+
+        now = time.monotonic()
+        if replica.checked_at is None or now - replica.checked_at >= self.check_interval:
+            try:
+                lag = self.lag(conn)
+            except Exception:
+                stack.close()
+                self._mark_down(replica)
+                return None
+            with self._lock:
+                replica.lag, replica.checked_at = lag, now
+        if replica.lag is None or replica.lag > self.max_lag:
+            stack.close()
+            return None
+        return conn
+
+    def _mark_down(self, replica):
+        with self._lock:
+            replica.failures += 1
+            replica.down_until = time.monotonic() + self.retry_interval
+
+    def pin(self, keys):
+        self.pins.pin(keys, self.pin_seconds)
+        self._count('_pins_set')
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def close_all(self):
+        self.primary.close_all()
+        for replica in self.replicas:
+            replica.pool.close_all()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = {
+                'primary_reads': self._primary_reads,
+                'pinned_reads': self._pinned_reads,
+                'fallback_reads': self._fallback_reads,
+                'replica_reads': sum(r.reads for r in self.replicas),
+                'pins': self._pins_set,
+            }
+            replicas = {
+                r.name: {
+                    'state': r.state(now, self.max_lag),
+                    'lag': r.lag,
+                    'reads': r.reads,
+                    'failures': r.failures,
+                }
+                for r in self.replicas
+            }
+        for replica in self.replicas:
+            replicas[replica.name]['pool'] = replica.pool.stats()
+        stats['replicas'] = replicas
+        return stats
+
+
+class PinningConnection:
+    """Primary connection proxy that pins ``keys`` to the primary on commit."""
+
+    def __init__(self, conn, router, keys):
+        self._conn = conn
+        self._router = router
+        self._keys = keys
+
+    def commit(self):
+        result = self._conn.commit()
+        self._router.pin(self._keys)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def mysql_replica_lag(conn):
+    """``QueryRouter`` lag check for MySQL 8.0.22+: seconds behind the source, None if stopped."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute('SHOW REPLICA STATUS')
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        # Not replicating at all: a standalone server listed as a replica counts as current
+        return 0.0
+    lag = row.get('Seconds_Behind_Source')
+    return None if lag is None else float(lag)
+
+
+def mysql_connector(**params):
+    """Connection factory for ``ConnectionPool`` backed by mysql-connector."""
+    def connect():
+        return mysql.connector.connect(**params)
+    return connect
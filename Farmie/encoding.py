@@ -0,0 +1,147 @@
+"""Response encoding: fast JSON, compact list formats and compression.
+
+``orjson`` (JSON), ``brotli`` (``Content-Encoding: br``) and ``msgpack``
+(the MessagePack list format) are in requirements.txt, but each is
+imported only if present. Without them JSON falls back to the standard
+library encoder, compression to gzip, and MessagePack requests get a 406.
+"""
+import gzip
+
+from flask import current_app, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+LIST_FORMATS = ('objects', 'columns', 'msgpack')
+COMPRESSIBLE_MIMETYPES = {'application/json', MSGPACK_MIMETYPE, 'text/plain', 'text/html', 'text/csv'}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with orjson when it is installed.
+
+    Values go through the default provider's ``default``, so dates and
+    datetimes are still RFC 822 strings and ``Decimal``, ``UUID`` and
+    dataclasses come out as before. Anything orjson rejects (integers
+    beyond 64 bits, ``float`` subclasses such as ``numpy.float64``) is
+    encoded by the default provider instead. Differences that remain:
+
+    - non-ASCII text is sent as UTF-8 rather than ``\\u`` escaped
+    - NaN and infinities become ``null`` rather than the invalid ``NaN``
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson(obj).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = self._orjson(obj)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+    def _orjson(self, obj):
+        # Dates are handed to ``default`` so they keep Flask's format
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+
+# --- List formats ---
+def negotiate_list_format():
+    """``?format=`` wins; otherwise an Accept of application/msgpack selects MessagePack."""
+    fmt = request.args.get('format')
+    if fmt in LIST_FORMATS:
+        return fmt
+    best = request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE, 'application/x-msgpack'])
+    return 'msgpack' if best in (MSGPACK_MIMETYPE, 'application/x-msgpack') else 'objects'
+
+
+def list_response(columns, rows, fmt=None):
+    """Render ``rows`` (value sequences in ``columns`` order) in the negotiated format.
+
+    - ``objects``: a JSON array of objects, the original shape
+    - ``columns``: ``{"columns": [...], "rows": [[...], ...]}``, keys sent once
+    - ``msgpack``: the columnar shape as MessagePack
+    """
+    fmt = fmt or negotiate_list_format()
+    if fmt == 'objects':
+        response = jsonify([dict(zip(columns, row)) for row in rows])
+    elif fmt == 'columns':
+        response = jsonify({'columns': list(columns), 'rows': [list(row) for row in rows]})
+    elif msgpack is None:
+        response = jsonify({'error': 'MessagePack is not available on this server'})
+        response.status_code = 406
+    else:
+        body = msgpack.packb({'columns': list(columns), 'rows': [list(row) for row in rows]}, default=str)
+        response = current_app.response_class(body, mimetype=MSGPACK_MIMETYPE)
+    response.vary.add('Accept')
+    return response
+
+
+# --- Compression ---
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5 if level is None else level)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+
+
+def choose_encoding(accept_encodings):
+    """Best supported encoding the client accepts, preferring br on ties."""
+    supported = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_q = None, 0
+    for encoding in supported:
+        q = accept_encodings[encoding]
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def install_compression(app, min_size=1024):
+    """Compress eligible responses of at least ``min_size`` bytes by Accept-Encoding."""
+
+    @app.after_request
+    def _compress_response(response):
+        if (
+            response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # The bytes now differ per encoding, so a strong validator becomes weak
+        tag, weak = response.get_etag()
+        if tag and not weak:
+            response.set_etag(tag, weak=True)
+        return response
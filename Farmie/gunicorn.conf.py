@@ -0,0 +1,58 @@
+"""gunicorn settings: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Threaded workers suit this app: most request time is spent waiting on
+MySQL, Open-Meteo or the model server, while the CPU-heavy parts
+(password KDF, NumPy scoring, local inference) release the GIL. Every
+setting can be overridden with a FARMIE_* environment variable.
+"""
+import multiprocessing
+import os
+import signal
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get('FARMIE_BIND', '0.0.0.0:5001')
+worker_class = 'gthread'
+# One process per core; with in-process inference each worker loads its own
+# copy of the model after forking, so lower this if memory is tight
+workers = int(os.environ.get('FARMIE_WORKERS', cores))
+threads = int(os.environ.get('FARMIE_THREADS', 8))
+# Import app.py and warm the catalogue once in the master, then fork (the
+# model is loaded per worker, in post_worker_init)
+preload_app = os.environ.get('FARMIE_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('FARMIE_WORKER_TIMEOUT', 60))
+# On SIGTERM, workers stop accepting and get this long to finish in-flight requests
+graceful_timeout = int(os.environ.get('FARMIE_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('FARMIE_KEEPALIVE', 5))
+# Recycle workers now and then to bound slow leaks; jitter avoids all restarting at once
+max_requests = int(os.environ.get('FARMIE_MAX_REQUESTS', 0))
+max_requests_jitter = max(1, max_requests // 10) if max_requests else 0
+
+accesslog = os.environ.get('FARMIE_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    import app as farmie
+    import wsgi
+
+    # In-process models are not fork-safe, so each worker loads its own here
+    wsgi.warm_up_worker()
+
+    # Fail /ready as soon as SIGTERM arrives, before gunicorn's own handler
+    # stops the accept loop and waits for in-flight requests
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        farmie.draining.set()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def worker_exit(server, worker):
+    import app as farmie
+
+    farmie.shutdown()
@@ -0,0 +1,233 @@
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream is down, overloaded or its circuit is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and fails fast until
+    ``reset_timeout`` has passed, then lets a single trial call through."""
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self):
+        # The trial call ended without saying anything about the upstream; let another through
+        with self._lock:
+            self._trial_running = False
+
+
+class TokenBucket:
+    """Blocking rate limit: ``rate`` tokens per second, bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.waited = 0.0
+
+    def acquire(self, tokens=1):
+        """Take ``tokens``, sleeping until they are available; returns the time waited."""
+        tokens = min(tokens, self.burst)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve now and sleep off any deficit, so callers are served in order
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class Upstream:
+    """Shared client for one upstream service.
+
+    Wraps a keep-alive ``requests.Session`` with per-call timeouts, a cap on
+    concurrent calls, jittered retries and a circuit breaker. ``timer``, as
+    for ``db.ConnectionPool``, is wrapped around each call, retries included.
+    """
+
+    def __init__(self, name, base_url='', connect_timeout=3.0, read_timeout=10.0, max_concurrency=10,
+                 queue_timeout=1.0, retries=2, backoff=0.2, breaker=None, session=None, timer=None):
+        self.name = name
+        self.timer = timer
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=2048)
+        self._calls = 0
+        self._failures = 0
+        self._retried = 0
+        self._rejected = 0
+        self._in_flight = 0
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def request(self, method, path, retries=None, **kwargs):
+        """Send a request and return the ``requests.Response``.
+
+        Only idempotent methods are retried unless ``retries`` is given; a
+        streamed request body cannot be replayed, so leave POST at zero.
+        """
+        if retries is None:
+            retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+        kwargs.setdefault('timeout', self.timeout)
+        url = path if path.startswith(('http://', 'https://')) else self.base_url + path
+
+        if self.breaker.state == 'open':
+            self._count('_rejected')
+            raise UpstreamUnavailable(f'{self.name} is unavailable (circuit open)')
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('_rejected')
+            raise UpstreamUnavailable(f'{self.name} is overloaded')
+        # Only claim a half-open trial once we hold a slot, so a queue timeout cannot strand it
+        if not self.breaker.allow():
+            self._slots.release()
+            self._count('_rejected')
+            raise UpstreamUnavailable(f'{self.name} is unavailable (circuit open)')
+
+        try:
+            with self._lock:
+                self._in_flight += 1
+            with self.timer('http') if self.timer else nullcontext():
+                return self._send(method, url, retries, kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _send(self, method, url, retries, kwargs):
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                failed = response.status_code >= 500
+                error = None
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                response, failed, error = None, True, e
+            except requests.exceptions.RequestException as e:
+                # A broken or undecodable response: a failure, but not worth retrying
+                self._record(time.monotonic() - started, True)
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(f'{self.name} failed: {e}') from e
+            except BaseException:
+                # Our side failed, e.g. reading a streamed request body
+                self.breaker.release_trial()
+                raise
+            self._record(time.monotonic() - started, failed)
+
+            if not failed:
+                self.breaker.record_success()
+                return response
+            self.breaker.record_failure()
+
+            retryable = error is not None or response.status_code in RETRY_STATUSES
+            if not retryable or attempt >= retries or not self.breaker.allow():
+                if error is not None:
+                    raise UpstreamUnavailable(f'{self.name} is unavailable: {error}') from error
+                return response
+
+            attempt += 1
+            self._count('_retried')
+            # Full jitter: sleep a random slice of the exponential window
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _record(self, elapsed, failed):
+        with self._lock:
+            self._calls += 1
+            self._latencies.append(elapsed)
+            if failed:
+                self._failures += 1
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def close(self):
+        # Drops pooled keep-alive sockets; the session reconnects on next use
+        self.session.close()
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+            stats = {
+                'calls': self._calls,
+                'failures': self._failures,
+                'retried': self._retried,
+                'rejected': self._rejected,
+                'in_flight': self._in_flight,
+                'max_concurrency': self.max_concurrency,
+            }
+        stats['circuit'] = self.breaker.state
+        for label, q in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+            stats[f'latency_{label}'] = round(samples[min(len(samples) - 1, int(q * len(samples)))], 4) if samples else None
+        return stats
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small thread-safe LRU whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl=300.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        # A fresh entry exists; unlike get(), not counted as a hit or miss
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() < entry[1]
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_or_load(self, key, load):
+        # Misses (None) are never cached, so a new row is visible right away
+        value = self.get(key)
+        if value is None:
+            value = load(key)
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class IdentityResolver:
+    """Answers "who is this user" and "who owns this farm" without extra queries.
+
+    New tokens carry ``user_id`` as a claim; tokens issued before that fall
+    back to a cached name lookup. Farm owners are cached per farm and
+    dropped when a farm is created or deleted.
+    """
+
+    def __init__(self, db_cursor, ttl=300.0, max_entries=10000):
+        self._db_cursor = db_cursor
+        self.user_ids = TTLCache(ttl, max_entries)
+        self.farm_owners = TTLCache(ttl, max_entries)
+
+    def user_id(self, claims, user_name):
+        if claims.get('user_id') is not None:
+            return claims['user_id']
+        return self.user_ids.get_or_load(user_name, self._load_user_id)
+
+    def farm_owner(self, farm_id):
+        try:
+            farm_id = int(farm_id)
+        except (TypeError, ValueError):
+            return None
+        return self.farm_owners.get_or_load(farm_id, self._load_farm_owner)
+
+    def forget_farm(self, farm_id):
+        self.farm_owners.pop(int(farm_id))
+
+    def _load_user_id(self, user_name):
+        with self._db_cursor() as (conn, cursor):
+            cursor.execute("SELECT user_id FROM User WHERE user_name = %s", (user_name,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _load_farm_owner(self, farm_id):
+        with self._db_cursor() as (conn, cursor):
+            cursor.execute("SELECT user_id FROM farm WHERE farm_id = %s", (farm_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        return {'user_ids': self.user_ids.stats(), 'farm_owners': self.farm_owners.stats()}
@@ -0,0 +1,246 @@
+"""In-process crop identification, as an alternative to the model server.
+
+Select a runtime with ``FARMIE_INFERENCE_BACKEND``:
+
+- ``keras``: the SavedModel in ``plant_identifier_model1`` (needs tensorflow)
+- ``tflite``: an exported ``.tflite`` file (needs tflite-runtime or tensorflow)
+- ``onnx``: an exported ``.onnx`` file (needs onnxruntime), CPU only
+- ``numpy``: a linear ``.npz`` stand-in with ``weights``/``bias`` arrays
+
+Optional runtimes are imported only when their backend is selected.
+"""
+import io
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from predictions import InvalidImage
+
+CLASS_NAMES = [
+    'aloevera', 'banana', 'bilimbi', 'cantaloupe', 'cassava', 'coconut', 'corn',
+    'cucumber', 'curcuma', 'eggplant', 'galangal', 'ginger', 'guava', 'kale',
+    'longbeans', 'mango', 'melon', 'orange', 'paddy', 'papaya', 'peper chili',
+    'pineapple', 'pomelo', 'shallot', 'soybeans', 'spinach', 'sweet potatoes',
+    'tobacco', 'waterapple', 'watermelon'
+]
+IMG_HEIGHT, IMG_WIDTH = 224, 224
+
+
+def preprocess(stream, size=(IMG_WIDTH, IMG_HEIGHT)):
+    """Decode an upload stream straight into a (H, W, 3) float32 array."""
+    # Full-size decode, then a nearest resize: exactly what
+    # tf.keras.utils.load_img did for the training images. JPEG draft mode
+    # would be cheaper but scales in the DCT domain and shifts the inputs
+    img = Image.open(stream)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img = img.resize(size, Image.NEAREST)
+    return np.asarray(img, dtype=np.float32)
+
+
+class ImageShrinker:
+    """Validates uploads and downsizes them before they are sent to the model server.
+
+    Images are opened lazily so the size limits are checked from the
+    header alone. JPEGs are decoded in draft mode at the smallest DCT scale
+    that still covers ``max_side``, then resized to fit within
+    ``max_side`` (keeping the aspect ratio, as the server squashes to the
+    model input anyway) and re-encoded as JPEG. JPEGs that are already
+    small enough are forwarded untouched.
+    """
+
+    def __init__(self, max_side=448, quality=90, max_bytes=20 * 1024 * 1024, max_pixels=40_000_000,
+                 formats=('JPEG', 'PNG', 'WEBP', 'BMP', 'GIF', 'TIFF')):
+        self.max_side = max_side
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.formats = formats
+        self._lock = threading.Lock()
+        self.images = 0
+        self.resized = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def __call__(self, image):
+        """Return a ``(filename, stream, mimetype)`` tuple ready for ``RemoteModel``."""
+        filename, stream, mimetype = image
+        started = time.perf_counter()
+        size = _stream_size(stream)
+        if size > self.max_bytes:
+            raise InvalidImage(f'Image is larger than {self.max_bytes / (1024 * 1024):g} MB')
+        try:
+            img = Image.open(stream, formats=self.formats)
+            width, height = img.size
+            if width * height > self.max_pixels:
+                raise InvalidImage(f'Image has more than {self.max_pixels} pixels')
+            if img.format == 'JPEG' and max(width, height) <= self.max_side:
+                stream.seek(0)
+                out, shrunk = image, False
+            else:
+                img.draft('RGB', _fit((width, height), self.max_side))
+                img = img.convert('RGB')
+                img.thumbnail((self.max_side, self.max_side), Image.BILINEAR)
+                buffer = io.BytesIO()
+                img.save(buffer, 'JPEG', quality=self.quality)
+                buffer.seek(0)
+                base = os.path.splitext(filename or 'image')[0]
+                out, shrunk = (f'{base}.jpg', buffer, 'image/jpeg'), True
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise InvalidImage(f'Uploaded file is not a readable image: {e}')
+
+        sent = _stream_size(out[1])
+        with self._lock:
+            self.images += 1
+            self.resized += shrunk
+            self.bytes_in += size
+            self.bytes_out += sent
+            self.seconds += time.perf_counter() - started
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {
+                'images': self.images,
+                'resized': self.resized,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'bytes_saved': self.bytes_in - self.bytes_out,
+                'seconds_total': round(self.seconds, 6),
+                'avg_ms': round(self.seconds / self.images * 1000, 3) if self.images else 0.0,
+            }
+
+
+def _fit(size, max_side):
+    scale = max_side / max(size)
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale))) if scale < 1 else size
+
+
+def _stream_size(stream):
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+# --- Runtimes: each maps a (N, H, W, 3) batch to (N, classes) scores ---
+class KerasRunner:
+    def __init__(self, path):
+        import tensorflow as tf
+        self._model = tf.keras.models.load_model(path)
+
+    def __call__(self, batch):
+        return np.asarray(self._model(batch, training=False))
+
+
+class TFLiteRunner:
+    def __init__(self, path):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self._interpreter = Interpreter(model_path=path)
+        self._input = self._interpreter.get_input_details()[0]['index']
+        self._output = self._interpreter.get_output_details()[0]['index']
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        # Interpreters are not thread-safe, and the input shape is per call
+        with self._lock:
+            self._interpreter.resize_tensor_input(self._input, batch.shape)
+            self._interpreter.allocate_tensors()
+            self._interpreter.set_tensor(self._input, batch)
+            self._interpreter.invoke()
+            return np.array(self._interpreter.get_tensor(self._output))
+
+
+class OnnxRunner:
+    def __init__(self, path):
+        import onnxruntime
+        self._session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self._input = self._session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self._session.run(None, {self._input: batch})[0]
+
+
+class NumpyRunner:
+    """Linear classifier over a downsampled image; needs nothing but NumPy."""
+
+    def __init__(self, path):
+        data = np.load(path)
+        self._weights = data['weights']
+        self._bias = data['bias']
+        self._pool = int(data['pool']) if 'pool' in data else 8
+
+    def __call__(self, batch):
+        n, h, w, c = batch.shape
+        p = self._pool
+        pooled = batch[:, :h - h % p, :w - w % p].reshape(n, h // p, p, w // p, p, c).mean(axis=(2, 4))
+        logits = pooled.reshape(n, -1) / 255.0 @ self._weights + self._bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+RUNNERS = {
+    'keras': KerasRunner,
+    'tflite': TFLiteRunner,
+    'onnx': OnnxRunner,
+    'numpy': NumpyRunner,
+}
+
+
+class LocalModel:
+    """Process-wide model shared by all request threads.
+
+    The runtime is loaded once, on first use or by ``warm_up()``, and has
+    the same ``predict``/``predict_batch`` interface as ``RemoteModel``.
+    """
+
+    def __init__(self, backend, path, class_names=CLASS_NAMES):
+        if backend not in RUNNERS:
+            raise ValueError(f'Unknown inference backend: {backend}')
+        self.backend = backend
+        self.path = path
+        self.class_names = class_names
+        self._runner = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._runner is not None
+
+    def runner(self):
+        if self._runner is None:
+            with self._lock:
+                if self._runner is None:
+                    try:
+                        self._runner = RUNNERS[self.backend](self.path)
+                    except Exception as e:
+                        raise RuntimeError(f'Failed to load model: {e}')
+        return self._runner
+
+    def warm_up(self):
+        # The first call builds kernels/graphs; pay for it before traffic arrives
+        self.runner()(np.zeros((1, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32))
+
+    def predict(self, image):
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images):
+        try:
+            batch = np.stack([preprocess(stream) for _, stream, _ in images])
+        except (OSError, Image.DecompressionBombError) as e:
+            raise InvalidImage(f'Uploaded file is not a readable image: {e}')
+        scores = np.asarray(self.runner()(batch))
+        best = scores.argmax(axis=1)
+        return [
+            {'predicted_crop': self.class_names[i], 'confidence': float(row[i])}
+            for i, row in zip(best, scores)
+        ]
@@ -0,0 +1,73 @@
+"""Versioned schema migrations.
+
+Migrations are ``migrations/NNNN_description.sql`` files applied in order
+and recorded in ``schema_migrations``. Statements are split on ``;`` so a
+migration must not contain semicolons inside string literals. MySQL DDL
+commits implicitly, so keep each migration small enough to re-run by hand
+if it fails halfway.
+"""
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+FILENAME = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = FILENAME.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    sql = re.sub(r'--[^\n]*', '', sql)
+    return [statement.strip() for statement in sql.split(';') if statement.strip()]
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending(conn, directory=MIGRATIONS_DIR):
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+    return [m for m in discover(directory) if m[0] not in done]
+
+
+def migrate(conn, directory=MIGRATIONS_DIR, target=None, on_apply=None):
+    """Apply pending migrations up to ``target`` and return their versions."""
+    applied = []
+    for version, name, path in pending(conn, directory):
+        if target is not None and version > target:
+            break
+        if on_apply:
+            on_apply(version, name)
+        with open(path, encoding='utf-8') as f:
+            statements = split_statements(f.read())
+        cursor = conn.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        applied.append(version)
+    return applied
@@ -0,0 +1,12 @@
+-- Running total of Cultivate.quantity per crop, maintained by the API
+-- (rebuild with `flask --app app reconcile-crop-totals`)
+CREATE TABLE IF NOT EXISTS CropTotals (
+    crop_name VARCHAR(100) PRIMARY KEY,
+    total_quantity BIGINT NOT NULL DEFAULT 0,
+    INDEX idx_croptotals_quantity (total_quantity DESC, crop_name),
+    FOREIGN KEY (crop_name) REFERENCES Crop(crop_name) ON DELETE CASCADE
+);
+
+INSERT INTO CropTotals (crop_name, total_quantity)
+SELECT crop_name, SUM(quantity) FROM Cultivate GROUP BY crop_name
+ON DUPLICATE KEY UPDATE total_quantity = VALUES(total_quantity);
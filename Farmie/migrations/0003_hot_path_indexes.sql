@@ -0,0 +1,10 @@
+-- Login, register and every authenticated route look users up by name;
+-- unique also closes the check-then-insert race in /register
+ALTER TABLE User ADD UNIQUE INDEX uq_user_user_name (user_name);
+
+-- Farm listings and ownership checks filter by owner. This replaces the
+-- implicit index MySQL created for the user_id foreign key.
+CREATE INDEX idx_farm_user_id ON farm (user_id);
+
+-- Per-farm crop lookups lead with farm_id; the primary key leads with crop_name
+ALTER TABLE Cultivate ADD UNIQUE INDEX uq_cultivate_farm_crop (farm_id, crop_name);
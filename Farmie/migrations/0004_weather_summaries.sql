@@ -0,0 +1,29 @@
+-- Weather aggregates per grid cell ('lat,lon' at the configured resolution),
+-- one row per period, written by `flask --app app prefetch-weather`
+CREATE TABLE IF NOT EXISTS WeatherSummary (
+    cell VARCHAR(32) NOT NULL,
+    period VARCHAR(32) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    avg_temp DOUBLE NOT NULL,
+    total_rain DOUBLE NOT NULL,
+    avg_humidity DOUBLE NOT NULL,
+    days INT NOT NULL,
+    computed_at DATETIME NOT NULL,
+    PRIMARY KEY (cell, period)
+);
+
+-- One row per prefetch run; last_farm_id is the resume point
+CREATE TABLE IF NOT EXISTS WeatherPrefetchRun (
+    run_id INT AUTO_INCREMENT PRIMARY KEY,
+    status VARCHAR(16) NOT NULL,
+    started_at DATETIME NOT NULL,
+    finished_at DATETIME NULL,
+    last_farm_id INT NOT NULL DEFAULT 0,
+    farms INT NOT NULL DEFAULT 0,
+    cells INT NOT NULL DEFAULT 0,
+    fetched INT NOT NULL DEFAULT 0,
+    requests INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    elapsed_seconds DOUBLE NOT NULL DEFAULT 0
+);
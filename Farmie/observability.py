@@ -0,0 +1,355 @@
+"""Request metrics, slow-request profiling and structured logging.
+
+Each request carries a ``Breakdown`` in a context variable. The DB pool,
+upstream clients and upload shrinker add their time to it through
+``phase()``, one of ``PHASES``, and whatever is left of the request's
+wall time is counted as compute. Work
+fanned out with ``ContextThreadPoolExecutor`` reports into the same
+breakdown, so parallel phases can add up to more than the wall time.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import g, request
+
+PHASES = ('db', 'http', 'shrink')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('farmie_breakdown', default=None)
+
+
+class Breakdown:
+    """Seconds and call counts per phase for one request."""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self._lock = threading.Lock()
+
+    def add(self, name, elapsed, count=True):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+            if count:
+                self.calls[name] = self.calls.get(name, 0) + 1
+
+
+def current_breakdown():
+    return _current.get()
+
+
+@contextmanager
+def phase(name, count=True):
+    """Charge the enclosed block to ``name`` on the current request, if any.
+
+    ``count=False`` adds time without counting a call (pool waits, fetches).
+    """
+    breakdown = _current.get()
+    if breakdown is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        breakdown.add(name, time.perf_counter() - started, count)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool that runs each task in a copy of the submitter's context."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# --- Metrics ---
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteStats:
+    def __init__(self, buckets):
+        self.latency = Histogram(buckets)
+        self.statuses = Counter()
+        self.seconds = dict.fromkeys(PHASES + ('compute',), 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+
+
+class RequestMetrics:
+    """Per-route latency histograms and time breakdowns, rendered for Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix='farmie'):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, route, status, elapsed, breakdown):
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = RouteStats(self.buckets)
+            stats.latency.observe(elapsed)
+            stats.statuses[status] += 1
+            spent = 0.0
+            for name in PHASES:
+                stats.seconds[name] += breakdown.seconds.get(name, 0.0)
+                stats.calls[name] += breakdown.calls.get(name, 0)
+                spent += breakdown.seconds.get(name, 0.0)
+            stats.seconds['compute'] += max(0.0, elapsed - spent)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                f'{method} {route}': {
+                    'count': stats.latency.count,
+                    'seconds_total': round(stats.latency.sum, 6),
+                    'statuses': dict(stats.statuses),
+                    'phase_seconds': {k: round(v, 6) for k, v in stats.seconds.items()},
+                    'phase_calls': dict(stats.calls),
+                }
+                for (method, route), stats in self._routes.items()
+            }
+
+    def render(self, gauges=()):
+        """Prometheus text exposition; ``gauges`` is ``(name, labels, value)`` triples."""
+        p = self.prefix
+        lines = [
+            f'# TYPE {p}_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for bound, total in stats.latency.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{p}_request_duration_seconds_bucket{{{labels},le="{le}"}} {total}')
+                lines.append(f'{p}_request_duration_seconds_sum{{{labels}}} {stats.latency.sum:.6f}')
+                lines.append(f'{p}_request_duration_seconds_count{{{labels}}} {stats.latency.count}')
+
+            lines.append(f'# TYPE {p}_requests_total counter')
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{p}_requests_total{{{labels},status="{status}"}} {count}')
+
+            lines.append(f'# TYPE {p}_request_phase_seconds_total counter')
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for name, seconds in stats.seconds.items():
+                    lines.append(f'{p}_request_phase_seconds_total{{{labels},phase="{name}"}} {seconds:.6f}')
+
+            lines.append(f'# TYPE {p}_request_phase_calls_total counter')
+            for (method, route), stats in routes:
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for name, calls in stats.calls.items():
+                    lines.append(f'{p}_request_phase_calls_total{{{labels},phase="{name}"}} {calls}')
+
+        seen = set()
+        for name, labels, value in gauges:
+            if value is None:
+                continue
+            if name not in seen:
+                lines.append(f'# TYPE {p}_{name} gauge')
+                seen.add(name)
+            label_text = ','.join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+            lines.append(f'{p}_{name}{{{label_text}}} {float(value):g}' if label_text else f'{p}_{name} {float(value):g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- Slow-request profiler ---
+class SamplingProfiler:
+    """Samples the stacks of threads serving requests every ``interval`` seconds.
+
+    Samples are kept per request and written out only when the request
+    took at least ``threshold`` seconds, as folded stacks
+    (``frame;frame;frame count``) that flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, output_dir, threshold, interval=0.005, keep=200):
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.interval = interval
+        self.keep = keep
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dumps = 0
+
+    def begin(self):
+        self._ensure_thread()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self, label, elapsed):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and elapsed >= self.threshold:
+            return self._dump(label, elapsed, samples)
+        return None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+    def _dump(self, label, elapsed, samples):
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', label).strip('_')
+        path = os.path.join(self.output_dir, f'{time.time():.3f}-{name}-{elapsed * 1000:.0f}ms.folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.items():
+                f.write(f'{stack} {count}\n')
+        self.dumps += 1
+        self._prune()
+        return path
+
+    def _prune(self):
+        dumps = sorted(f for f in os.listdir(self.output_dir) if f.endswith('.folded'))
+        for filename in dumps[:max(0, len(dumps) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.output_dir, filename))
+            except OSError:
+                pass
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+# --- Flask wiring ---
+def instrument(app, metrics, profiler=None, logger=None):
+    """Record every request into ``metrics`` and, if given, ``profiler``.
+
+    Responses get a ``Server-Timing`` header with the same split as the metrics.
+    """
+
+    @app.before_request
+    def _start_request():
+        g.request_started = time.perf_counter()
+        _current.set(Breakdown())
+        if profiler is not None:
+            profiler.begin()
+
+    @app.after_request
+    def _add_server_timing(response):
+        breakdown = _current.get()
+        started = g.get('request_started')
+        if breakdown is not None and started is not None:
+            elapsed = time.perf_counter() - started
+            spent = sum(breakdown.seconds.get(name, 0.0) for name in PHASES)
+            parts = [f'{name};dur={breakdown.seconds[name] * 1000:.1f}' for name in PHASES]
+            parts.append(f'compute;dur={max(0.0, elapsed - spent) * 1000:.1f}')
+            response.headers['Server-Timing'] = ', '.join(parts)
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        started = g.pop('request_started', None)
+        breakdown = _current.get()
+        _current.set(None)
+        if started is None or breakdown is None:
+            return
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        status = g.pop('response_status', 500)
+        metrics.record(request.method, route, status, elapsed, breakdown)
+        if profiler is not None:
+            path = profiler.end(f'{request.method} {route}', elapsed)
+            if path and logger is not None:
+                logger.info('Slow request profiled', extra={
+                    'route': route, 'method': request.method, 'duration_ms': round(elapsed * 1000, 1), 'profile': path,
+                })
+
+
+# --- Logging ---
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra=`` fields become top-level keys."""
+
+    def format(self, record):
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        extras = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith('_')}
+        if extras:
+            text += ' ' + ' '.join(f'{k}={v}' for k, v in extras.items())
+        return text
+
+
+def configure_logging(name='farmie', level='INFO', fmt='json'):
+    """Send ``name`` and its children to stderr at ``level``, as JSON or text."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,274 @@
+"""Password hashing and login throttling.
+
+Hashes are stored as ``$``-separated strings that carry their own
+parameters, so the work factor can be raised without invalidating
+existing passwords:
+
+- ``scrypt$<log2 N>$<r>$<p>$<salt>$<hash>``
+- ``pbkdf2_sha256$<iterations>$<salt>$<hash>``
+
+Bare 64-character hex strings are the legacy unsalted SHA-256 hashes;
+they still verify and are flagged for rehashing.
+
+hashlib's scrypt and PBKDF2 release the GIL, so the worker threads hash
+in parallel while the number of concurrent hashes stays bounded.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ALGORITHMS = ('scrypt', 'pbkdf2_sha256')
+# scrypt: log2 of N; pbkdf2_sha256: iteration count
+DEFAULT_COSTS = {'scrypt': 14, 'pbkdf2_sha256': 600000}
+SCRYPT_R, SCRYPT_P = 8, 1
+SALT_BYTES = 16
+LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class HasherBusy(Exception):
+    """Raised when no hashing worker frees up within the queue timeout."""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, log_n, r, p):
+    n = 1 << log_n
+    # OpenSSL's default 32 MiB limit is too small for N=2**15 and above
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n * p + 1024 * 1024, dklen=32)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password, salt, iterations)
+
+
+def hash_password(password, algorithm='scrypt', cost=None):
+    """Hash ``password`` with a fresh salt; runs in the calling thread."""
+    cost = DEFAULT_COSTS[algorithm] if cost is None else int(cost)
+    password = password.encode()
+    salt = os.urandom(SALT_BYTES)
+    if algorithm == 'scrypt':
+        digest = _scrypt(password, salt, cost, SCRYPT_R, SCRYPT_P)
+        return f'scrypt${cost}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}'
+    if algorithm == 'pbkdf2_sha256':
+        return f'pbkdf2_sha256${cost}${_b64(salt)}${_b64(_pbkdf2(password, salt, cost))}'
+    raise ValueError(f'Unknown password algorithm: {algorithm}')
+
+
+def check_password(password, stored):
+    """Return True if ``password`` matches ``stored``; runs in the calling thread."""
+    password = password.encode()
+    if LEGACY_SHA256.match(stored):
+        return hmac.compare_digest(hashlib.sha256(password).hexdigest(), stored)
+    parts = stored.split('$')
+    try:
+        if parts[0] == 'scrypt' and len(parts) == 6:
+            log_n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            digest = _scrypt(password, _unb64(parts[4]), log_n, r, p)
+        elif parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+            digest = _pbkdf2(password, _unb64(parts[2]), int(parts[1]))
+        else:
+            return False
+        return hmac.compare_digest(digest, _unb64(parts[-1]))
+    except ValueError:
+        return False
+
+
+class PasswordHasher:
+    """Runs hashing on a bounded worker pool with a configurable work factor.
+
+    ``verify`` returns ``(ok, needs_rehash)``; a stored hash needs rehashing
+    when it is legacy SHA-256 or was made with another algorithm or cost.
+    """
+
+    def __init__(self, algorithm='scrypt', cost=None, workers=None, queue_timeout=5.0):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f'Unknown password algorithm: {algorithm}')
+        self.algorithm = algorithm
+        self.cost = DEFAULT_COSTS[algorithm] if cost is None else int(cost)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        # Caps hashes running or queued, so a burst of logins cannot pile up unbounded work
+        self._slots = threading.BoundedSemaphore(self.workers * 4)
+        self._dummy = None
+        self._lock = threading.Lock()
+        self.hashes = 0
+        self.rejected = 0
+        self.hash_time_total = 0.0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy('Password hashing is saturated')
+        try:
+            future = self._executor.submit(self._timed, fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.hashes += 1
+                self.hash_time_total += time.perf_counter() - start
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.algorithm, self.cost)
+
+    def verify(self, password, stored):
+        if not stored:
+            # Unknown user: spend the same time as a real check so timing does not reveal it
+            self._run(check_password, password, self._dummy_hash())
+            return False, False
+        ok = self._run(check_password, password, stored)
+        return ok, ok and self.needs_rehash(stored)
+
+    def needs_rehash(self, stored):
+        parts = stored.split('$')
+        return parts[0] != self.algorithm or len(parts) < 2 or parts[1] != str(self.cost)
+
+    def _dummy_hash(self):
+        if self._dummy is None:
+            self._dummy = hash_password('dummy-password', self.algorithm, self.cost)
+        return self._dummy
+
+    def stats(self):
+        with self._lock:
+            return {
+                'algorithm': self.algorithm,
+                'cost': self.cost,
+                'workers': self.workers,
+                'hashes': self.hashes,
+                'rejected': self.rejected,
+                'hash_time_avg': round(self.hash_time_total / self.hashes, 6) if self.hashes else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class RateLimiter:
+    """Fixed-window counter per key: at most ``limit`` hits per ``window`` seconds."""
+
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def retry_after(self, key):
+        """Seconds until ``key`` may try again, or 0 if it is under the limit."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None or now - entry[0] >= self.window or entry[1] < self.limit:
+                return 0
+            return max(1, int(entry[0] + self.window - now + 0.999))
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                if len(self._counts) >= self.max_keys:
+                    self._prune(now)
+                self._counts[key] = [now, 1]
+            else:
+                entry[1] += 1
+
+    def reset(self, key):
+        with self._lock:
+            self._counts.pop(key, None)
+
+    def _prune(self, now):
+        expired = [k for k, (start, _) in self._counts.items() if now - start >= self.window]
+        for key in expired:
+            del self._counts[key]
+        # Still full of live windows: drop the oldest half rather than grow without bound
+        if len(self._counts) >= self.max_keys:
+            for key in sorted(self._counts, key=lambda k: self._counts[k][0])[:len(self._counts) // 2]:
+                del self._counts[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._counts),
+                'blocked': sum(1 for _, count in self._counts.values() if count >= self.limit),
+            }
+
+
+class LoginThrottle:
+    """Limits on failed logins per user and per client IP.
+
+    Checked before any hashing, so brute-force traffic is turned away
+    without spending CPU on the KDF. Successful logins are never counted,
+    so many users behind one address are not locked out by each other.
+    Counters are kept in process: with several gunicorn workers each
+    worker enforces its own limits, so the effective limit is up to
+    ``limit * workers``.
+    """
+
+    def __init__(self, user_limit=5, ip_limit=30, window=300):
+        self.per_user = RateLimiter(user_limit, window)
+        self.per_ip = RateLimiter(ip_limit, window)
+
+    def retry_after(self, user_name, ip):
+        return max(self.per_user.retry_after(user_name), self.per_ip.retry_after(ip))
+
+    def failed(self, user_name, ip):
+        self.per_user.hit(user_name)
+        self.per_ip.hit(ip)
+
+    def succeeded(self, user_name):
+        self.per_user.reset(user_name)
+
+    def stats(self):
+        return {'per_user': self.per_user.stats(), 'per_ip': self.per_ip.stats()}
+
+
+def benchmark(algorithm, costs, workers=None, duration=2.0, threads=None):
+    """Measure verified logins per second for each cost.
+
+    Yields ``(cost, logins_per_second, avg_latency_seconds)``; ``threads``
+    concurrent callers (default twice the workers) keep the pool busy.
+    """
+    for cost in costs:
+        hasher = PasswordHasher(algorithm, cost, workers=workers, queue_timeout=60)
+        stored = hash_password('correct horse battery staple', algorithm, cost)
+        callers = threads or hasher.workers * 2
+        done = []
+        deadline = time.perf_counter() + duration
+
+        def caller():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                hasher.verify('correct horse battery staple', stored)
+                done.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=caller) for _ in range(callers)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - started
+        hasher.shutdown()
+        yield cost, len(done) / elapsed, sum(done) / len(done) if done else 0.0
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger('farmie.predictions')
+
+
+def stream_multipart(field, files, chunk_size=CHUNK_SIZE):
+    """Build a streaming multipart body for ``(filename, stream, mimetype)`` files.
+
+    Returns ``(body_iterator, content_type)``; file streams are read in
+    chunks as the body is sent, so no image is held in memory whole.
+    """
+    boundary = uuid.uuid4().hex
+
+    def body():
+        for filename, stream, mimetype in files:
+            yield (
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="{field}"; filename="{secure_filename(filename) or "image"}"\r\n'
+                f'Content-Type: {mimetype or "application/octet-stream"}\r\n\r\n'
+            ).encode()
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+
+    return body(), f'multipart/form-data; boundary={boundary}'
+
+
+class PredictionError(Exception):
+    """Raised when the model backend rejects or fails a prediction."""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+class InvalidImage(PredictionError):
+    """Raised when an upload cannot be decoded as an image."""
+
+
+class RemoteModel:
+    """Model server backend.
+
+    Single images go to ``POST /predict`` (field ``image``), which every
+    model server version has. Batches go to ``POST /predict_batch``
+    (repeated field ``images``), which answers ``{"predictions": [...]}``
+    in upload order; a server without it answers 404 or 405, and from
+    then on batches are sent to ``/predict`` one image at a time.
+    """
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.batch_supported = True
+
+    def predict(self, image):
+        filename, stream, mimetype = image
+        response = self.upstream.post('/predict', files={'image': (filename, stream, mimetype)})
+        return self._json(response)
+
+    def predict_batch(self, images):
+        if not self.batch_supported:
+            return [self.predict(image) for image in images]
+        body, content_type = stream_multipart('images', images)
+        response = self.upstream.post('/predict_batch', data=body, headers={'Content-Type': content_type})
+        if response.status_code in (404, 405):
+            logger.warning('Model server has no /predict_batch, predicting one image at a time')
+            self.batch_supported = False
+            for _, stream, _ in images:
+                stream.seek(0)
+            return [self.predict(image) for image in images]
+        predictions = self._json(response).get('predictions')
+        if not isinstance(predictions, list) or len(predictions) != len(images):
+            raise PredictionError('Model server returned a malformed batch response')
+        return predictions
+
+    def _json(self, response):
+        if response.status_code != 200:
+            try:
+                details = response.json()
+            except ValueError:
+                details = response.text
+            raise PredictionError('Prediction failed from model server', details)
+        return response.json()
+
+
+class MicroBatcher:
+    """Merges concurrent single-item calls into batched ``batch_fn`` calls.
+
+    A worker thread waits for the first item, then keeps collecting for up
+    to ``max_wait`` seconds or until ``max_batch_size`` items are queued.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait=0.01):
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        error = None
+        try:
+            results = self._batch_fn(items)
+            if len(results) != len(batch):
+                raise PredictionError(f'Batch returned {len(results)} results for {len(batch)} items')
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            error = e
+        finally:
+            # Every caller is blocked on its future: none may be left unresolved
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error or PredictionError('Batch was abandoned'))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'queued': self._queue.qsize(),
+            }
+
+
+class HashingSpool:
+    """Upload spool that hashes bytes as they are written to it.
+
+    Returned from ``Request._get_file_stream`` so an upload is hashed while
+    Werkzeug receives it; ``upload_hash`` then needs no second pass. Reads,
+    seeks and the rest go to the wrapped spool.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self._digest.update(data)
+        return self._stream.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def upload_hash(stream):
+    """SHA-256 of an upload: from its ``HashingSpool`` if it has one, else by reading it."""
+    if isinstance(stream, HashingSpool):
+        return stream.hexdigest()
+    return hash_stream(stream)
+
+
+def hash_stream(stream, chunk_size=CHUNK_SIZE):
+    """SHA-256 of an upload, read in chunks; the stream is rewound afterwards."""
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """Size-bounded LRU of predictions keyed by image hash and model version.
+
+    With ``path`` set, entries are also kept in SQLite so they survive
+    restarts; rows from other model versions are dropped on startup. Hits
+    on memory entries are noted and written to ``used_at`` before the disk
+    tier is trimmed, so both tiers evict the least recently used entries.
+    """
+
+    def __init__(self, model_version, max_entries=4096, path=None):
+        self.model_version = str(model_version)
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._used = {}
+
+        if path:
+            with self._conn() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS predictions (
+                        image_hash TEXT NOT NULL,
+                        model_version TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        used_at REAL NOT NULL,
+                        PRIMARY KEY (image_hash, model_version)
+                    )
+                """)
+                conn.execute('DELETE FROM predictions WHERE model_version != ?', (self.model_version,))
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        # As WeatherStore.close: drop SQLite connections before a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._flush_used(conn)
+            conn.close()
+        self._local = threading.local()
+
+    def get(self, image_hash):
+        with self._lock:
+            if image_hash in self._entries:
+                self._entries.move_to_end(image_hash)
+                self.hits += 1
+                if self.path:
+                    self._used[image_hash] = time.time()
+                return self._entries[image_hash]
+
+        prediction = None
+        if self.path:
+            with self._conn() as conn:
+                row = conn.execute(
+                    'SELECT payload FROM predictions WHERE image_hash = ? AND model_version = ?',
+                    (image_hash, self.model_version),
+                ).fetchone()
+                if row:
+                    prediction = json.loads(row[0])
+                    conn.execute(
+                        'UPDATE predictions SET used_at = ? WHERE image_hash = ? AND model_version = ?',
+                        (time.time(), image_hash, self.model_version),
+                    )
+
+        with self._lock:
+            if prediction is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(image_hash, prediction)
+        return prediction
+
+    def put(self, image_hash, prediction):
+        with self._lock:
+            self._remember(image_hash, prediction)
+        if self.path:
+            with self._conn() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)',
+                    (image_hash, self.model_version, json.dumps(prediction), time.time()),
+                )
+                self._puts += 1
+                if self._puts % 256:
+                    return
+                # Keep the disk tier bounded too, dropping least recently used rows
+                self._flush_used(conn)
+                conn.execute("""
+                    DELETE FROM predictions WHERE rowid IN (
+                        SELECT rowid FROM predictions ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries * 4,))
+
+    def _flush_used(self, conn):
+        with self._lock:
+            used, self._used = self._used, {}
+        if used:
+            conn.executemany(
+                'UPDATE predictions SET used_at = ? WHERE image_hash = ? AND model_version = ?',
+                [(used_at, image_hash, self.model_version) for image_hash, used_at in used.items()],
+            )
+            conn.commit()
+
+    def _remember(self, image_hash, prediction):
+        self._entries[image_hash] = prediction
+        self._entries.move_to_end(image_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model_version': self.model_version,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
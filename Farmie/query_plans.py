@@ -0,0 +1,181 @@
+"""Query-plan regression check.
+
+Collects every SELECT/UPDATE/DELETE string from the modules that talk to
+MySQL, fills in sample parameters by column name, runs EXPLAIN on each
+and reports any full table scan (``type = ALL``). f-string queries are
+rendered from the code: ``IN`` lists built with ``', '.join(['%s'] * n)``
+get two placeholders, and names and class constants are resolved from
+their assignments. Queries with no WHERE clause read a whole table on
+purpose (catalogue loads, reconcile), so a scan of the table they read
+from is allowed, but not of any table they join. Run it against a
+database with representative data; on near-empty tables the optimizer may
+legitimately prefer a scan. ``tests/test_query_plans.py`` runs it
+whenever MySQL is reachable.
+"""
+import ast
+import os
+import re
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCES = ['app.py', 'cultivation.py', 'recommender.py', 'identity.py', 'climate.py', 'transfer.py']
+
+# Sample values for placeholders, keyed by the column they are compared with
+SAMPLES = {
+    'user_name': 'sample_user',
+    'password': 'sample_hash',
+    'user_id': 1,
+    'farm_id': 1,
+    'crop_name': 'corn',
+    'quantity': 1,
+    'cell': '0.0000,0.0000',
+    'period': 'year_2024',
+    'run_id': 1,
+    # WeatherPrefetchRun checkpoint columns
+    'status': 'running',
+    'finished_at': None,
+    'last_farm_id': 0,
+    'farms': 0,
+    'cells': 0,
+    'fetched': 0,
+    'requests': 0,
+    'failed': 0,
+    'elapsed_seconds': 0.0,
+}
+
+STATEMENT = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\s+\S', re.IGNORECASE)
+PLACEHOLDER = re.compile(
+    r'(\([\w.,\s]+\)|[\w.]+)\s+IN\s*\(([%s,()\s]+)\)'     # col IN (%s, ...) or (a, b) IN ((%s, %s), ...)
+    r'|([\w.]+)\s*(?:=|<=?|>=?)\s*%s'                       # col = %s
+    r'|\b(LIMIT|OFFSET)\s+%s',
+    re.IGNORECASE,
+)
+
+
+def collect_queries(sources=SOURCES):
+    """``({sql: location}, [(location, error), ...])``: the queries, and f-string queries that could not be rendered."""
+    queries, unrendered = {}, []
+    for filename in sources:
+        with open(os.path.join(HERE, filename), encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename)
+        # Pieces of f-strings are partial SQL; the f-strings themselves are rendered whole
+        fragments = {id(v) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for v in node.values}
+        for node in ast.walk(tree):
+            if id(node) in fragments:
+                continue
+            if isinstance(node, ast.JoinedStr):
+                try:
+                    sql = render_fstring(tree, node)
+                except ValueError as e:
+                    if STATEMENT.match(_literal_prefix(node)):
+                        unrendered.append((f'{filename}:{node.lineno}', str(e)))
+                    continue
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+                sql = node.value
+            else:
+                continue
+            if STATEMENT.match(sql):
+                queries.setdefault(normalize(sql), f'{filename}:{node.lineno}')
+    return queries, unrendered
+
+
+def render_fstring(tree, node):
+    """The SQL an f-string produces, with each IN list given two placeholders."""
+    parts = []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            parts.append(value.value)
+        else:
+            parts.append(str(_render(tree, value.value, node.lineno)))
+    return ''.join(parts)
+
+
+def _literal_prefix(node):
+    return ''.join(v.value for v in node.values if isinstance(v, ast.Constant))
+
+
+def _render(tree, expr, lineno):
+    if isinstance(expr, ast.Constant):
+        return expr.value
+    if isinstance(expr, (ast.Tuple, ast.List)):
+        return [_render(tree, e, lineno) for e in expr.elts]
+    if isinstance(expr, ast.BinOp) and isinstance(expr.op, ast.Mult) and isinstance(expr.left, ast.List):
+        # ['%s'] * len(values): any length will do, two shows it is a list
+        return _render(tree, expr.left, lineno) * 2
+    if (isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) and expr.func.attr == 'join'
+            and len(expr.args) == 1):
+        return _render(tree, expr.func.value, lineno).join(_render(tree, expr.args[0], lineno))
+    if isinstance(expr, (ast.Name, ast.Attribute)):
+        name = expr.id if isinstance(expr, ast.Name) else expr.attr
+        return _render(tree, _assignment(tree, name, lineno), lineno)
+    raise ValueError(f'cannot render {ast.unparse(expr)}')
+
+
+def _assignment(tree, name, lineno):
+    # The closest assignment to ``name`` above the query (class constants included)
+    best = None
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and node.lineno < lineno and any(
+            isinstance(t, ast.Name) and t.id == name for t in node.targets
+        ):
+            if best is None or node.lineno > best.lineno:
+                best = node
+    if best is None:
+        raise ValueError(f'no assignment to {name}')
+    return best.value
+
+
+def normalize(sql):
+    return ' '.join(sql.split())
+
+
+def sample_params(sql):
+    params = []
+    for in_columns, in_list, column, keyword in PLACEHOLDER.findall(sql):
+        if keyword:
+            params.append(10 if keyword.upper() == 'LIMIT' else 0)
+        elif in_columns:
+            columns = in_columns.strip('()').split(',')
+            params.extend(_sample(columns[i % len(columns)]) for i in range(in_list.count('%s')))
+        else:
+            params.append(_sample(column))
+    if len(params) != sql.count('%s'):
+        raise ValueError('Could not infer every placeholder')
+    return tuple(params)
+
+
+def _sample(column):
+    column = column.strip().split('.')[-1]
+    if column not in SAMPLES:
+        raise KeyError(f'No sample value for placeholder on column {column!r}')
+    return SAMPLES[column]
+
+
+def full_scans(cursor, sql, params):
+    cursor.execute('EXPLAIN ' + sql, params)
+    rows = [row for row in cursor.fetchall() if row.get('table') and not row['table'].startswith('<')]
+    if rows and not re.search(r'\bWHERE\b', sql, re.IGNORECASE):
+        # A whole-table read may scan the table it reads, but not what it joins
+        rows = rows[1:]
+    return [row['table'] for row in rows if row.get('type') == 'ALL']
+
+
+def check(conn, sources=SOURCES):
+    """Return ``(checked, problems)`` where problems lists (location, sql, detail)."""
+    queries, unrendered = collect_queries(sources)
+    problems = [(location, None, f'could not render f-string query: {error}') for location, error in unrendered]
+    checked = 0
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for sql, location in queries.items():
+            try:
+                tables = full_scans(cursor, sql, sample_params(sql))
+            except Exception as e:
+                problems.append((location, sql, f'could not EXPLAIN: {e}'))
+                continue
+            checked += 1
+            if tables:
+                problems.append((location, sql, f"full table scan on {', '.join(tables)}"))
+    finally:
+        cursor.close()
+        conn.rollback()
+    return checked, problems
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+# Maximum points per scoring component
+FAMILY_POINTS = 20
+TEMP_POINTS = 30
+RAIN_POINTS = 30
+HUMIDITY_POINTS = 20
+
+CATALOGUE_QUERY = (
+    "SELECT crop_name, crop_family, optimal_temp, optimal_rainfall, optimal_humidity "
+    "FROM Crop ORDER BY crop_name"
+)
+
+logger = logging.getLogger('farmie.recommender')
+
+
+class CropCatalogue:
+    """Immutable, array-backed snapshot of the Crop table.
+
+    ``optimal`` is an (n, 3) float array of temperature, rainfall and
+    humidity (NaN where unknown); ``family_ids`` maps each crop to an int.
+    ``version`` is a content hash, usable as a strong ETag.
+    """
+
+    def __init__(self, rows):
+        self.names = [row['crop_name'] for row in rows]
+        self.families = [row['crop_family'] for row in rows]
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        family_codes = {}
+        self.family_ids = np.array(
+            [family_codes.setdefault(f, len(family_codes)) for f in self.families], dtype=np.int32
+        )
+        self.family_codes = family_codes
+        self.optimal = np.array([
+            [_to_float(row['optimal_temp']), _to_float(row['optimal_rainfall']), _to_float(row['optimal_humidity'])]
+            for row in rows
+        ], dtype=np.float64).reshape(len(rows), 3)
+
+        self.listing = [{'crop_name': n, 'crop_family': f} for n, f in zip(self.names, self.families)]
+        digest = hashlib.sha256(json.dumps([self.names, self.families]).encode())
+        digest.update(self.optimal.tobytes())
+        self.version = digest.hexdigest()[:32]
+
+    def __len__(self):
+        return len(self.names)
+
+    def family_of(self, crop_name):
+        i = self.index.get(crop_name)
+        return None if i is None else self.families[i]
+
+    def families_of(self, crop_names):
+        return {name: self.family_of(name) for name in crop_names}
+
+    def score(self, weather, analyzed_family_ids):
+        """Score every crop for each row of ``weather``.
+
+        ``weather`` is an (m, 3) array of (avg_temp, total_rain, avg_humidity)
+        and ``analyzed_family_ids`` an (m,) int array. Returns an (m, n) array.
+        """
+        weather = np.asarray(weather, dtype=np.float64).reshape(-1, 3)
+        diff = np.abs(self.optimal[None, :, :] - weather[:, None, :])
+        caps = np.array([TEMP_POINTS, RAIN_POINTS, HUMIDITY_POINTS], dtype=np.float64)
+        climate = np.nan_to_num(np.maximum(0, caps - diff), nan=0.0).sum(axis=2)
+        family = np.where(
+            self.family_ids[None, :] == np.asarray(analyzed_family_ids).reshape(-1, 1), FAMILY_POINTS, 0
+        )
+        return np.round(climate + family, 2)
+
+
+def _to_float(value):
+    return np.nan if value is None else float(value)
+
+
+def top_k(scores, k, excluded=None):
+    """Indices of the k best scores per row, highest first.
+
+    Ties go to the lower index, matching a stable sort over the catalogue.
+    ``excluded`` is an optional boolean mask (same shape) of crops to skip.
+    """
+    scores = np.atleast_2d(scores)
+    rows, n = scores.shape
+    # Pack score and reversed index into one int64 so argpartition is exact on ties
+    key = np.rint(scores * 100).astype(np.int64) * n + (n - 1 - np.arange(n))
+    if excluded is not None:
+        key = np.where(np.atleast_2d(excluded), -1, key)
+    k = min(k, n)
+    if k == 0:
+        return np.empty((rows, 0), dtype=np.intp)
+    part = np.argpartition(-key, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(key, part, axis=1), axis=1)
+    best = np.take_along_axis(part, order, axis=1)
+    # Drop excluded crops if fewer than k were eligible
+    keep = np.take_along_axis(key, best, axis=1) >= 0
+    return [row[mask] for row, mask in zip(best, keep)]
+
+
+class Recommender:
+    """Scores crops against a farm's climate using a cached catalogue.
+
+    The catalogue is reloaded through ``load`` only when ``fingerprint``
+    (checked at most every ``check_interval`` seconds) reports that the
+    Crop table changed, or after ``invalidate()``. If a reload fails the
+    last loaded catalogue keeps being served until the next check; only
+    the very first load raises.
+    """
+
+    def __init__(self, load, fingerprint=None, check_interval=60.0):
+        self._load = load
+        self._fingerprint = fingerprint
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._catalogue = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @property
+    def loaded(self):
+        return self._catalogue is not None
+
+    def invalidate(self):
+        # Reload on next use; the current snapshot stays as a fallback
+        with self._lock:
+            self._version = None
+            self._checked_at = 0.0
+
+    def catalogue(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._catalogue is not None and now - self._checked_at < self.check_interval:
+                return self._catalogue
+
+            version = self._current_version()
+            if self._catalogue is None or version is None or version != self._version:
+                try:
+                    catalogue = CropCatalogue(self._load())
+                except Exception as e:
+                    if self._catalogue is None:
+                        raise
+                    # Database unreachable: keep answering from the last snapshot
+                    logger.warning('Crop catalogue reload failed, serving the cached one', extra={'error': str(e)})
+                else:
+                    self._catalogue, self._version = catalogue, version
+            self._checked_at = now
+            return self._catalogue
+
+    def _current_version(self):
+        if self._fingerprint is None:
+            return None
+        try:
+            return self._fingerprint()
+        except Exception:
+            return None
+
+    def recommend(self, analyzed_crop, climate, most_cultivated=None, k=3):
+        return self.recommend_batch([(analyzed_crop, climate)], most_cultivated, k)[0]
+
+    def recommend_batch(self, items, most_cultivated=None, k=3):
+        """Top-k crop names for many ``(analyzed_crop, climate)`` pairs at once.
+
+        ``climate`` is ``(avg_temp, total_rain, avg_humidity)``. The most
+        cultivated crop scores zero and the analyzed crop itself is skipped.
+        """
+        catalogue = self.catalogue()
+        if not items:
+            return []
+
+        analyzed = [catalogue.index.get(name, -1) for name, _ in items]
+        analyzed = np.array(analyzed, dtype=np.intp)
+        family_ids = np.where(analyzed >= 0, catalogue.family_ids[analyzed], -1)
+        scores = catalogue.score([climate for _, climate in items], family_ids)
+
+        popular = catalogue.index.get(most_cultivated)
+        if popular is not None:
+            scores[:, popular] = 0
+
+        excluded = np.zeros(scores.shape, dtype=bool)
+        has_analyzed = analyzed >= 0
+        excluded[np.flatnonzero(has_analyzed), analyzed[has_analyzed]] = True
+
+        return [[catalogue.names[i] for i in row] for row in top_k(scores, k, excluded)]
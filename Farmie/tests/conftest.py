@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+FARMIE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FARMIE_DIR)
+
+# Keep app.py's local caches out of the working tree when a test imports it
+_workdir = tempfile.mkdtemp(prefix='farmie-tests-')
+os.environ.setdefault('FARMIE_WEATHER_CACHE_PATH', os.path.join(_workdir, 'weather_cache.sqlite'))
+os.environ.setdefault('FARMIE_CLIMATOLOGY_PATH', os.path.join(_workdir, 'climatology.bin'))
+os.environ.setdefault('FARMIE_LOG_LEVEL', 'WARNING')
@@ -0,0 +1,90 @@
+import threading
+import time
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as farmie
+from benchmarks.sqlite_shim import create_database
+from db import ConnectionPool, QueryRouter
+
+
+def test_bounded_submit_caps_work_in_flight():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return item * 2
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = farmie.bounded_submit(executor, work, range(12), limit=3)
+        assert [f.result() for f in futures] == [i * 2 for i in range(12)]
+    assert peak[0] == 3
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # app.py against a fresh SQLite stand-in database
+    router = QueryRouter(ConnectionPool(create_database(str(tmp_path / 'farmie.sqlite')), size=2))
+    monkeypatch.setattr(farmie, 'db_router', router)
+    monkeypatch.chdir(tmp_path)
+    return farmie.app.test_client()
+
+
+def login(client):
+    client.post('/register', json={'user_name': 'alice', 'email': 'a@x', 'password': 'pw'})
+    token = client.post('/login', json={'user_name': 'alice', 'password': 'pw'}).get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_sustained_traffic_stores_no_sessions(client, tmp_path):
+
+    responses = [client.post('/register', json={'user_name': 'alice', 'email': 'a@x', 'password': 'pw'})]
+    for _ in range(3):
+        responses.append(client.post('/login', json={'user_name': 'alice', 'password': 'pw'}))
+    auth = {'Authorization': f"Bearer {responses[-1].get_json()['access_token']}"}
+    for i in range(200):
+        responses.append(client.post('/add_farm', json={'name': f'f{i}', 'longitude': 30.1, 'latitude': -1.9},
+                                     headers=auth))
+        responses.append(client.get('/get_farms_by_user', headers=auth))
+        responses.append(client.get('/get_all_crops'))
+
+    assert {r.status_code for r in responses} <= {200, 201}
+    assert not [r for r in responses if 'Set-Cookie' in r.headers]
+    assert not os.path.exists(tmp_path / 'flask_session')
+    assert not os.path.exists(os.path.join(os.path.dirname(farmie.__file__), 'flask_session'))
+
+
+def test_bulk_crops_reports_malformed_items_individually(client):
+    auth = login(client)
+    client.post('/add_farm', json={'name': 'f', 'longitude': 30.1, 'latitude': -1.9}, headers=auth)
+    operations = [
+        {'farm_id': 1, 'crop_name': 'banana', 'quantity': 4},
+        {'farm_id': 1, 'crop_name': 7, 'quantity': 1},
+        {'farm_id': 1, 'crop_name': ['banana'], 'quantity': 1},
+        {'farm_id': True, 'crop_name': 'banana', 'quantity': 1},
+        {'farm_id': 1.7, 'crop_name': 'banana', 'quantity': 1},
+        {'farm_id': '1', 'crop_name': 'banana', 'quantity': 1},
+        {'crop_name': 'banana', 'quantity': 1},
+    ]
+    response = client.post('/bulk_crops', json={'operations': operations}, headers=auth)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['applied'] == 1
+    assert [r.get('error') for r in body['results']] == [
+        None,
+        'crop_name must be a string',
+        'crop_name must be a string',
+        'farm_id must be an integer',
+        'farm_id must be an integer',
+        'farm_id must be an integer',
+        'Missing farm_id or crop_name',
+    ]
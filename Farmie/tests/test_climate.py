@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+from benchmarks.sqlite_shim import create_database
+from climate import SummaryStore
+from weather import grid_cell
+
+
+def make_store(tmp_path):
+    connect = create_database(str(tmp_path / 'farmie.sqlite'))
+    queries = []
+
+    @contextmanager
+    def db_cursor(dictionary=False, read_only=False):
+        conn = connect()
+        cursor = conn.cursor()
+        execute = cursor.execute
+        cursor.execute = lambda sql, params=(): (queries.append(sql), execute(sql, params))[1]
+        try:
+            yield conn, cursor
+        finally:
+            conn.close()
+
+    store = SummaryStore(db_cursor, resolution=0.1)
+    store.put_many([(grid_cell(1.0, 2.0), 'recent_30d', '2026-01-01', '2026-01-31', 20.0, 90.0, 60.0, 30, datetime.now())])
+    queries.clear()
+    return store, queries
+
+
+def test_missing_cells_are_not_looked_up_on_every_request(tmp_path):
+    store, queries = make_store(tmp_path)
+    assert store.get(5.0, 6.0, 'recent_30d') is None
+    assert store.get(5.0, 6.0, 'recent_30d') is None
+    assert len(queries) == 1
+
+
+def test_preload_fetches_a_page_of_cells_in_one_query(tmp_path):
+    store, queries = make_store(tmp_path)
+    store.preload([(1.0, 2.0), (5.0, 6.0), (1.01, 2.01), (7.0, 8.0)], 'recent_30d')
+    assert len(queries) == 1
+
+    assert store.get(1.0, 2.0, 'recent_30d') == (20.0, 90.0, 60.0, 30)
+    assert store.get(5.0, 6.0, 'recent_30d') is None
+    assert len(queries) == 1
+    # Everything is cached now, so another page load does not query
+    store.preload([(1.0, 2.0), (7.0, 8.0)], 'recent_30d')
+    assert len(queries) == 1
+
+
+def test_a_new_row_replaces_a_cached_miss(tmp_path):
+    store, queries = make_store(tmp_path)
+    assert store.get(5.0, 6.0, 'recent_30d') is None
+    store.put_many([(grid_cell(5.0, 6.0), 'recent_30d', '2026-01-01', '2026-01-31', 25.0, 10.0, 40.0, 30, datetime.now())])
+    assert store.get(5.0, 6.0, 'recent_30d') == (25.0, 10.0, 40.0, 30)
@@ -0,0 +1,133 @@
+import dataclasses
+import datetime
+import decimal
+import gzip
+import json
+import uuid
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from encoding import FastJSONProvider, install_compression, list_response, orjson
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+
+
+VALUES = {
+    'datetime': datetime.datetime(2024, 1, 2, 3, 4, 5),
+    'aware': datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+    'date': datetime.date(2024, 1, 2),
+    'decimal': decimal.Decimal('1.50'),
+    'uuid': uuid.UUID(int=1),
+    'dataclass': Point(1),
+    'big_int': 2 ** 70,
+    'int_keys': {1: 'a', 2: 'b'},
+    'text': 'plain',
+}
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+@pytest.fixture
+def providers(app):
+    fast, default = FastJSONProvider(app), DefaultJSONProvider(app)
+    fast.compact = default.compact = True
+    return fast, default
+
+
+@pytest.mark.parametrize('name', sorted(VALUES))
+def test_dumps_matches_the_default_provider(providers, name):
+    fast, default = providers
+    value = {'value': VALUES[name]}
+    assert json.loads(fast.dumps(value)) == json.loads(default.dumps(value))
+
+
+def test_float_subclasses_are_encoded(providers):
+    numpy = pytest.importorskip('numpy')
+    fast, default = providers
+    assert json.loads(fast.dumps({'v': numpy.float64(1.5)})) == {'v': 1.5}
+
+
+def test_unserializable_values_still_raise(providers):
+    fast, _ = providers
+    with pytest.raises(TypeError):
+        fast.dumps({'v': datetime.time(1, 2)})
+
+
+def test_response_uses_rfc_822_dates(app, providers):
+    fast, _ = providers
+    with app.app_context():
+        response = fast.response({'at': datetime.date(2024, 1, 2)})
+    assert json.loads(response.get_data()) == {'at': 'Tue, 02 Jan 2024 00:00:00 GMT'}
+    if orjson is not None:
+        assert response.get_data() == b'{"at":"Tue, 02 Jan 2024 00:00:00 GMT"}\n'
+
+
+@pytest.fixture
+def list_app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    install_compression(app, min_size=64)
+    rows = [(i, f'farm {i}', 30.1, -1.9) for i in range(50)]
+
+    @app.route('/farms')
+    def farms():
+        return list_response(('id', 'name', 'longitude', 'latitude'), rows)
+
+    return app.test_client(), rows
+
+
+def test_columns_format_sends_keys_once(list_app):
+    client, rows = list_app
+    response = client.get('/farms?format=columns')
+    assert response.get_json() == {
+        'columns': ['id', 'name', 'longitude', 'latitude'],
+        'rows': [list(row) for row in rows],
+    }
+    assert client.get('/farms').get_json()[1] == {'id': 1, 'name': 'farm 1', 'longitude': 30.1, 'latitude': -1.9}
+    assert 'Accept' in response.headers['Vary']
+
+
+def test_msgpack_is_negotiated_from_accept(list_app):
+    msgpack = pytest.importorskip('msgpack')
+    client, rows = list_app
+    response = client.get('/farms', headers={'Accept': 'application/msgpack'})
+    assert response.mimetype == 'application/msgpack'
+    assert msgpack.unpackb(response.get_data())['rows'][2] == list(rows[2])
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip', 'gzip'),
+    ('br', 'br'),
+    ('gzip, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('identity', None),
+])
+def test_compression_follows_accept_encoding(list_app, accept, expected):
+    if expected == 'br':
+        brotli = pytest.importorskip('brotli')
+    client, rows = list_app
+    response = client.get('/farms', headers={'Accept-Encoding': accept})
+    assert response.headers.get('Content-Encoding') == expected
+    assert 'Accept-Encoding' in response.headers['Vary']
+    body = response.get_data()
+    if expected == 'gzip':
+        body = gzip.decompress(body)
+    elif expected == 'br':
+        body = brotli.decompress(body)
+    assert json.loads(body)[0]['name'] == 'farm 0'
+
+
+def test_small_responses_are_not_compressed():
+    app = Flask(__name__)
+    install_compression(app, min_size=1024)
+    app.add_url_rule('/ok', 'ok', lambda: {'ok': True})
+    response = app.test_client().get('/ok', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,54 @@
+import pytest
+import requests
+
+from http_client import CircuitBreaker, Upstream, UpstreamUnavailable
+
+
+class FailingSession(requests.Session):
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    def request(self, method, url, **kwargs):
+        raise self.error
+
+
+def half_open_upstream(error):
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return Upstream('test', 'http://upstream', breaker=breaker, retries=0, session=FailingSession(error))
+
+
+@pytest.mark.parametrize('error', [
+    requests.exceptions.ChunkedEncodingError('truncated'),
+    requests.exceptions.ContentDecodingError('bad gzip'),
+    requests.exceptions.InvalidURL('bad url'),
+])
+def test_request_errors_end_the_half_open_trial(error):
+    upstream = half_open_upstream(error)
+    with pytest.raises(UpstreamUnavailable):
+        upstream.get('/x')
+    # The trial counted as a failure; the next call gets its own trial
+    assert upstream.breaker.allow()
+    assert upstream.stats()['failures'] == 1
+
+
+def test_local_errors_release_the_trial():
+    upstream = half_open_upstream(OSError('upload stream closed'))
+    with pytest.raises(OSError):
+        upstream.post('/x')
+    assert upstream.breaker.allow()
+
+
+def test_queue_timeout_does_not_strand_the_half_open_trial():
+    upstream = half_open_upstream(OSError('unused'))
+    upstream.queue_timeout = 0.01
+    for _ in range(upstream.max_concurrency):
+        upstream._slots.acquire()
+    assert upstream.breaker.state == 'half-open'
+    with pytest.raises(UpstreamUnavailable, match='overloaded'):
+        upstream.get('/x')
+    for _ in range(upstream.max_concurrency):
+        upstream._slots.release()
+    # The trial was never claimed, so the circuit can still close again
+    assert upstream.breaker.allow()
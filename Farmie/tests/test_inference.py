@@ -0,0 +1,37 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from inference import IMG_HEIGHT, IMG_WIDTH, preprocess
+
+
+def jpeg(size=(1024, 768), mode='RGB'):
+    rng = np.random.default_rng(7)
+    pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).convert(mode).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def load_img(data):
+    # tf.keras.utils.load_img(path, target_size=(224, 224)), as used in training
+    img = Image.open(io.BytesIO(data))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.asarray(img.resize((IMG_WIDTH, IMG_HEIGHT), Image.NEAREST), dtype=np.float32)
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'L'])
+def test_preprocess_matches_the_training_decode(mode):
+    data = jpeg(mode=mode)
+    np.testing.assert_array_equal(preprocess(io.BytesIO(data)), load_img(data))
+
+
+def test_preprocess_matches_keras_load_img(tmp_path):
+    keras_utils = pytest.importorskip('tensorflow').keras.utils
+    path = tmp_path / 'leaf.jpg'
+    path.write_bytes(jpeg())
+    expected = keras_utils.img_to_array(keras_utils.load_img(str(path), target_size=(IMG_HEIGHT, IMG_WIDTH)))
+    np.testing.assert_array_equal(preprocess(io.BytesIO(path.read_bytes())), expected)
@@ -0,0 +1,28 @@
+import time
+
+from flask import Flask
+
+from observability import PHASES, RequestMetrics, instrument, phase
+
+
+def test_server_timing_and_metrics_agree_on_compute():
+    app = Flask(__name__)
+    metrics = RequestMetrics()
+    instrument(app, metrics)
+
+    @app.route('/upload')
+    def upload():
+        with phase('shrink'):
+            time.sleep(0.02)
+        return 'ok'
+
+    response = app.test_client().get('/upload')
+    header = dict(part.split(';dur=') for part in response.headers['Server-Timing'].split(', '))
+    assert list(header) == [*PHASES, 'compute']
+    assert float(header['shrink']) >= 20
+
+    recorded = metrics.snapshot()['GET /upload']['phase_seconds']
+    assert abs(recorded['shrink'] * 1000 - float(header['shrink'])) < 0.1
+    # The header is written before teardown, so compute can only have grown since
+    assert recorded['compute'] * 1000 >= float(header['compute']) - 0.1
+    assert recorded['compute'] < 0.02
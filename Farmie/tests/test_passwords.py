@@ -0,0 +1,30 @@
+from passwords import LoginThrottle
+
+
+def test_successful_logins_do_not_count_against_the_ip():
+    throttle = LoginThrottle(user_limit=2, ip_limit=3, window=60)
+    for i in range(10):
+        assert throttle.retry_after(f'user{i}', '10.0.0.1') == 0
+        throttle.succeeded(f'user{i}')
+    assert throttle.retry_after('someone', '10.0.0.1') == 0
+
+
+def test_failed_logins_are_limited_per_user_and_per_ip():
+    throttle = LoginThrottle(user_limit=2, ip_limit=3, window=60)
+    throttle.failed('alice', '10.0.0.1')
+    throttle.failed('alice', '10.0.0.1')
+    assert throttle.retry_after('alice', '10.0.0.2') > 0
+
+    throttle.failed('bob', '10.0.0.1')
+    assert throttle.retry_after('carol', '10.0.0.1') > 0
+    assert throttle.retry_after('carol', '10.0.0.2') == 0
+
+
+def test_success_clears_the_user_but_not_the_ip():
+    throttle = LoginThrottle(user_limit=2, ip_limit=3, window=60)
+    throttle.failed('alice', '10.0.0.1')
+    throttle.succeeded('alice')
+    throttle.failed('alice', '10.0.0.1')
+    assert throttle.retry_after('alice', '10.0.0.2') == 0
+    throttle.failed('bob', '10.0.0.1')
+    assert throttle.retry_after('dave', '10.0.0.1') > 0
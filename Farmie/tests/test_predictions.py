@@ -0,0 +1,93 @@
+import hashlib
+import io
+import itertools
+
+import pytest
+
+import predictions
+from predictions import HashingSpool, MicroBatcher, PredictionCache, PredictionError, upload_hash
+
+
+def test_short_batch_results_fail_every_caller():
+    batcher = MicroBatcher(lambda items: items[:1], max_batch_size=3, max_wait=0.5)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(PredictionError):
+            future.result(timeout=5)
+
+
+def test_batch_errors_reach_every_caller():
+    def fail(items):
+        raise PredictionError('model server failed')
+
+    batcher = MicroBatcher(fail, max_batch_size=2, max_wait=0.5)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(PredictionError, match='model server failed'):
+            future.result(timeout=5)
+
+
+def test_results_map_back_in_order():
+    batcher = MicroBatcher(lambda items: [i * 10 for i in items], max_batch_size=4, max_wait=0.05)
+    futures = [batcher.submit(i) for i in range(4)]
+    assert [f.result(timeout=5) for f in futures] == [0, 10, 20, 30]
+    assert batcher.stats()['items'] == 4
+
+
+@pytest.fixture
+def old_model_server():
+    from benchmarks.mocks import BackgroundServer, create_mock_app
+
+    mock = create_mock_app(batch_endpoint=False)
+    server = BackgroundServer(mock).start()
+    yield mock, server.url
+    server.stop()
+
+
+def test_remote_batches_fall_back_to_single_predictions(old_model_server):
+    from http_client import Upstream
+    from predictions import RemoteModel
+
+    mock, url = old_model_server
+    model = RemoteModel(Upstream('model_server', url))
+    images = [(f'{i}.jpg', io.BytesIO(bytes([i]) * 100), 'image/jpeg') for i in range(3)]
+    expected = [model.predict(image) for image in images]
+    for _, stream, _ in images:
+        stream.seek(0)
+
+    assert model.predict_batch(images) == expected
+    assert not model.batch_supported
+    for _, stream, _ in images:
+        stream.seek(0)
+    assert model.predict_batch(images) == expected
+    # Probed once, then straight to /predict
+    assert mock.config['CALLS'] == {'archive': 0, 'predict': 9, 'predict_batch': 0}
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(predictions.time, 'time', lambda: next(clock))
+    cache = PredictionCache('1', max_entries=1, path=str(tmp_path / 'predictions.sqlite'))
+    for i in range(4):
+        cache.put(f'h{i}', {'predicted_crop': f'c{i}'})
+    assert cache.get('h0') == {'predicted_crop': 'c0'}  # from disk
+    assert cache.get('h0') == {'predicted_crop': 'c0'}  # from memory
+    cache._puts = 255
+    cache.put('h4', {'predicted_crop': 'c4'})  # trims the disk tier to 4 rows
+
+    rows = cache._conn().execute('SELECT image_hash, used_at FROM predictions ORDER BY image_hash').fetchall()
+    assert [row[0] for row in rows] == ['h0', 'h2', 'h3', 'h4']
+    # The memory hit was written back before trimming
+    assert rows[0][1] == 1005
+
+
+def test_uploads_are_hashed_while_they_are_received():
+    import app as farmie
+    from flask import request
+
+    data = bytes(range(256)) * 1000
+    with farmie.app.test_request_context(method='POST', data={'image': (io.BytesIO(data), 'leaf.jpg')}):
+        stream = request.files['image'].stream
+        assert isinstance(stream, HashingSpool)
+        assert upload_hash(stream) == hashlib.sha256(data).hexdigest()
+        assert stream.read() == data
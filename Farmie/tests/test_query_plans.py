@@ -0,0 +1,62 @@
+import os
+
+import mysql.connector
+import pytest
+
+import query_plans
+
+
+def test_every_query_is_found_and_gets_sample_parameters():
+    queries, unrendered = query_plans.collect_queries()
+    assert unrendered == []
+    for sql in queries:
+        assert len(query_plans.sample_params(sql)) == sql.count('%s'), sql
+    # Queries assembled with f-strings are rendered from the code
+    rendered = [sql for sql in queries if 'IN (%s, %s)' in sql or 'IN ((%s, %s), (%s, %s))' in sql]
+    assert any('FROM WeatherSummary WHERE period = %s AND cell IN' in sql for sql in rendered)
+    assert any(sql.startswith('SELECT run_id, status,') for sql in queries)
+
+
+def test_in_lists_get_a_sample_per_column():
+    sql = 'SELECT 1 FROM Cultivate WHERE (farm_id, crop_name) IN ((%s, %s), (%s, %s)) AND quantity > %s LIMIT %s'
+    assert query_plans.sample_params(sql) == (1, 'corn', 1, 'corn', 1, 10)
+
+
+class ExplainCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_whole_table_reads_may_only_scan_their_own_table():
+    plan = [{'table': 'Crop', 'type': 'ALL'}, {'table': 'Cultivate', 'type': 'ALL'}]
+    assert query_plans.full_scans(ExplainCursor(plan), 'SELECT * FROM Crop JOIN Cultivate', ()) == ['Cultivate']
+    assert query_plans.full_scans(ExplainCursor(plan[:1]), 'SELECT * FROM Crop', ()) == []
+    assert query_plans.full_scans(ExplainCursor(plan[:1]), 'SELECT * FROM Crop WHERE x = %s', (1,)) == ['Crop']
+
+
+@pytest.fixture
+def mysql_conn():
+    try:
+        conn = mysql.connector.connect(
+            host=os.environ.get('FARMIE_DB_HOST', 'localhost'),
+            user=os.environ.get('FARMIE_DB_USER', 'farmie_user'),
+            password=os.environ.get('FARMIE_DB_PASSWORD', 'farmie123'),
+            database=os.environ.get('FARMIE_DB_NAME', 'Farmie'),
+            connection_timeout=2,
+        )
+    except mysql.connector.Error as e:
+        pytest.skip(f'MySQL is not available: {e}')
+    yield conn
+    conn.close()
+
+
+def test_no_query_plan_scans_a_whole_table(mysql_conn):
+    checked, problems = query_plans.check(mysql_conn)
+    assert checked
+    assert problems == []
@@ -0,0 +1,252 @@
+"""QueryRouter against two SQLite stand-in databases: a primary and a stale replica."""
+import os
+
+import mysql.connector
+import pytest
+
+import db
+from benchmarks.sqlite_shim import create_database
+from db import ConnectionPool, QueryRouter, ReadPins
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(db.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def databases(tmp_path):
+    # The primary has one farm the replica has not received yet
+    primary = create_database(str(tmp_path / 'primary.sqlite'))
+    replica = create_database(str(tmp_path / 'replica.sqlite'))
+    conn = primary()
+    conn.cursor().execute("INSERT INTO farm (user_id, farm_name, longitude, latitude) VALUES (1, 'f', 30.1, -1.9)")
+    conn.commit()
+    conn.close()
+    return primary, replica
+
+
+def make_router(databases, lag=None, connect_replica=None, **kwargs):
+    primary, replica = databases
+    kwargs.setdefault('pin_seconds', 5.0)
+    kwargs.setdefault('max_lag', 2.0)
+    kwargs.setdefault('check_interval', 1.0)
+    kwargs.setdefault('retry_interval', 10.0)
+    return QueryRouter(
+        ConnectionPool(primary, size=2),
+        {'r1': ConnectionPool(connect_replica or replica, size=1)},
+        lag=lag, pins=ReadPins(64), **kwargs,
+    )
+
+
+def source(router, keys=()):
+    """'primary' or 'replica', by which database answered the read."""
+    with router.connection(read_only=True, keys=keys) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM farm")
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return 'primary' if count else 'replica'
+
+
+def write(router, keys):
+    with router.connection(keys=keys) as conn:
+        conn.cursor().execute("UPDATE farm SET farm_name = 'g' WHERE farm_id = 1")
+        conn.commit()
+
+
+def test_without_replicas_everything_uses_the_primary(databases):
+    router = QueryRouter(ConnectionPool(databases[0]))
+    assert source(router, ('user:a',)) == 'primary'
+    assert router.stats()['replicas'] == {}
+
+
+def test_reads_go_to_a_replica_and_writes_to_the_primary(databases, clock):
+    router = make_router(databases)
+    assert source(router) == 'replica'
+    with router.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM farm")
+        assert cursor.fetchone()[0] == 1
+    stats = router.stats()
+    assert stats['replica_reads'] == 1
+    assert stats['replicas']['r1']['pool']['in_use'] == 0
+
+
+def test_commit_pins_the_writer_to_the_primary(databases, clock):
+    router = make_router(databases)
+    write(router, ('user:a',))
+    assert source(router, ('user:a',)) == 'primary'
+    # Only the writer is pinned
+    assert source(router, ('user:b',)) == 'replica'
+    clock.now += 5.1
+    assert source(router, ('user:a',)) == 'replica'
+    stats = router.stats()
+    assert stats['pins'] == 1
+    assert stats['pinned_reads'] == 1
+
+
+def test_a_write_without_commit_does_not_pin(databases, clock):
+    router = make_router(databases)
+    with router.connection(keys=('user:a',)) as conn:
+        conn.cursor().execute("SELECT 1")
+    assert source(router, ('user:a',)) == 'replica'
+
+
+def test_lagging_replica_is_skipped_until_it_catches_up(databases, clock):
+    lag = [10.0]
+    router = make_router(databases, lag=lambda conn: lag[0])
+    assert source(router) == 'primary'
+    assert router.stats()['replicas']['r1']['state'] == 'lagging'
+
+    # Not re-checked before check_interval, even once it has caught up
+    lag[0] = 0.0
+    assert source(router) == 'primary'
+    clock.now += 1.0
+    assert source(router) == 'replica'
+    assert router.stats()['fallback_reads'] == 2
+
+
+def test_stopped_replication_counts_as_lagging(databases, clock):
+    router = make_router(databases, lag=lambda conn: None)
+    assert source(router) == 'primary'
+    assert router.stats()['replicas']['r1']['state'] == 'lagging'
+
+
+def test_unreachable_replica_is_retried_after_retry_interval(databases, clock):
+    down = [True]
+
+    def connect():
+        if down[0]:
+            raise mysql.connector.errors.InterfaceError('replica down')
+        return databases[1]()
+
+    router = make_router(databases, connect_replica=connect)
+    assert source(router) == 'primary'
+    replica = router.stats()['replicas']['r1']
+    assert (replica['state'], replica['failures']) == ('down', 1)
+
+    down[0] = False
+    clock.now += 5
+    assert source(router) == 'primary'
+    clock.now += 5
+    assert source(router) == 'replica'
+
+
+def test_replica_dropping_mid_query_is_marked_down(databases, clock):
+    router = make_router(databases)
+    with pytest.raises(mysql.connector.errors.OperationalError):
+        with router.connection(read_only=True):
+            raise mysql.connector.errors.OperationalError('lost connection')
+    assert router.stats()['replicas']['r1']['state'] == 'down'
+    assert source(router) == 'primary'
+
+
+def test_busy_replica_pool_falls_back_without_marking_it_down(databases, clock):
+    router = make_router(databases, replica_timeout=0.01)
+    held = router.replicas[0].pool.acquire()
+    try:
+        assert source(router) == 'primary'
+    finally:
+        router.replicas[0].pool.release(held)
+    assert router.stats()['replicas']['r1']['state'] == 'ok'
+    assert source(router) == 'replica'
+
+
+def test_reads_rotate_across_replicas(databases, tmp_path):
+    pools = {name: ConnectionPool(create_database(str(tmp_path / f'{name}.sqlite'))) for name in ('r1', 'r2')}
+    router = QueryRouter(ConnectionPool(databases[0]), pools, pins=ReadPins(64))
+    for _ in range(4):
+        source(router)
+    assert [r['reads'] for r in router.stats()['replicas'].values()] == [2, 2]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_read_pins_are_shared_with_forked_workers():
+    pins = ReadPins(64)
+    pid = os.fork()
+    if pid == 0:
+        pins.pin(['user:a'], 60)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert pins.pinned(['user:a'])
+    assert not pins.pinned(['user:b'])
+
+
+def test_read_consistency_keys_prefer_the_token_user():
+    from flask_jwt_extended import create_access_token, verify_jwt_in_request
+
+    import app as farmie
+
+    with farmie.app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        assert farmie.read_consistency_keys() == ('addr:10.0.0.7',)
+    with farmie.app.app_context():
+        token = create_access_token(identity='alice')
+    headers = {'Authorization': f'Bearer {token}'}
+    with farmie.app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        verify_jwt_in_request()
+        assert farmie.read_consistency_keys() == ('user:alice', 'addr:10.0.0.7')
+    # Routes without @jwt_required still pick up a token that was sent
+    with farmie.app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        assert farmie.read_consistency_keys() == ('user:alice', 'addr:10.0.0.7')
+    assert farmie.read_consistency_keys() == ()
+
+
+@pytest.fixture
+def routed_app(databases, monkeypatch):
+    """app.py routed to the primary and a replica that never catches up."""
+    from flask_jwt_extended import create_access_token
+
+    import app as farmie
+
+    for connect in databases:
+        conn = connect()
+        conn.cursor().execute("INSERT INTO User (user_id, user_name, email, password) VALUES (1, 'alice', 'a@x', 'x')")
+        conn.cursor().execute("INSERT INTO Cultivate (farm_id, crop_name, quantity) VALUES (1, 'cassava', 1)")
+        conn.commit()
+        conn.close()
+    # The stand-in replica lacks the farm; give it one so reads there succeed
+    conn = databases[1]()
+    conn.cursor().execute("INSERT INTO farm (user_id, farm_name, longitude, latitude) VALUES (1, 'f', 30.1, -1.9)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(farmie, 'db_router', make_router(databases))
+    farmie.identity.farm_owners.pop(1)
+    with farmie.app.app_context():
+        token = create_access_token(identity='alice', additional_claims={'user_id': 1})
+    return farmie.app.test_client(), {'Authorization': f'Bearer {token}'}
+
+
+def crops(response):
+    return {row['crop_name']: row['quantity'] for row in response.get_json()}
+
+
+def test_token_write_is_read_back_on_an_anonymous_route(routed_app):
+    client, auth = routed_app
+    response = client.post('/add_crop_to_farm', json={'farm_id': 1, 'crop_name': 'banana', 'quantity': 3}, headers=auth)
+    assert response.status_code == 201
+    assert crops(client.get('/get_crops_for_farm?farm_id=1')) == {'cassava': 1, 'banana': 3}
+
+
+def test_anonymous_write_is_read_back_with_a_token(routed_app):
+    client, auth = routed_app
+    response = client.put('/update_crop_quantity', json={'farm_id': 1, 'crop_name': 'cassava', 'new_quantity': 5})
+    assert response.status_code == 200
+    assert crops(client.get('/get_crops_for_farm?farm_id=1', headers=auth)) == {'cassava': 5}
+
+
+def test_other_clients_still_read_from_the_replica(routed_app):
+    client, auth = routed_app
+    client.put('/update_crop_quantity', json={'farm_id': 1, 'crop_name': 'cassava', 'new_quantity': 5})
+    other = client.get('/get_crops_for_farm?farm_id=1', environ_base={'REMOTE_ADDR': '10.0.0.9'})
+    assert crops(other) == {'cassava': 1}
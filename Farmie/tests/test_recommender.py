@@ -0,0 +1,55 @@
+import pytest
+
+from recommender import Recommender
+
+ROWS = [
+    {'crop_name': 'corn', 'crop_family': 'Poaceae', 'optimal_temp': 25, 'optimal_rainfall': 600, 'optimal_humidity': 60},
+    {'crop_name': 'kale', 'crop_family': 'Brassicaceae', 'optimal_temp': 18, 'optimal_rainfall': 400, 'optimal_humidity': 70},
+]
+
+
+class FlakyDatabase:
+    def __init__(self):
+        self.down = False
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        if self.down:
+            raise RuntimeError('database is down')
+        return ROWS
+
+    def fingerprint(self):
+        if self.down:
+            raise RuntimeError('database is down')
+        return 'v1'
+
+
+def test_failed_reload_serves_the_last_catalogue():
+    database = FlakyDatabase()
+    recommender = Recommender(database.load, database.fingerprint, check_interval=0)
+    catalogue = recommender.catalogue()
+
+    database.down = True
+    assert recommender.catalogue() is catalogue
+    assert recommender.recommend('corn', (18, 400, 70)) == ['kale']
+
+
+def test_failed_reload_waits_for_the_next_check():
+    database = FlakyDatabase()
+    recommender = Recommender(database.load, database.fingerprint, check_interval=60)
+    catalogue = recommender.catalogue()
+
+    database.down = True
+    recommender.invalidate()
+    assert recommender.catalogue() is catalogue
+    assert recommender.catalogue() is catalogue
+    assert database.loads == 2
+
+
+def test_first_load_failure_raises():
+    database = FlakyDatabase()
+    database.down = True
+    with pytest.raises(RuntimeError):
+        Recommender(database.load, database.fingerprint).catalogue()
+    assert not Recommender(database.load).loaded
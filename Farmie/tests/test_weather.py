@@ -0,0 +1,28 @@
+import time
+
+from weather import WeatherCache, WeatherStore
+
+
+def test_store_prune_keeps_pinned_and_fresh_rows(tmp_path):
+    store = WeatherStore(str(tmp_path / 'weather.sqlite'))
+    now = time.time()
+    store.put('old', {'x': 1}, now - 7200, False)
+    store.put('old-year', {'x': 2}, now - 7200, True)
+    store.put('fresh', {'x': 3}, now, False)
+
+    assert store.prune(now - 3600) == 1
+    assert sorted(key for key, _ in store.entries()) == ['fresh', 'old-year']
+
+
+def test_cache_prunes_expired_rows_once_per_ttl(tmp_path):
+    store = WeatherStore(str(tmp_path / 'weather.sqlite'))
+    cache = WeatherCache(lambda lat, lon, start, end: {'day': [start]}, store=store, ttl=60)
+    store.put('stale', {}, time.time() - 120, False)
+
+    cache.get_daily(1.0, 2.0, '2026-01-01', '2026-01-31')
+    assert store.get('stale') is not None
+
+    cache._pruned_at -= 61
+    cache.get_daily(1.0, 2.0, '2026-02-01', '2026-02-28')
+    assert store.get('stale') is None
+    assert cache.stats()['pruned'] == 1
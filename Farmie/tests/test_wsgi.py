@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+import app as farmie
+from inference import CLASS_NAMES, IMG_HEIGHT, IMG_WIDTH, LocalModel
+
+
+@pytest.fixture
+def wsgi(monkeypatch, tmp_path):
+    monkeypatch.setenv('FARMIE_WARM_UP', '0')
+    import wsgi
+
+    monkeypatch.setenv('FARMIE_WARM_UP', '1')
+    features = (IMG_HEIGHT // 8) * (IMG_WIDTH // 8) * 3
+    np.savez(tmp_path / 'model.npz', weights=np.zeros((features, len(CLASS_NAMES))), bias=np.zeros(len(CLASS_NAMES)))
+    monkeypatch.setattr(farmie, 'crop_model', LocalModel('numpy', str(tmp_path / 'model.npz')))
+    monkeypatch.setattr(farmie.recommender, 'catalogue', lambda: None)
+    monkeypatch.setattr(farmie.climate_normals, 'grid', lambda: None)
+    monkeypatch.setattr(farmie, 'release_connections', lambda: None)
+    return wsgi
+
+
+def test_model_is_loaded_in_the_worker_not_before_fork(wsgi):
+    wsgi.create_app()
+    assert not farmie.crop_model.loaded
+    wsgi.warm_up_worker()
+    assert farmie.crop_model.loaded
+
+
+def test_worker_warm_up_can_be_turned_off(wsgi, monkeypatch):
+    monkeypatch.setenv('FARMIE_WARM_UP', '0')
+    wsgi.warm_up_worker()
+    assert not farmie.crop_model.loaded
@@ -0,0 +1,201 @@
+"""NDJSON export and import of a user's farms and their crops.
+
+One line per farm, its crops inline::
+
+    {"crops": [{"crop_name": "corn", "quantity": 5}], "id": 12, "latitude": -1.9, "longitude": 30.1, "name": "North"}
+
+Export reads farms joined with Cultivate through an unbuffered
+(server-side) cursor in ``chunk_size`` batches, so memory stays flat no
+matter how many rows a user has. Import parses the body line by line and
+writes farms and crops in one transaction per ``batch_rows`` crop rows.
+Imported farms always get new ids; the exported ``id`` is ignored.
+"""
+import json
+
+import cultivation
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+class ImportAborted(Exception):
+    """A batch failed to write; ``summary`` covers the batches already committed."""
+
+    def __init__(self, summary):
+        super().__init__('Import stopped after a failed batch')
+        self.summary = summary
+
+EXPORT_QUERY = """
+    SELECT f.farm_id, f.farm_name, f.longitude, f.latitude, cv.crop_name, cv.quantity
+    FROM farm f
+    LEFT JOIN Cultivate cv ON cv.farm_id = f.farm_id
+    WHERE f.user_id = %s
+    ORDER BY f.farm_id
+"""
+
+
+def export_farms(connection, user_id, dumps, chunk_size=5000):
+    """Yield the user's farms as NDJSON bytes, one chunk per ``chunk_size`` rows.
+
+    ``connection`` is a pool checkout (``db_pool.connection()``), held until
+    the generator finishes or is closed. The first item is ``b''`` and is
+    produced once the query has run, so callers can surface query errors
+    before they start a streamed response.
+    """
+    with connection as conn:
+        # Unbuffered: rows stream from the server as they are fetched
+        cursor = conn.cursor(buffered=False)
+        streaming = exhausted = False
+        try:
+            cursor.execute(EXPORT_QUERY, (user_id,))
+            streaming = True
+            yield b''
+            farm = None
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    exhausted = True
+                    break
+                lines = []
+                for farm_id, name, longitude, latitude, crop_name, quantity in rows:
+                    if farm is None or farm['id'] != farm_id:
+                        if farm is not None:
+                            lines.append(dumps(farm))
+                        farm = {
+                            'id': farm_id, 'name': name, 'longitude': longitude, 'latitude': latitude, 'crops': [],
+                        }
+                    if crop_name is not None:
+                        farm['crops'].append({'crop_name': crop_name, 'quantity': quantity})
+                if lines:
+                    yield ('\n'.join(lines) + '\n').encode()
+            if farm is not None:
+                yield (dumps(farm) + '\n').encode()
+        finally:
+            if streaming and not exhausted:
+                # Client went away mid-stream: the rest of the result must be read
+                # before this connection can run another query
+                while cursor.fetchmany(chunk_size):
+                    pass
+            cursor.close()
+
+
+def read_lines(stream, max_line=1024 * 1024, block_size=1 << 16):
+    """Yield ``(line_number, line)`` for each non-blank line; over-long lines come back as None.
+
+    Reads in blocks: ``readline`` on a raw WSGI input stream reads a byte at a time.
+    """
+    number, pending, too_long = 0, b'', False
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            number += 1
+            if too_long:
+                too_long = False
+                yield number, None
+            elif line.strip():
+                yield number, line
+        if len(pending) > max_line:
+            # Drop it and skip ahead to the next newline
+            too_long, pending = True, b''
+    if too_long:
+        yield number + 1, None
+    elif pending.strip():
+        yield number + 1, pending
+
+
+def parse_farm(line, known_crops):
+    """``((name, longitude, latitude), {crop_name: quantity})`` from one export line.
+
+    Raises ValueError with a message suitable for the client.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise ValueError('Not valid JSON')
+    if not isinstance(record, dict):
+        raise ValueError('Each line must be a JSON object')
+    name, longitude, latitude = record.get('name'), record.get('longitude'), record.get('latitude')
+    if not isinstance(name, str) or not name:
+        raise ValueError('name is required')
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (longitude, latitude)):
+        raise ValueError('longitude and latitude must be numbers')
+    crops = record.get('crops') or []
+    if not isinstance(crops, list):
+        raise ValueError('crops must be a list')
+
+    quantities = {}
+    for crop in crops:
+        if not isinstance(crop, dict):
+            raise ValueError('Each crop must be an object')
+        crop_name, quantity = crop.get('crop_name'), crop.get('quantity')
+        if crop_name not in known_crops:
+            raise ValueError(f'Unknown crop {crop_name!r}')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            raise ValueError(f'quantity for {crop_name!r} must be a positive integer')
+        # Later entries for the same crop win, as in /bulk_crops
+        quantities[crop_name] = quantity
+    return (name, longitude, latitude), quantities
+
+
+def import_farms(db_cursor, user_id, lines, known_crops, batch_rows=5000, max_errors=100):
+    """Create a farm for each parsed line of ``lines`` (from ``read_lines``).
+
+    Valid farms are written in transactions of about ``batch_rows`` crop
+    rows; invalid lines are skipped and reported. Returns a summary dict
+    and the ids of the farms created, or raises ImportAborted if a batch
+    could not be written.
+    """
+    summary = {'farms': 0, 'crops': 0, 'skipped': 0, 'errors': []}
+    created = []
+    batch, batch_size = [], 0
+
+    def flush():
+        nonlocal batch, batch_size
+        try:
+            created.extend(_write_batch(db_cursor, user_id, batch))
+        except Exception as e:
+            raise ImportAborted(summary) from e
+        summary['farms'] += len(batch)
+        summary['crops'] += batch_size
+        batch, batch_size = [], 0
+
+    for number, line in lines:
+        try:
+            if line is None:
+                raise ValueError('Line is too long')
+            farm, crops = parse_farm(line, known_crops)
+        except ValueError as e:
+            summary['skipped'] += 1
+            if len(summary['errors']) < max_errors:
+                summary['errors'].append({'line': number, 'error': str(e)})
+            continue
+        batch.append((farm, crops))
+        batch_size += len(crops)
+        if batch_size >= batch_rows or len(batch) >= batch_rows:
+            flush()
+    if batch:
+        flush()
+    return summary, created
+
+
+def _write_batch(db_cursor, user_id, batch):
+    # A failure rolls the whole batch back when the connection returns to the pool
+    farm_ids, rows, deltas = [], [], {}
+    with db_cursor() as (conn, cursor):
+        for (name, longitude, latitude), crops in batch:
+            cursor.execute("""
+                INSERT INTO farm (user_id, farm_name, longitude, latitude)
+                VALUES (%s, %s, %s, %s)
+            """, (user_id, name, longitude, latitude))
+            farm_ids.append(cursor.lastrowid)
+            for crop_name, quantity in crops.items():
+                rows.append((cursor.lastrowid, crop_name, quantity))
+                deltas[crop_name] = deltas.get(crop_name, 0) + quantity
+        if rows:
+            cursor.executemany("INSERT INTO Cultivate (farm_id, crop_name, quantity) VALUES (%s, %s, %s)", rows)
+        cultivation.apply_deltas(cursor, deltas)
+        conn.commit()
+    return farm_ids
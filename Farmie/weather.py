@@ -0,0 +1,289 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+ARCHIVE_URL = 'https://archive-api.open-meteo.com/v1/archive'
+DAILY_FIELDS = 'temperature_2m_mean,precipitation_sum,relative_humidity_2m_mean'
+
+logger = logging.getLogger('farmie.weather')
+
+
+class WeatherError(Exception):
+    """Raised when the weather archive could not be fetched."""
+
+
+def grid_cell(latitude, longitude, resolution=0.1):
+    # Farms in the same grid cell share upstream data
+    lat = round(round(float(latitude) / resolution) * resolution, 4)
+    lon = round(round(float(longitude) / resolution) * resolution, 4)
+    return f'{lat:.4f},{lon:.4f}'
+
+
+def grid_key(latitude, longitude, start_date, end_date, resolution=0.1):
+    return f'{grid_cell(latitude, longitude, resolution)},{start_date},{end_date}'
+
+
+def is_immutable(end_date, today=None):
+    # Archive data for finished years never changes
+    today = today or date.today()
+    if isinstance(end_date, str):
+        end_date = date.fromisoformat(end_date)
+    return end_date < date(today.year, 1, 1)
+
+
+def fetch_archive(latitude, longitude, start_date, end_date, client, url=ARCHIVE_URL):
+    # ``client`` is the shared http_client.Upstream for Open-Meteo
+    data = _get_archive(client, url, latitude, longitude, start_date, end_date)
+    if 'daily' not in data:
+        raise WeatherError('Unexpected weather API response')
+    return data['daily']
+
+
+def fetch_archive_many(locations, start_date, end_date, client, url=ARCHIVE_URL):
+    """Daily data for several ``(latitude, longitude)`` points in one request, in order."""
+    data = _get_archive(
+        client, url,
+        ','.join(str(lat) for lat, _ in locations),
+        ','.join(str(lon) for _, lon in locations),
+        start_date, end_date,
+    )
+    # Open-Meteo answers a single location with an object, several with a list
+    if isinstance(data, dict):
+        data = [data]
+    if len(data) != len(locations) or any('daily' not in d for d in data):
+        raise WeatherError('Unexpected weather API response')
+    return [d['daily'] for d in data]
+
+
+def _get_archive(client, url, latitude, longitude, start_date, end_date):
+    response = client.get(url, params={
+        'latitude': latitude,
+        'longitude': longitude,
+        'start_date': str(start_date),
+        'end_date': str(end_date),
+        'daily': DAILY_FIELDS,
+        'timezone': 'auto',
+    })
+    if response.status_code != 200:
+        logger.warning('Weather API failed', extra={'status': response.status_code})
+        raise WeatherError('Failed to fetch weather data')
+    return response.json()
+
+
+def summarize_daily(daily):
+    """Collapse daily archive data into (avg_temp, total_rain, avg_humidity)."""
+    def safe_average(lst):
+        filtered = [v for v in lst if v is not None]
+        return round(sum(filtered) / len(filtered), 2) if filtered else 0.0
+
+    def safe_total(lst):
+        filtered = [v for v in lst if v is not None]
+        return round(sum(filtered), 2)
+
+    return (
+        safe_average(daily.get('temperature_2m_mean', [])),
+        safe_total(daily.get('precipitation_sum', [])),
+        safe_average(daily.get('relative_humidity_2m_mean', [])),
+    )
+
+
+class WeatherStore:
+    """SQLite-backed second tier, shared by every process on the host.
+
+    Rows for finished years are pinned and kept; the rest are dropped by
+    ``prune`` once stale, since recent-window keys change every day.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_archive (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    pinned INTEGER NOT NULL
+                )
+            """)
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_weather_archive_expiry ON weather_archive (pinned, fetched_at)'
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        # Closes this thread's connection and forgets the others, e.g. before a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local = threading.local()
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT payload, fetched_at, pinned FROM weather_archive WHERE cache_key = ?', (key,)
+        ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), row[1], bool(row[2])
+
+    def entries(self):
+        # (cache_key, daily data) for every stored response
+        for key, payload in self._conn().execute('SELECT cache_key, payload FROM weather_archive'):
+            yield key, json.loads(payload)
+
+    def put(self, key, payload, fetched_at, pinned):
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO weather_archive VALUES (?, ?, ?, ?)',
+                (key, json.dumps(payload), fetched_at, int(pinned)),
+            )
+
+    def prune(self, fetched_before):
+        """Delete unpinned rows fetched before ``fetched_before`` (epoch seconds); returns the count."""
+        with self._conn() as conn:
+            return conn.execute(
+                'DELETE FROM weather_archive WHERE pinned = 0 AND fetched_at < ?', (fetched_before,)
+            ).rowcount
+
+
+class WeatherCache:
+    """Two-tier cache (in-process LRU with TTL, then SQLite) for archive data.
+
+    Concurrent misses for the same key are coalesced into one upstream fetch.
+    Expired rows are pruned from the store at most once per ``ttl``.
+    """
+
+    def __init__(self, fetch, store=None, max_entries=512, ttl=3600, resolution=0.1):
+        self._fetch = fetch
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.resolution = resolution
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.pruned = 0
+        self._pruned_at = time.time()
+
+    def _fresh(self, fetched_at, pinned):
+        return pinned or time.time() - fetched_at < self.ttl
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_daily(self, latitude, longitude, start_date, end_date):
+        key = grid_key(latitude, longitude, start_date, end_date, self.resolution)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._fresh(entry[1], entry[2]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = self._inflight[key] = _Inflight()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return waiter.wait()
+
+        try:
+            daily = self._load(key, latitude, longitude, start_date, end_date)
+        except Exception as e:
+            waiter.fail(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        waiter.resolve(daily)
+        return daily
+
+    def _load(self, key, latitude, longitude, start_date, end_date):
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored and self._fresh(stored[1], stored[2]):
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, stored)
+                return stored[0]
+
+        with self._lock:
+            self.misses += 1
+        lat, lon = (float(v) for v in key.split(',')[:2])
+        daily = self._fetch(lat, lon, start_date, end_date)
+        entry = (daily, time.time(), is_immutable(end_date))
+        if self.store is not None:
+            self.store.put(key, *entry)
+            self._prune_store()
+        with self._lock:
+            self._remember(key, entry)
+        return daily
+
+    def _prune_store(self):
+        now = time.time()
+        with self._lock:
+            if now - self._pruned_at < self.ttl:
+                return
+            self._pruned_at = now
+        try:
+            removed = self.store.prune(now - self.ttl)
+        except sqlite3.Error as e:
+            logger.warning('Weather cache prune failed', extra={'error': str(e)})
+            return
+        with self._lock:
+            self.pruned += removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'pruned': self.pruned,
+            }
+
+
+class _Inflight:
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def resolve(self, result):
+        self._result = result
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
@@ -0,0 +1,48 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+``app.py`` builds the Flask app and its shared resources at import time.
+``create_app`` adds the production start-up around that: the catalogue
+and climatology grid are warmed up, then every connection opened while
+doing so is released. With ``preload_app`` that happens once in the
+gunicorn master, and forked workers inherit the warm catalogue but open
+their own DB connections, sockets and SQLite handles.
+
+An in-process model is never loaded in the master: ML runtimes are not
+fork-safe. gunicorn's ``post_worker_init`` hook calls ``warm_up_worker``,
+so each worker loads its own copy before it takes requests.
+"""
+import os
+
+import app as farmie
+
+
+def warm_up_enabled():
+    return os.environ.get('FARMIE_WARM_UP', '1') == '1'
+
+
+def create_app(warm_up=None):
+    if warm_up is None:
+        warm_up = warm_up_enabled()
+    if warm_up:
+        try:
+            farmie.warm_up()
+        except Exception:
+            # Start cold rather than not at all; /ready reports what is missing
+            farmie.logger.exception('Warm-up failed')
+        farmie.release_connections()
+    return farmie.app
+
+
+def warm_up_worker():
+    # Runs in each worker after fork; the model then loads on first use instead
+    if not warm_up_enabled():
+        return
+    try:
+        farmie.warm_up_worker()
+    except Exception:
+        farmie.logger.exception('Model warm-up failed')
+
+
+app = create_app()